@@ -1,5 +1,6 @@
-from math import pi, sin, cos
 import numpy as np
+from core import backends, generators, mesh
+from core.buffers import MeshBuffers
 from core.composite_polygon import CompositePolygon
 from core.gl_polygon import GLPolygon
 
@@ -90,55 +91,114 @@ class Aperture(CompositePolygon):
 
     @staticmethod
     def _create_hole(smoothness):
-        # calculate vertices of square
-        square_vertices = np.array([
-            [0.5, 0.5, 0.],
-            [-0.5, 0.5, 0.],
-            [-0.5, -0.5, 0.],
-            [0.5, -0.5, 0.],
-        ])
-
-        # calculate vertices of circular aperture (from +x axis going ccw)
-        front_circle_vertices = np.zeros((smoothness, 3))
-        for i in range(smoothness):
-            angle = 2 * pi * i / smoothness
-            radial_line = np.array([cos(angle), sin(angle), 0.]) * 0.5
-            front_circle_vertices[i][:] = radial_line
-
-        # The square vertices will be appended to the circular vertices
-        front_vertices = np.append(front_circle_vertices, square_vertices, 0)
-
-        # Create front face of aperture
-        triangle_indices = []
-        for i in range(len(front_circle_vertices)):
-            quadrant = int(4 * float(i) / smoothness)
-            closest_corner_index = len(front_circle_vertices) + quadrant
-            triangle_indices.append(
-                [closest_corner_index, i, (i + 1) % len(front_circle_vertices)])
-
-        front_face = GLPolygon(front_vertices, triangle_indices)
-
-        # Create back face
+        # The faces and cylinder are cached, so every aperture with the same
+        # smoothness shares the same meshes. Less detailed meshes are drawn
+        # when the aperture is small on screen.
+        front_face = generators.create_lod('hole_face', smoothness)
+
         back_face = front_face.clone()
         back_face.orientation[1] = 180.
         back_face.position[2] = 1.
 
-        # Create cylinder between faces - starting by creating the circular
-        # vertices of the back face...
-        back_circular_vertices = np.array(front_circle_vertices)
-        back_circular_vertices[:, 2] += 1.
-        back_circle_start_index = len(front_circle_vertices)
-        circle_vertices = np.append(front_circle_vertices,
-                                    back_circular_vertices,
-                                    0)
-
-        # ...and now create the cylinder triangles
-        triangle_indices = []
-        for front_vertex in range(len(front_circle_vertices)) + [0]:
-            back_vertex = front_vertex + back_circle_start_index
-            triangle_indices.extend([front_vertex, back_vertex])
-        cylinder = GLPolygon.triangle_strip(circle_vertices, triangle_indices)
+        cylinder = generators.create_lod('hole_wall', smoothness)
 
         return CompositePolygon({'front_face': front_face,
                                  'back_face': back_face,
                                  'cylinder': cylinder})
+
+
+@ObservableProperties('hole_size', 'hole_position', 'scale_hole')
+class SolidAperture(GLPolygon):
+    """
+    An aperture drawn as one closed mesh (see generators.aperture()), rather
+    than as four boxes and a hole, so there are no faces inside it and no
+    children to reposition.
+
+    Its size, hole_size and hole_position are all in the same units, as in
+    Aperture. As changing them never changes the triangles, the vertices
+    are rewritten in place (and the backends that drew the mesh update
+    their copies the next time they draw it).
+    """
+
+    def __init__(self, smoothness=400, to_clone=None):
+        if to_clone is not None:
+            smoothness = to_clone.segments
+
+        self.segments = generators.aperture_segments(smoothness)
+        triangles, parts = generators.aperture_topology(self.segments)
+        self._welded_vertices = np.empty((2 * (self.segments + 8), 3))
+        # The front, back, bore and sides get their own copies of the
+        # vertices they share, so the edges stay sharp
+        self._source, self._triangles = mesh.split_parts(triangles, parts)
+        vertex_count = len(self._source)
+        buffers = MeshBuffers(np.zeros((vertex_count, 3)),
+                              np.zeros((vertex_count, 3)), self._triangles)
+
+        # Backends whose copy of the mesh is out of date
+        self._stale_backends = set()
+
+        # Never shared, as it's changed in place
+        super(SolidAperture, self).__init__(buffers=buffers, shared=False)
+        self.auto_transform['size'] = False
+
+        with self.delayed_callback('init'):
+            if to_clone is not None:
+                self.orientation[:] = to_clone.orientation
+                self.position[:] = to_clone.position
+                self.size[:] = to_clone.size
+                self.hole_size = ObservableArray.like(to_clone.hole_size)
+                self.hole_position = ObservableArray.like(
+                    to_clone.hole_position)
+                self.scale_hole = to_clone.scale_hole
+            else:
+                self.hole_size = ObservableArray.like([1., 1.])
+                self.hole_position = ObservableArray.like([0.5, 0.5])
+                self.scale_hole = True
+            self._built_size = np.array(self.size)
+            self.callbacks.add(self.handle_change)
+
+    def handle_change(self, changed_object=None, reason=None):
+        if reason in ('orientation', 'position', 'scale_hole'):
+            return
+
+        if reason == 'size' and self.scale_hole:
+            previous_size = self._built_size[:2]
+            scale = np.ones(2)
+            scale[previous_size != 0] = self.size[:2][previous_size != 0] / \
+                previous_size[previous_size != 0]
+            self.hole_position *= scale
+            self.hole_size *= scale
+
+        # Allowing for rounding when the hole is scaled
+        hole_end = self.hole_position + self.hole_size / 2 - 1e-9
+        hole_start = self.hole_position - self.hole_size / 2 + 1e-9
+        assert np.all(self.size[:2] >= hole_end) and \
+            np.all(hole_start >= 0), "Hole extends out of aperture"
+
+        self._rebuild()
+
+    def _rebuild(self):
+        # Rewrite the vertices in place: the triangles never change
+        generators.aperture_vertices(self.segments, self.size, self.hole_size,
+                                     self.hole_position,
+                                     out=self._welded_vertices)
+        vertices = self._welded_vertices[self._source]
+        self.buffers.positions[:] = vertices
+        self.buffers.normals[:] = mesh.vertex_normals(vertices,
+                                                      self._triangles)
+        self.buffers.changed()
+        self._stale_backends.update(self.gl_resources)
+        self._built_size = np.array(self.size)
+
+    def draw(self):
+        backend = backends.current()
+        if backend in self._stale_backends:
+            self._stale_backends.discard(backend)
+            resource = self.gl_resources.get(backend)
+            if resource is not None:
+                self.gl_resources[backend] = backend.update(resource,
+                                                            self.buffers)
+        super(SolidAperture, self).draw()
+
+    def clone(self):
+        return SolidAperture(to_clone=self)
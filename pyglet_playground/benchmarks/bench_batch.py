@@ -0,0 +1,70 @@
+"""
+Benchmarks for the parallel batch renderer in core.batch.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_batch
+
+Renders a sweep of aperture hole sizes and orientations with 1, 2, 4, ...
+worker processes, up to the number of CPUs.
+"""
+import multiprocessing
+import shutil
+import tempfile
+import time
+
+__author__ = 'eatmuchpie'
+
+
+def create_scene():
+    from aperture import Aperture
+    from core import generators, software
+    from core.scene import Scene
+
+    scene = Scene(backend=software.SoftwareBackend(), window=False)
+    aperture = Aperture()
+    aperture.position[:] = [-1., -1., -6.]
+    aperture.size[:] = [2., 2., 2.]
+    torus = generators.create('torus', 1, 0.3, 200, 100)
+    torus.position[:] = [1.5, 1., -8.]
+    scene._polygons = {'aperture': aperture, 'torus': torus}
+    return scene
+
+
+def set_frame(scene, params):
+    hole_size, angle = params
+    aperture = scene._polygons['aperture']
+    aperture.hole.size[:2] = [hole_size, hole_size]
+    aperture.orientation[1] = angle
+
+
+def sweep(frames):
+    return [(0.2 + 1.6 * (i % 10) / 10., 360. * i / frames)
+            for i in range(frames)]
+
+
+def frames_per_second(processes, frames=64, width=256, height=192):
+    from core import batch
+
+    directory = tempfile.mkdtemp()
+    try:
+        start = time.time()
+        for path in batch.render_frames(create_scene, set_frame,
+                                        sweep(frames),
+                                        directory + '/{0:05d}.png',
+                                        width, height, processes):
+            pass
+        return frames / (time.time() - start)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    cpus = multiprocessing.cpu_count()
+    counts = sorted(set([1, cpus] + [2 ** i for i in range(1, 8)
+                                     if 2 ** i <= cpus]))
+    serial = None
+    for processes in counts:
+        rate = frames_per_second(processes)
+        serial = serial or rate
+        print('{0:>3} processes: {1:6.1f} frames/s ({2:4.2f}x)'.format(
+            processes, rate, rate / serial))
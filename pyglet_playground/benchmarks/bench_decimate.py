@@ -0,0 +1,85 @@
+"""
+Benchmarks for mesh simplification in core.decimate.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_decimate
+
+The inputs are spheres and tori of up to about a million triangles.
+"""
+import time
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+# (generator name, parameters), from about 10^4 to 10^6 triangles
+MESHES = [
+    ('sphere', (1, 100, 50)),
+    ('sphere', (1, 320, 160)),
+    ('sphere', (1, 1000, 500)),
+    ('torus', (1, 0.3, 1000, 500)),
+]
+
+
+def simplify_seconds(name, params, ratio=0.1):
+    """
+    Time simplifying a generated mesh to a fraction of its triangles.
+
+    :return: dict of the triangles before ('input') and after ('output'),
+        the seconds taken, the error reported by the simplifier and the
+        largest distance of an output vertex from the input's surface
+        ('radius_error', for spheres only).
+    """
+    from core import decimate, generators
+
+    vertices, triangles = generators.GENERATORS[name](*params)
+    start = time.time()
+    simplified, simplified_triangles, error = decimate.simplify(
+        vertices, triangles, target_triangles=int(len(triangles) * ratio))
+    seconds = time.time() - start
+
+    result = {
+        'input': len(triangles),
+        'output': len(simplified_triangles),
+        'seconds': seconds,
+        'error': error,
+    }
+    if name == 'sphere':
+        distances = np.sqrt(np.einsum('ij,ij->i', simplified, simplified))
+        result['radius_error'] = np.abs(distances - params[0]).max()
+    return result
+
+
+def lod_seconds(name='torus', params=(1, 0.3, 1000, 500)):
+    """
+    Time making four levels of detail of a generated mesh offline.
+
+    :return: dict of the seconds taken ('seconds') and the triangles and
+        error of each level ('levels')
+    """
+    from core import decimate, generators
+
+    vertices, triangles = generators.GENERATORS[name](*params)
+    start = time.time()
+    levels = decimate.lod_levels(vertices, triangles)
+    return {
+        'seconds': time.time() - start,
+        'levels': [(len(level_triangles), error)
+                   for _, level_triangles, error in levels],
+    }
+
+
+if __name__ == '__main__':
+    for name, params in MESHES:
+        result = simplify_seconds(name, params)
+        print('{0:>7} {1:>8} -> {2:>7} triangles: {3:7.2f} s '
+              '({4:8.0f} triangles/s), error {5:.2e}'.format(
+                  name, result['input'], result['output'], result['seconds'],
+                  result['input'] / result['seconds'], result['error']))
+        if 'radius_error' in result:
+            print('{0:>50} {1:.2e}'.format('radius error', result['radius_error']))
+
+    result = lod_seconds()
+    print('{0:>7} levels: {1:7.2f} s'.format('torus', result['seconds']))
+    for triangles, error in result['levels']:
+        print('{0:>16} triangles, error {1:.2e}'.format(triangles, error))
@@ -0,0 +1,104 @@
+"""
+Benchmarks for the on-disk mesh cache in core.disk_cache.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_disk_cache
+
+Each start is run in a fresh interpreter, so nothing is shared through the
+in-memory mesh cache.
+"""
+import shutil
+import subprocess
+import sys
+import tempfile
+import timeit
+
+__author__ = 'eatmuchpie'
+
+
+# Builds the meshes a scene starts with, and prints how long it took (not
+# counting the imports, which take the same time either way)
+STARTUP = """
+import time
+from aperture import Aperture
+from core import disk_cache, generators
+
+start = time.time()
+if {directory!r} is not None:
+    disk_cache.enable({directory!r})
+apertures = [Aperture(smoothness=400) for i in range(20)]
+torus = generators.create('torus', 1, 0.3, 200, 100)
+sphere = generators.create('sphere', 1, 256, 128)
+print(time.time() - start)
+"""
+
+
+def startup_seconds(directory=None):
+    """
+    The time taken to build the meshes of a scene in a new interpreter,
+    with the disk cache in the given directory (or with it disabled, if no
+    directory is given).
+    """
+    output = subprocess.check_output(
+        [sys.executable, '-c', STARTUP.format(directory=directory)])
+    return float(output.split()[-1])
+
+
+def cold_and_warm_startup(repeat=3):
+    """
+    :return: dict of the fastest startup time without the disk cache
+        ('uncached'), with an empty disk cache ('cold') and with a full disk
+        cache ('warm').
+    """
+    directory = tempfile.mkdtemp()
+    try:
+        cold = []
+        for _ in range(repeat):
+            shutil.rmtree(directory)
+            cold.append(startup_seconds(directory))
+
+        return {
+            'uncached': min(startup_seconds() for _ in range(repeat)),
+            'cold': min(cold),
+            'warm': min(startup_seconds(directory) for _ in range(repeat)),
+        }
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def load_seconds(number=100):
+    """
+    Time loading a large generated mesh from a warm disk cache, against
+    generating and preparing it.
+
+    :return: dict of seconds per mesh for each case
+    """
+    from core import disk_cache, generators
+
+    params = (1, 0.3, 200, 100)
+    directory = tempfile.mkdtemp()
+    try:
+        cache = disk_cache.DiskMeshCache(directory)
+
+        def generate():
+            disk_cache.generated_buffers('torus', params, generators.torus)
+
+        def load():
+            cache.buffers(disk_cache.generator_key('torus', params), None)
+
+        cache.buffers(disk_cache.generator_key('torus', params),
+                      lambda: disk_cache.generated_buffers('torus', params,
+                                                           generators.torus))
+        return {
+            'generate': min(timeit.repeat(generate, number=number, repeat=3)) / number,
+            'load': min(timeit.repeat(load, number=number, repeat=3)) / number,
+        }
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    for name, seconds in sorted(cold_and_warm_startup().items()):
+        print('{0:>12}: {1:8.3f} s startup'.format(name, seconds))
+    for name, seconds in sorted(load_seconds().items()):
+        print('{0:>12}: {1:8.3f} ms per torus'.format(name, seconds * 1000))
@@ -0,0 +1,67 @@
+"""
+Benchmarks for the observer system in core.utility.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_observables
+"""
+import gc
+import timeit
+import numpy as np
+
+from core.transformable import Transformable
+from core.utility import ObservableArray
+
+__author__ = 'eatmuchpie'
+
+
+def callbacks_per_second(number=100000):
+    """
+    Time item assignment on a raw ndarray, an unobserved ObservableArray and
+    the position of a Transformable (which notifies the Transformable).
+
+    :return: dict of assignments per second for each case
+    """
+    raw = np.zeros(3)
+    unobserved = ObservableArray.like([0., 0., 0.])
+    observed = Transformable().position
+
+    results = {}
+    for name, array in ('raw', raw), ('unobserved', unobserved), \
+                       ('observed', observed):
+        def assign():
+            array[0] = 1.
+        seconds = min(timeit.repeat(assign, number=number, repeat=3))
+        results[name] = number / seconds
+
+    return results
+
+
+def reassignment_memory(reassignments=10000):
+    """
+    Repeatedly reassign a Transformable's size to the same array, and to
+    new arrays.
+
+    :return: dict with the number of callbacks left on the shared array and
+        the number of objects left alive by the reassignments
+    """
+    obj = Transformable()
+    shared = ObservableArray.like([1., 1., 1.])
+
+    gc.collect()
+    objects_before = len(gc.get_objects())
+    for _ in range(reassignments):
+        obj.size = shared
+        obj.size = ObservableArray.like([1., 1., 1.])
+    gc.collect()
+
+    return {
+        'shared_array_callbacks': len(shared.callbacks),
+        'objects_leaked': len(gc.get_objects()) - objects_before,
+    }
+
+
+if __name__ == '__main__':
+    for name, rate in sorted(callbacks_per_second().items()):
+        print('{0:>12}: {1:12,.0f} assignments/s'.format(name, rate))
+    for name, value in sorted(reassignment_memory().items()):
+        print('{0:>24}: {1}'.format(name, value))
@@ -0,0 +1,75 @@
+"""
+Benchmarks for the software renderer in core.software.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_software
+"""
+import time
+
+__author__ = 'eatmuchpie'
+
+
+def thumbnail_seconds(width=256, height=192, frames=20, smoothness=400):
+    """
+    Time drawing a headless Scene of an Aperture (as in the Scene demo), a
+    SolidAperture and a torus, and saving each frame as a PNG.
+
+    :return: dict of the seconds per frame drawn ('draw') and saved
+        ('save'), and the triangles and fragments of the last frame
+    """
+    import os
+    import tempfile
+    from aperture import Aperture, SolidAperture
+    from core import generators, software
+    from core.scene import Scene
+
+    backend = software.SoftwareBackend()
+    scene = Scene(backend=backend, window=False)
+
+    aperture = Aperture(smoothness)
+    aperture.position[:] = [-1., -1., -6.]
+    aperture.orientation[:] = [10., 30., 0.]
+    aperture.size[:] = [2., 2., 2.]
+    aperture.hole.size[:2] = [1., 1.]
+    aperture.lbox.size[0] = 3.
+    aperture.tbox.size[1] = 2.5
+
+    solid = SolidAperture(smoothness)
+    solid.position[:] = [-3., -2., -9.]
+    solid.orientation[:] = [0., -30., 20.]
+    solid.size[:] = [2., 2., 1.]
+
+    torus = generators.create('torus', 1, 0.3, 64, 32)
+    torus.position[:] = [1.5, 1., -8.]
+
+    scene._polygons = {'aperture': aperture, 'solid': solid, 'torus': torus}
+    scene.on_resize(width, height)
+
+    start = time.time()
+    for frame in range(frames):
+        aperture.orientation[1] += 360. / frames
+        scene.draw()
+    draw = (time.time() - start) / frames
+
+    handle, path = tempfile.mkstemp(suffix='.png')
+    os.close(handle)
+    try:
+        start = time.time()
+        for frame in range(frames):
+            backend.framebuffer.save(path)
+        save = (time.time() - start) / frames
+    finally:
+        os.remove(path)
+
+    return {'draw': draw, 'save': save, 'triangles': backend.triangles,
+            'fragments': backend.fragments}
+
+
+if __name__ == '__main__':
+    for width, height in (128, 96), (256, 192), (640, 480):
+        result = thumbnail_seconds(width, height)
+        seconds = result['draw'] + result['save']
+        print('{0:>4}x{1:<4} {2:6.1f} ms draw {3:6.1f} ms save '
+              '{4:8.0f} frames/hour ({5} triangles, {6} fragments)'.format(
+                  width, height, result['draw'] * 1000, result['save'] * 1000,
+                  3600 / seconds, result['triangles'], result['fragments']))
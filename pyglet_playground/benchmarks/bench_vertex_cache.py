@@ -0,0 +1,78 @@
+"""
+Benchmarks for the vertex cache reordering in core.vertex_cache.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.bench_vertex_cache
+
+The ACMR (vertices transformed per triangle) and ATVR (vertices transformed
+per vertex) are measured with a simulated FIFO cache, before and after
+reordering. Imported meshes come in no useful order, so they're stood in for
+by generated meshes with their triangles shuffled, and by a simplified mesh.
+"""
+import time
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+def _shuffled(vertices, triangles):
+    return vertices, triangles[np.random.RandomState(0).permutation(len(triangles))]
+
+
+def _simplified(vertices, triangles):
+    from core import decimate
+    return decimate.simplify(vertices, triangles,
+                             target_triangles=len(triangles) // 4)[:2]
+
+
+# (description, generator name, parameters, function to scramble the mesh)
+MESHES = [
+    ('aperture face', 'hole_face', (400,), None),
+    ('aperture wall', 'hole_wall', (400,), None),
+    ('sphere', 'sphere', (1, 256, 128), None),
+    ('shuffled sphere', 'sphere', (1, 256, 128), _shuffled),
+    ('simplified torus', 'torus', (1, 0.3, 400, 200), _simplified),
+    ('shuffled torus', 'torus', (1, 0.3, 1000, 500), _shuffled),
+]
+
+
+def reorder(name, params, scramble=None, cache_size=16):
+    """
+    Reorder a generated mesh.
+
+    :return: dict of the number of triangles, the seconds taken to reorder
+        them, and the ACMR and ATVR before ('acmr', 'atvr') and after
+        ('optimized_acmr', 'optimized_atvr') reordering.
+    """
+    from core import generators, mesh, vertex_cache
+
+    vertices, triangles = generators.GENERATORS[name](*params)
+    if scramble is not None:
+        vertices, triangles = scramble(vertices, triangles)
+    vertices, normals, triangles = mesh.prepare(vertices, triangles)
+
+    start = time.time()
+    optimized = vertex_cache.optimize(vertices, normals, triangles,
+                                      cache_size)[2]
+    seconds = time.time() - start
+
+    return {
+        'triangles': len(triangles),
+        'seconds': seconds,
+        'acmr': vertex_cache.acmr(triangles, cache_size),
+        'atvr': vertex_cache.atvr(triangles, cache_size),
+        'optimized_acmr': vertex_cache.acmr(optimized, cache_size),
+        'optimized_atvr': vertex_cache.atvr(optimized, cache_size),
+    }
+
+
+if __name__ == '__main__':
+    print('{0:>16} {1:>9} {2:>13} {3:>13} {4:>8}'.format(
+        '', 'triangles', 'ACMR', 'ATVR', 'seconds'))
+    for description, name, params, scramble in MESHES:
+        result = reorder(name, params, scramble)
+        print('{0:>16} {1:>9} {2:5.3f} -> {3:5.3f} {4:5.3f} -> {5:5.3f} '
+              '{6:8.2f}'.format(description, result['triangles'],
+                                result['acmr'], result['optimized_acmr'],
+                                result['atvr'], result['optimized_atvr'],
+                                result['seconds']))
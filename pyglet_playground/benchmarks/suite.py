@@ -0,0 +1,298 @@
+"""
+A suite of benchmarks covering polygon construction, updates and drawing,
+whose results are saved as JSON and compared with a saved baseline.
+
+Run from the pyglet_playground directory with:
+    python -m benchmarks.suite [--quick] [--output results.json]
+                               [--baseline baseline.json] [--threshold 0.25]
+                               [benchmark names...]
+
+Drawing is recorded by a gl_recording.CommandRecorder, so no GL context or
+display is needed. Each result is the shortest time per call out of a few
+repeats. With --baseline, benchmarks that got slower than the baseline by
+more than the threshold (a fraction, so 0.25 is 25%) are listed, and the
+exit status is 1.
+
+To keep a baseline, save the results of a run on the commit to compare
+against:
+    python -m benchmarks.suite --output baseline.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import numpy as np
+
+# Before anything imports pyglet.gl, so no display is needed
+from core import headless
+
+__author__ = 'eatmuchpie'
+
+
+# (name, function, parameters, parameters with --quick) of each benchmark.
+# The function is called with one parameter, to set up, and returns the
+# function to time.
+BENCHMARKS = []
+
+# The least time spent on each repeat, in seconds
+MIN_REPEAT_SECONDS = 0.2
+REPEATS = 3
+
+
+def _benchmark(params, quick_params=None):
+    def register(function):
+        BENCHMARKS.append((function.__name__, function, params,
+                           params if quick_params is None else quick_params))
+        return function
+    return register
+
+
+@_benchmark([100, 1000, 10000, 100000], [100, 1000, 10000])
+def polygon_construction(vertex_count):
+    """
+    GLPolygon(vertices, triangles) of a grid with about vertex_count
+    vertices.
+    """
+    from core.gl_polygon import GLPolygon
+
+    side = int(np.sqrt(vertex_count))
+    x, y = np.meshgrid(np.arange(side, dtype=float), np.arange(side))
+    vertices = np.column_stack((x.ravel(), y.ravel(),
+                                np.sin(x.ravel() + y.ravel())))
+    corners = np.arange(side * side).reshape(side, side)[:-1, :-1].ravel()
+    triangles = np.concatenate((
+        np.column_stack((corners, corners + 1, corners + side + 1)),
+        np.column_stack((corners, corners + side + 1, corners + side))))
+
+    def run():
+        GLPolygon(vertices, triangles)
+    return run
+
+
+@_benchmark([10, 100, 400, 1000], [10, 100, 400])
+def aperture_creation(smoothness):
+    """
+    Aperture(smoothness), with the generated mesh cache emptied first.
+    """
+    from aperture import Aperture
+    from core import generators
+
+    def run():
+        generators.mesh_cache.clear()
+        Aperture(smoothness)
+    return run
+
+
+@_benchmark([400])
+def aperture_clone(smoothness):
+    from aperture import Aperture
+
+    aperture = Aperture(smoothness)
+
+    def run():
+        aperture.clone()
+    return run
+
+
+@_benchmark([400])
+def aperture_resize(smoothness):
+    """
+    Changing an Aperture's size, which calls its handle_change() to move
+    and resize the parts.
+    """
+    from aperture import Aperture
+
+    aperture = Aperture(smoothness)
+    sizes = itertools.cycle([2., 3.])
+
+    def run():
+        aperture.size[0] = next(sizes)
+    return run
+
+
+def _tree(leaves, branching=10):
+    # A tree of CompositePolygons with the given number of GLPolygons at
+    # the bottom, and branching polygons in each CompositePolygon
+    from core import generators
+    from core.composite_polygon import CompositePolygon
+
+    box = generators.create('box')
+    polygons = [box.clone() for _ in range(leaves)]
+    for index, polygon in enumerate(polygons):
+        polygon.position[:] = [index % 100, index // 100 % 100, index // 10000]
+    while len(polygons) > 1:
+        polygons = [CompositePolygon(dict(enumerate(
+            polygons[start:start + branching])))
+            for start in range(0, len(polygons), branching)]
+    return polygons[0]
+
+
+@_benchmark([100, 1000, 10000, 100000], [100, 1000, 10000])
+def tree_update(leaves):
+    """
+    CompositePolygon.update() of a tree with the given number of
+    GLPolygons.
+    """
+    tree = _tree(leaves)
+
+    def run():
+        tree.update(1 / 60.)
+    return run
+
+
+@_benchmark([100, 1000, 10000, 100000], [100, 1000, 10000])
+def tree_draw(leaves):
+    """
+    CompositePolygon.draw() of a tree with the given number of GLPolygons,
+    with display lists recorded by a CommandRecorder.
+    """
+    from core import backends, gl_recording
+
+    tree = _tree(leaves)
+    recorder = gl_recording.CommandRecorder()
+    backend = backends.DisplayListBackend(recorder)
+
+    def run():
+        with backends.using(backend):
+            tree.draw()
+        recorder.begin_frame()
+    return run
+
+
+@_benchmark([1, 10, 100])
+def observer_callbacks(observers):
+    """
+    Assigning to an element of a Transformable's position, with the given
+    number of functions subscribed to it.
+    """
+    from core.transformable import Transformable
+
+    obj = Transformable()
+    calls = []
+    for _ in range(observers):
+        obj.subscribe(lambda changed, reason: calls.append(reason))
+    values = itertools.cycle([1., 2.])
+
+    def run():
+        obj.position[0] = next(values)
+        del calls[:]
+    return run
+
+
+def time_call(function):
+    """
+    :return: the shortest time per call of function() out of REPEATS
+        repeats, with enough calls in each to take at least
+        MIN_REPEAT_SECONDS.
+    """
+    start = time.time()
+    function()
+    number = max(1, int(MIN_REPEAT_SECONDS / max(time.time() - start, 1e-9)))
+
+    best = np.inf
+    for _ in range(REPEATS):
+        start = time.time()
+        for _ in range(number):
+            function()
+        best = min(best, (time.time() - start) / number)
+    return best
+
+
+def run(names=None, quick=False, log=None):
+    """
+    Run the benchmarks.
+
+    :param names: the names of the benchmarks to run, or None for all.
+    :param quick: if True, the biggest parameters are skipped.
+    :param log: called with the key and seconds of each result as it's
+        timed.
+    :return: the results, as saved by save().
+    """
+    results = {}
+    for name, function, params, quick_params in BENCHMARKS:
+        if names and name not in names:
+            continue
+        for param in (quick_params if quick else params):
+            key = '{0}[{1}]'.format(name, param)
+            seconds = time_call(function(param))
+            results[key] = seconds
+            if log is not None:
+                log(key, seconds)
+
+    return {'environment': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+            'seconds': results}
+
+
+def save(results, path):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2, sort_keys=True)
+
+
+def load(path):
+    with open(path) as results_file:
+        return json.load(results_file)
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Find the benchmarks that are slower than in the baseline.
+
+    :param threshold: how much slower a benchmark can be before it's a
+        regression, as a fraction of its baseline time.
+    :return: a list of (key, baseline seconds, seconds) of the regressions,
+        from the biggest slowdown down. Benchmarks missing from either
+        results are ignored.
+    """
+    regressions = []
+    for key, seconds in results['seconds'].items():
+        baseline_seconds = baseline['seconds'].get(key)
+        if baseline_seconds is not None and \
+                seconds > baseline_seconds * (1. + threshold):
+            regressions.append((key, baseline_seconds, seconds))
+    regressions.sort(key=lambda regression: regression[1] / regression[2])
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('names', nargs='*',
+                        help='the benchmarks to run (all by default)')
+    parser.add_argument('--quick', action='store_true',
+                        help='skip the biggest parameters')
+    parser.add_argument('--output', help='save the results to this file')
+    parser.add_argument('--baseline', help='compare with the results saved '
+                                           'in this file')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='the slowdown allowed, as a fraction')
+    args = parser.parse_args(argv)
+
+    baseline = load(args.baseline) if args.baseline else None
+
+    def log(key, seconds):
+        line = '{0:32} {1:10.3f} ms'.format(key, seconds * 1000)
+        if baseline is not None and key in baseline['seconds']:
+            line += ' {0:+7.1%}'.format(
+                seconds / baseline['seconds'][key] - 1.)
+        print(line)
+        sys.stdout.flush()
+
+    results = run(args.names, args.quick, log)
+    if args.output:
+        save(results, args.output)
+
+    if baseline is None:
+        return 0
+    regressions = compare(results, baseline, args.threshold)
+    for key, baseline_seconds, seconds in regressions:
+        print('Regression: {0} took {1:.3f} ms, up from {2:.3f} ms'.format(
+            key, seconds * 1000, baseline_seconds * 1000))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
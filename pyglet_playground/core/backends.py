@@ -0,0 +1,346 @@
+"""
+Render backends, which turn a GLPolygon's MeshBuffers into GL objects and
+draw them.
+
+A backend is chosen per Scene, and the Scene makes it current while it draws
+so GLPolygon.draw() knows which one to use. GL objects are created lazily the
+first time a mesh is drawn by a backend, and are stored in the polygon's
+gl_resources dictionary, which is shared between clones. They're tracked by
+core.resources, which deletes them once no polygon uses the mesh.
+
+All GL functions are called through self.gl (pyglet.gl by default), so a
+backend can be pointed at a recording stub and tested without a GL context.
+"""
+import abc
+from contextlib import contextmanager
+from ctypes import byref, c_void_p, sizeof, POINTER
+import pyglet.gl
+from pyglet.gl import GLfloat, GLuint, GL_COMPILE, GL_CLIENT_VERTEX_ARRAY_BIT, \
+    GL_VERTEX_ARRAY, GL_NORMAL_ARRAY, GL_FLOAT, GL_TRIANGLES, \
+    GL_ARRAY_BUFFER, GL_ELEMENT_ARRAY_BUFFER, GL_STATIC_DRAW, GL_STREAM_DRAW, \
+    GL_FALSE, GL_PROJECTION, GL_MODELVIEW, GL_COLOR_BUFFER_BIT, \
+    GL_DEPTH_BUFFER_BIT
+
+from core import instancing, shaders
+from core.resources import resource_manager
+from core.buffers import NORMAL_OFFSET, POSITION_OFFSET
+
+__author__ = 'eatmuchpie'
+
+
+class RenderBackend(object):
+    """
+    Draws GLPolygons, creating the GL objects they need on first use.
+    """
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, gl=pyglet.gl):
+        """
+        :param gl: the namespace to call GL functions on.
+        """
+        self.gl = gl
+
+    def draw(self, polygon):
+        """
+        Draw the polygon's mesh with its world matrix, uploading the mesh
+        first if needed.
+        """
+        self.gl.glLoadMatrixf(
+            polygon.gl_world_matrix.ctypes.data_as(POINTER(GLfloat)))
+        self.draw_resource(self.resource_for(polygon))
+
+    def flush(self):
+        """
+        Called once the whole scene has been drawn, to finish any drawing
+        that self.draw() deferred.
+        """
+        pass
+
+    def set_viewport(self, width, height, field_of_view, near, far):
+        """
+        Draw to a viewport of the given size in pixels, with a
+        gluPerspective projection.
+        """
+        gl = self.gl
+        gl.glViewport(0, 0, width, height)
+        gl.glMatrixMode(GL_PROJECTION)
+        gl.glLoadIdentity()
+        gl.gluPerspective(field_of_view, width / float(height), near, far)
+        gl.glMatrixMode(GL_MODELVIEW)
+
+    def clear(self):
+        """
+        Called at the start of each frame, to clear the viewport.
+        """
+        self.gl.glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.gl.glLoadIdentity()
+
+    def resource_for(self, polygon):
+        """
+        The GL objects for the polygon's mesh, which are uploaded the first
+        time they're needed.
+        """
+        resource = polygon.gl_resources.get(self)
+        if resource is None:
+            resource = self.upload(polygon.buffers)
+            polygon.gl_resources[self] = resource
+            resource_manager.track(self, resource, polygon.buffers.nbytes)
+        return resource
+
+    @abc.abstractmethod
+    def upload(self, buffers):
+        """
+        Create the GL objects for the given MeshBuffers.
+
+        :return: the object to pass to self.draw_resource()
+        """
+        pass
+
+    def update(self, resource, buffers):
+        """
+        Replace the vertex data of a resource that was returned by
+        self.upload() with the data in buffers, whose layout and triangles
+        must be the same (e.g. after changing them in place). By default it's
+        uploaded again, and the old GL objects are deleted by the next
+        resource_manager.collect().
+
+        :return: the resource to use from now on
+        """
+        resource_manager.release({self: resource})
+        new_resource = self.upload(buffers)
+        resource_manager.track(self, new_resource, buffers.nbytes)
+        return new_resource
+
+    @abc.abstractmethod
+    def draw_resource(self, resource):
+        """
+        Draw a resource that was returned by self.upload().
+        """
+        pass
+
+    @abc.abstractmethod
+    def delete(self, resource):
+        """
+        Delete the GL objects of a resource that was returned by
+        self.upload().
+        """
+        pass
+
+
+class DisplayListBackend(RenderBackend):
+    """
+    Compiles each mesh into a legacy display list.
+    """
+
+    def upload(self, buffers):
+        gl = self.gl
+        gl_list = gl.glGenLists(1)
+        gl.glNewList(gl_list, GL_COMPILE)
+
+        gl.glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        gl.glEnableClientState(GL_VERTEX_ARRAY)
+        gl.glEnableClientState(GL_NORMAL_ARRAY)
+        gl.glVertexPointer(3, GL_FLOAT, buffers.stride,
+                           buffers.position_pointer())
+        gl.glNormalPointer(GL_FLOAT, buffers.stride,
+                           buffers.normal_pointer())
+        gl.glDrawElements(GL_TRIANGLES, buffers.index_count,
+                          buffers.index_type, buffers.index_pointer())
+        gl.glPopClientAttrib()
+
+        gl.glEndList()
+        return gl_list
+
+    def draw_resource(self, gl_list):
+        self.gl.glCallList(gl_list)
+
+    def delete(self, gl_list):
+        self.gl.glDeleteLists(gl_list, 1)
+
+
+class BufferObjects(object):
+    """
+    The vertex and index buffer objects holding one mesh.
+    """
+
+    def __init__(self, vertex_buffer, index_buffer, buffers):
+        self.vertex_buffer = vertex_buffer
+        self.index_buffer = index_buffer
+        self.stride = buffers.stride
+        self.index_count = buffers.index_count
+        self.index_type = buffers.index_type
+
+
+class BufferObjectBackend(RenderBackend):
+    """
+    Keeps each mesh in a vertex buffer object and an index buffer object.
+    """
+
+    def upload(self, buffers):
+        gl = self.gl
+        vertex_buffer = self._create_buffer(GL_ARRAY_BUFFER,
+                                            buffers.vertex_data)
+        index_buffer = self._create_buffer(GL_ELEMENT_ARRAY_BUFFER,
+                                           buffers.index_data)
+        gl.glBindBuffer(GL_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        return BufferObjects(vertex_buffer, index_buffer, buffers)
+
+    def update(self, resource, buffers):
+        # The buffer object is kept, and only its contents are replaced
+        data = buffers.vertex_data
+        self.gl.glBindBuffer(GL_ARRAY_BUFFER, resource.vertex_buffer)
+        self.gl.glBufferSubData(GL_ARRAY_BUFFER, 0, data.nbytes,
+                                c_void_p(data.ctypes.data))
+        self.gl.glBindBuffer(GL_ARRAY_BUFFER, 0)
+        return resource
+
+    def draw_resource(self, resource):
+        self._bind(resource)
+        self.gl.glDrawElements(GL_TRIANGLES, resource.index_count,
+                               resource.index_type, c_void_p(0))
+        self._unbind()
+
+    def delete(self, resource):
+        buffer_ids = (GLuint * 2)(resource.vertex_buffer, resource.index_buffer)
+        self.gl.glDeleteBuffers(2, buffer_ids)
+
+    def _bind(self, resource):
+        gl = self.gl
+        float_size = sizeof(GLfloat)
+
+        gl.glBindBuffer(GL_ARRAY_BUFFER, resource.vertex_buffer)
+        gl.glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, resource.index_buffer)
+        gl.glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        gl.glEnableClientState(GL_VERTEX_ARRAY)
+        gl.glEnableClientState(GL_NORMAL_ARRAY)
+
+        # With a buffer bound, the "pointers" are byte offsets into it
+        gl.glVertexPointer(3, GL_FLOAT, resource.stride,
+                           c_void_p(POSITION_OFFSET * float_size))
+        gl.glNormalPointer(GL_FLOAT, resource.stride,
+                           c_void_p(NORMAL_OFFSET * float_size))
+
+    def _unbind(self):
+        gl = self.gl
+        gl.glPopClientAttrib()
+        gl.glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        gl.glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def _create_buffer(self, target, array):
+        buffer_id = GLuint()
+        self.gl.glGenBuffers(1, byref(buffer_id))
+        self.gl.glBindBuffer(target, buffer_id.value)
+        self.gl.glBufferData(target, array.nbytes, c_void_p(array.ctypes.data),
+                             GL_STATIC_DRAW)
+        return buffer_id.value
+
+
+class InstancedBackend(BufferObjectBackend):
+    """
+    Draws all the clones of a mesh with a single instanced draw call.
+
+    self.draw() only records the polygon and its world matrix; the drawing
+    is done by self.flush(), which draws each mesh once with a per-instance
+    buffer of world matrices. This needs GL 3.3 (or ARB_instanced_arrays).
+
+    self.draw_calls and self.instances count what the last flush drew.
+    """
+
+    def __init__(self, gl=pyglet.gl):
+        super(InstancedBackend, self).__init__(gl)
+        self.batcher = instancing.InstanceBatcher()
+        self.draw_calls = 0
+        self.instances = 0
+        self._program = None
+        self._instance_buffer = None
+
+    def draw(self, polygon):
+        self.batcher.add(polygon)
+
+    def flush(self):
+        batches = self.batcher.take()
+        self.draw_calls = len(batches)
+        self.instances = sum(len(batch) for batch in batches)
+        if not batches:
+            return
+
+        gl = self.gl
+        if self._program is None:
+            self._program = shaders.compile_program(
+                gl, shaders.INSTANCED_VERTEX_SHADER,
+                shaders.INSTANCED_FRAGMENT_SHADER,
+                shaders.INSTANCED_ATTRIBUTES)
+            buffer_id = GLuint()
+            gl.glGenBuffers(1, byref(buffer_id))
+            self._instance_buffer = buffer_id.value
+
+        gl.glUseProgram(self._program)
+        for batch in batches:
+            resource = self.resource_for(batch.polygon)
+            self._bind(resource)
+            self._bind_instances(batch.instance_data())
+            gl.glDrawElementsInstanced(GL_TRIANGLES, resource.index_count,
+                                       resource.index_type, c_void_p(0),
+                                       len(batch))
+            self._unbind_instances()
+            self._unbind()
+        gl.glUseProgram(0)
+
+    def _bind_instances(self, data):
+        gl = self.gl
+        float_size = sizeof(GLfloat)
+        stride = instancing.INSTANCE_COMPONENTS * float_size
+
+        gl.glBindBuffer(GL_ARRAY_BUFFER, self._instance_buffer)
+        # Orphan last batch's data rather than waiting for it to be used
+        gl.glBufferData(GL_ARRAY_BUFFER, data.nbytes,
+                        c_void_p(data.ctypes.data), GL_STREAM_DRAW)
+
+        for name, size, offset in self._instance_attributes():
+            location = shaders.INSTANCED_ATTRIBUTES[name]
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE,
+                                     stride, c_void_p(offset * float_size))
+            gl.glVertexAttribDivisor(location, 1)
+
+    def _unbind_instances(self):
+        for name, size, offset in self._instance_attributes():
+            location = shaders.INSTANCED_ATTRIBUTES[name]
+            self.gl.glVertexAttribDivisor(location, 0)
+            self.gl.glDisableVertexAttribArray(location)
+
+    @staticmethod
+    def _instance_attributes():
+        # (attribute name, number of floats, offset in floats) for each column
+        for column in range(4):
+            yield ('model_{0}'.format(column), 4,
+                   instancing.MODEL_MATRIX_OFFSET + 4 * column)
+        for column in range(3):
+            yield ('normal_{0}'.format(column), 3,
+                   instancing.NORMAL_MATRIX_OFFSET + 3 * column)
+
+
+_backend_stack = [DisplayListBackend()]
+
+
+def current():
+    """
+    The backend that GLPolygon.draw() should use.
+    """
+    return _backend_stack[-1]
+
+
+@contextmanager
+def using(backend):
+    """
+    Make the backend current for the duration of the with-block, e.g.
+
+    with backends.using(BufferObjectBackend()):
+        polygon.draw()
+    """
+    _backend_stack.append(backend)
+    try:
+        yield backend
+    finally:
+        _backend_stack.pop()
@@ -0,0 +1,161 @@
+"""
+Rendering batches of frames offline, in parallel, with the software
+renderer.
+
+render_frames() builds the scene once, then forks a pool of worker
+processes that each draw a share of the frames. Before forking, the mesh
+data of every shared (i.e. never changed in place) mesh is moved into
+shared memory, so the workers read the same pages rather than each having
+their own copy. Finished frames are encoded by the workers and written to
+disk by the parent, in order, as soon as all the frames before them are
+done.
+
+For example, to render an aperture turning round:
+
+    def create_scene():
+        scene = Scene(backend=software.SoftwareBackend(), window=False)
+        scene._polygons = {'aperture': Aperture()}
+        return scene
+
+    def turn(scene, angle):
+        scene._polygons['aperture'].orientation[1] = angle
+
+    for path in batch.render_frames(create_scene, turn, range(360),
+                                    'frames/{0:04d}.png'):
+        print(path)
+
+Each frame must only depend on its parameters, as the frames are drawn in
+any order by any of the workers. The workers are forked, so this needs a
+platform with fork().
+"""
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+import numpy as np
+
+from core import headless
+from core.mesh_registry import mesh_registry
+
+__author__ = 'eatmuchpie'
+
+
+# The scene and set_frame function the workers render with. They're set
+# before the pool is forked, so the workers inherit them.
+_worker_scene = None
+_worker_set_frame = None
+_worker_path_pattern = None
+
+
+def render_frames(scene_factory, set_frame, frame_params, path_pattern,
+                  width=256, height=192, processes=None, chunksize=1):
+    """
+    Render a frame for each set of parameters, and save them.
+
+    The frames are rendered lazily: iterate over the result to render them.
+
+    :param scene_factory: called once with no arguments, to make the Scene
+        to draw. It must have a backend that doesn't need GL, e.g. a
+        software.SoftwareBackend.
+    :param set_frame: called as set_frame(scene, params) before drawing each
+        frame.
+    :param frame_params: the parameters of each frame.
+    :param path_pattern: where to save each frame, formatted with the
+        frame's index, e.g. 'frames/{0:05d}.png'. Frames are saved as PNG
+        images, or as numpy arrays if the path ends with .npy (see
+        software.Framebuffer.save()).
+    :param processes: the number of worker processes. By default, one per
+        CPU. With 1, the frames are rendered in this process.
+    :param chunksize: the number of frames given to a worker at a time.
+    :return: an iterator over the path of each frame, in order, as it's
+        written.
+    """
+    global _worker_scene, _worker_set_frame, _worker_path_pattern
+
+    scene = scene_factory()
+    scene.on_resize(width, height)
+    frames = enumerate(frame_params)
+
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if processes == 1:
+        for index, params in frames:
+            path = path_pattern.format(index)
+            _write(path, _render(scene, set_frame, params, path))
+            yield path
+        return
+
+    share_meshes()
+    _worker_scene = scene
+    _worker_set_frame = set_frame
+    _worker_path_pattern = path_pattern
+    pool = multiprocessing.Pool(processes)
+    try:
+        # imap returns the results in order, whichever worker finishes
+        # first
+        for index, data in pool.imap(_render_frame, frames, chunksize):
+            path = path_pattern.format(index)
+            _write(path, data)
+            yield path
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+        _worker_scene = _worker_set_frame = _worker_path_pattern = None
+
+
+def share_meshes():
+    """
+    Move the vertex and index data of every shared mesh into shared memory,
+    which processes forked afterwards will read rather than copy. Meshes
+    that may be changed in place (such as SolidAperture's) and meshes that
+    are memory-mapped from the disk cache are left alone.
+
+    :return: the number of bytes moved.
+    """
+    moved = 0
+    for shared_mesh in mesh_registry.meshes():
+        buffers = shared_mesh.buffers
+        if not shared_mesh.shared or isinstance(buffers.vertex_data, np.memmap):
+            continue
+        if not _is_shared(buffers.vertex_data):
+            buffers.vertex_data = _shared_copy(buffers.vertex_data)
+            buffers.index_data = _shared_copy(buffers.index_data)
+            moved += buffers.nbytes
+    return moved
+
+
+def _shared_copy(array):
+    # A copy of the array backed by shared memory. The RawArray is kept
+    # alive by the array's base.
+    array = np.ascontiguousarray(array)
+    memory = RawArray(ctypes.c_char, max(array.nbytes, 1))
+    copy = np.frombuffer(memory, dtype=array.dtype,
+                         count=array.size).reshape(array.shape)
+    copy[...] = array
+    return copy
+
+
+def _is_shared(array):
+    base = array
+    while base is not None:
+        if isinstance(base, ctypes.Array):
+            return True
+        base = getattr(base, 'base', None)
+    return False
+
+
+def _render_frame(indexed_params):
+    index, params = indexed_params
+    path = _worker_path_pattern.format(index)
+    return index, _render(_worker_scene, _worker_set_frame, params, path)
+
+
+def _render(scene, set_frame, params, path):
+    set_frame(scene, params)
+    scene.draw()
+    return scene.backend.framebuffer.encode(path)
+
+
+def _write(path, data):
+    with open(path, 'wb') as frame_file:
+        frame_file.write(data)
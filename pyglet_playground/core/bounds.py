@@ -0,0 +1,137 @@
+"""
+Axis-aligned bounding boxes, bounding spheres and view frustums.
+
+A box is a (2, 3) array of its [min, max] corners, and functions that take
+boxes also accept stacks of them with shape (..., 2, 3). Everything here is
+plain numpy, so it can be tested without GL.
+"""
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+# The results of Frustum.classify()
+OUTSIDE = 0
+INTERSECTING = 1
+INSIDE = 2
+
+
+def aabb(points):
+    """
+    The bounding box of an array of [x, y, z] points, or None if there are
+    no points.
+    """
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    if not len(points):
+        return None
+    return np.array([points.min(axis=0), points.max(axis=0)])
+
+
+def merge(boxes):
+    """
+    The bounding box of a sequence of boxes, or None if there aren't any.
+    """
+    boxes = np.asarray(boxes, dtype=float).reshape(-1, 2, 3)
+    if not len(boxes):
+        return None
+    return np.array([boxes[:, 0].min(axis=0), boxes[:, 1].max(axis=0)])
+
+
+def transform(matrix, box):
+    """
+    The bounding box, in the matrix's output space, of the box after it's
+    been transformed by the matrix. Stacks of matrices and boxes are
+    transformed pairwise.
+    """
+    centre = (box[..., 0, :] + box[..., 1, :]) / 2.
+    extent = (box[..., 1, :] - box[..., 0, :]) / 2.
+
+    linear = matrix[..., :3, :3]
+    centre = np.einsum('...ij,...j->...i', linear, centre) + matrix[..., :3, 3]
+    extent = np.einsum('...ij,...j->...i', np.abs(linear), extent)
+    return np.stack((centre - extent, centre + extent), axis=-2)
+
+
+def sphere(box):
+    """
+    The bounding sphere of a box.
+
+    :return: (centre, radius)
+    """
+    centre = (box[..., 0, :] + box[..., 1, :]) / 2.
+    half_diagonal = (box[..., 1, :] - box[..., 0, :]) / 2.
+    return centre, np.sqrt((half_diagonal ** 2).sum(axis=-1))
+
+
+class Frustum(object):
+    """
+    The volume that can be seen through a projection: six planes, with the
+    inside of the frustum in front of all of them.
+    """
+
+    def __init__(self, planes):
+        """
+        :param planes: a (6, 4) array of planes [a, b, c, d], with the point
+            p in front of a plane if a*x + b*y + c*z + d >= 0.
+        """
+        planes = np.asarray(planes, dtype=float)
+        lengths = np.sqrt((planes[:, :3] ** 2).sum(axis=1))
+        self.planes = planes / lengths[:, np.newaxis]
+        self.normals = self.planes[:, :3]
+        self.distances = self.planes[:, 3]
+
+    @classmethod
+    def from_matrix(cls, projection):
+        """
+        The frustum of a projection (or projection . view) matrix, in the
+        space the matrix projects from.
+        """
+        rows = np.asarray(projection, dtype=float)
+        return cls([rows[3] + rows[0], rows[3] - rows[0],
+                    rows[3] + rows[1], rows[3] - rows[1],
+                    rows[3] + rows[2], rows[3] - rows[2]])
+
+    def classify(self, box):
+        """
+        Whether boxes are OUTSIDE, INSIDE or INTERSECTING the frustum.
+
+        Boxes that are near a corner of the frustum, but outside it, can be
+        classified as INTERSECTING, which is fine for culling.
+
+        :return: an int for a single box, or an array for a stack of boxes
+        """
+        box = np.asarray(box, dtype=float)
+        positive = self.normals >= 0
+        # The corners of each box furthest along (and against) each normal
+        furthest = np.where(positive, box[..., np.newaxis, 1, :],
+                            box[..., np.newaxis, 0, :])
+        nearest = np.where(positive, box[..., np.newaxis, 0, :],
+                           box[..., np.newaxis, 1, :])
+
+        outside = np.any(self._distances(furthest) < 0, axis=-1)
+        inside = np.all(self._distances(nearest) >= 0, axis=-1)
+        return _classification(outside, inside)
+
+    def classify_spheres(self, centres, radii):
+        """
+        Like self.classify(), for spheres.
+        """
+        centres = np.asarray(centres, dtype=float)
+        radii = np.asarray(radii, dtype=float)[..., np.newaxis]
+        distances = centres.dot(self.normals.T) + self.distances
+
+        outside = np.any(distances < -radii, axis=-1)
+        inside = np.all(distances >= radii, axis=-1)
+        return _classification(outside, inside)
+
+    def _distances(self, points):
+        # Signed distance of each point from its plane, for points with
+        # shape (..., 6, 3)
+        return np.einsum('...ij,ij->...i', points, self.normals) + self.distances
+
+
+def _classification(outside, inside):
+    result = np.where(outside, OUTSIDE, np.where(inside, INSIDE, INTERSECTING))
+    if result.ndim == 0:
+        return int(result)
+    return result
@@ -0,0 +1,174 @@
+"""
+Contiguous, GL-ready vertex and index buffers.
+
+Vertex data is kept as a single interleaved float32 array (x, y, z, nx, ny,
+nz per vertex) and indices as the smallest unsigned integer type that can
+address every vertex. Both are handed to GL as raw pointers into the numpy
+memory, so no per-element Python work is done on upload.
+"""
+import ctypes
+import hashlib
+import numpy as np
+from pyglet.gl import GLfloat, GL_UNSIGNED_SHORT, GL_UNSIGNED_INT
+
+from core import bounds
+
+__author__ = 'eatmuchpie'
+
+
+# Number of floats per vertex, and where each attribute starts
+VERTEX_COMPONENTS = 6
+POSITION_OFFSET = 0
+NORMAL_OFFSET = 3
+
+
+def interleave(vertices, normals):
+    """
+    Interleave the vertex positions and normals into one contiguous float32
+    array with a row of [x, y, z, nx, ny, nz] per vertex.
+    """
+    vertex_data = np.empty((len(vertices), VERTEX_COMPONENTS), dtype=np.float32)
+    vertex_data[:, POSITION_OFFSET:POSITION_OFFSET + 3] = vertices
+    vertex_data[:, NORMAL_OFFSET:NORMAL_OFFSET + 3] = normals
+    return vertex_data
+
+
+def index_array(triangles_indices, vertex_count=None):
+    """
+    Flatten the triangle indices into a contiguous array of the smallest
+    unsigned type that can address all the vertices.
+    """
+    triangles_indices = np.asarray(triangles_indices)
+    if vertex_count is None:
+        vertex_count = int(triangles_indices.max()) + 1 if triangles_indices.size else 0
+
+    if vertex_count <= np.iinfo(np.uint16).max + 1:
+        dtype = np.uint16
+    else:
+        dtype = np.uint32
+
+    return np.ascontiguousarray(triangles_indices, dtype=dtype).ravel()
+
+
+class MeshBuffers(object):
+    """
+    The interleaved vertex array and index array of one mesh.
+    """
+
+    _gl_index_types = {
+        np.dtype(np.uint16): GL_UNSIGNED_SHORT,
+        np.dtype(np.uint32): GL_UNSIGNED_INT,
+    }
+
+    _bounds = None
+    # Increased by self.changed()
+    version = 0
+
+    def __init__(self, vertices, normals, triangles_indices):
+        """
+        :param vertices: numpy.ndarray([[x1,y1,z1], [x2,y2,z2], ...])
+        :param normals: numpy.ndarray with one normal per vertex
+        :param triangles_indices: numpy.ndarray([[a1,b1,c1], ...])
+        """
+        self.vertex_data = interleave(vertices, normals)
+        self.index_data = index_array(triangles_indices, len(vertices))
+
+    @classmethod
+    def from_arrays(cls, vertex_data, index_data):
+        """
+        Wrap an existing interleaved vertex array and index array (e.g.
+        ones loaded from disk) without copying them.
+        """
+        buffers = cls.__new__(cls)
+        buffers.vertex_data = vertex_data
+        buffers.index_data = index_data
+        return buffers
+
+    @property
+    def vertex_count(self):
+        return len(self.vertex_data)
+
+    @property
+    def index_count(self):
+        return len(self.index_data)
+
+    @property
+    def stride(self):
+        """
+        The number of bytes between consecutive vertices.
+        """
+        return self.vertex_data.strides[0]
+
+    @property
+    def index_type(self):
+        """
+        The GL enum for the type of self.index_data.
+        """
+        return self._gl_index_types[self.index_data.dtype]
+
+    @property
+    def nbytes(self):
+        return self.vertex_data.nbytes + self.index_data.nbytes
+
+    @property
+    def positions(self):
+        """
+        A view of the vertex positions.
+        """
+        return self.vertex_data[:, POSITION_OFFSET:POSITION_OFFSET + 3]
+
+    @property
+    def normals(self):
+        """
+        A view of the vertex normals.
+        """
+        return self.vertex_data[:, NORMAL_OFFSET:NORMAL_OFFSET + 3]
+
+    @property
+    def bounds(self):
+        """
+        The bounding box of the vertex positions, or None if there are no
+        vertices.
+        """
+        if self._bounds is None:
+            self._bounds = bounds.aabb(self.positions)
+        return self._bounds
+
+    def changed(self):
+        """
+        Must be called after vertex_data is changed in place, to forget
+        anything calculated from it.
+        """
+        self.version += 1
+        self._bounds = None
+
+    @property
+    def triangles_indices(self):
+        return self.index_data.reshape(-1, 3)
+
+    def content_hash(self):
+        """
+        A hash of the vertex and index data, so identical meshes can be
+        found.
+        """
+        digest = hashlib.sha1()
+        for array in self.vertex_data, self.index_data:
+            array = np.ascontiguousarray(array)
+            digest.update(array.dtype.str.encode())
+            digest.update(repr(array.shape).encode())
+            digest.update(array.data)
+        return digest.hexdigest()
+
+    def position_pointer(self):
+        return _pointer(self.vertex_data, POSITION_OFFSET)
+
+    def normal_pointer(self):
+        return _pointer(self.vertex_data, NORMAL_OFFSET)
+
+    def index_pointer(self):
+        return ctypes.c_void_p(self.index_data.ctypes.data)
+
+
+def _pointer(vertex_data, offset):
+    address = vertex_data.ctypes.data + offset * ctypes.sizeof(GLfloat)
+    return ctypes.cast(address, ctypes.POINTER(GLfloat))
@@ -0,0 +1,461 @@
+"""
+Bounding volume hierarchies, for ray picking and intersection queries.
+
+There are two levels. A MeshBVH holds the triangles of one mesh, in the
+mesh's own space, and is shared by every polygon using the mesh. A SceneBVH
+holds the GLPolygons inside a polygon (e.g. a Scene) by their world bounds;
+rays that reach one of them are moved into its space and tested against its
+MeshBVH.
+
+Rays are given as arrays of origins and directions, and are tested
+together: each node of a hierarchy is tested against every ray that reached
+it in one numpy operation.
+"""
+from collections import namedtuple
+import weakref
+import numpy as np
+
+from core import bounds, matrix
+from core.gl_polygon import GLPolygon
+
+__author__ = 'eatmuchpie'
+
+
+# The most items (triangles or polygons) in a leaf node
+LEAF_SIZE = 8
+
+# An inside-out box, which nothing hits or overlaps
+EMPTY = np.array([[np.inf] * 3, [-np.inf] * 3])
+EMPTY.flags.writeable = False
+
+# The result of SceneBVH.pick()
+Hit = namedtuple('Hit', 'distance point path polygon triangle')
+
+
+class _Hierarchy(object):
+    """
+    A tree of bounding boxes over a set of items, stored in flat arrays.
+    Nodes are numbered depth first, so a node's parent always comes before
+    it.
+    """
+
+    def __init__(self, item_bounds):
+        """
+        :param item_bounds: the (N, 2, 3) bounding boxes of the items.
+        """
+        self.item_bounds = np.array(item_bounds, dtype=float).reshape(-1, 2, 3)
+        self._build()
+
+    def _build(self):
+        item_count = len(self.item_bounds)
+        centroids = self.item_bounds.mean(axis=1)
+        self.order = np.arange(item_count)
+
+        node_ranges = []
+        children = []
+        parents = []
+        # (parent, start, end) of each node still to be made
+        stack = [(-1, 0, item_count)]
+        while stack:
+            parent, start, end = stack.pop()
+            node = len(node_ranges)
+            node_ranges.append((start, end))
+            children.append([-1, -1])
+            parents.append(parent)
+            if parent >= 0:
+                slot = 0 if children[parent][0] < 0 else 1
+                children[parent][slot] = node
+
+            if end - start > LEAF_SIZE:
+                # Split at the median along the longest axis of the centroids
+                items = self.order[start:end]
+                spread = np.ptp(centroids[items], axis=0)
+                axis = int(np.argmax(spread))
+                self.order[start:end] = items[
+                    np.argsort(centroids[items, axis], kind='mergesort')]
+                middle = (start + end) // 2
+                stack.append((node, middle, end))
+                stack.append((node, start, middle))
+
+        self.ranges = np.array(node_ranges, dtype=np.intp).reshape(-1, 2)
+        self.children = np.array(children, dtype=np.intp).reshape(-1, 2)
+        self.parents = np.array(parents, dtype=np.intp)
+        self.is_leaf = self.children[:, 0] < 0
+        self.node_bounds = np.empty((len(self.ranges), 2, 3))
+        self._leaf_of_item = np.empty(item_count, dtype=np.intp)
+        for node in np.flatnonzero(self.is_leaf):
+            start, end = self.ranges[node]
+            self._leaf_of_item[self.order[start:end]] = node
+        self.refit()
+
+    def refit(self, items=None):
+        """
+        Recalculate the bounds of the nodes holding the given items (or of
+        every node, if no items are given), after self.item_bounds has been
+        updated. The shape of the tree is kept.
+        """
+        if items is None:
+            nodes = range(len(self.ranges) - 1, -1, -1)
+        else:
+            # The leaves of the items and all their ancestors, deepest first
+            nodes = set()
+            for node in set(self._leaf_of_item[np.asarray(items, dtype=np.intp)]):
+                while node >= 0 and node not in nodes:
+                    nodes.add(node)
+                    node = self.parents[node]
+            nodes = sorted(nodes, reverse=True)
+
+        for node in nodes:
+            if self.is_leaf[node]:
+                start, end = self.ranges[node]
+                boxes = self.item_bounds[self.order[start:end]]
+            else:
+                boxes = self.node_bounds[self.children[node]]
+            self.node_bounds[node] = _merge(boxes)
+
+    def traverse(self, origins, directions, max_distances, test_leaf):
+        """
+        Call test_leaf(items, rays) for every leaf whose bounds are hit by
+        any of the rays within their max_distances, where items and rays are
+        index arrays. test_leaf can reduce max_distances as it finds hits.
+        """
+        if not len(self.ranges) or not len(origins):
+            return
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse_directions = 1. / directions
+
+        stack = [(0, np.arange(len(origins)))]
+        while stack:
+            node, rays = stack.pop()
+            near = _ray_box_distances(origins[rays], inverse_directions[rays],
+                                      self.node_bounds[node])
+            rays = rays[near < max_distances[rays]]
+            if not len(rays):
+                continue
+
+            if self.is_leaf[node]:
+                start, end = self.ranges[node]
+                test_leaf(self.order[start:end], rays)
+            else:
+                stack.extend((child, rays) for child in self.children[node])
+
+    def overlapping(self, box):
+        """
+        :return: the indices of the items whose bounds overlap the box.
+        """
+        box = np.asarray(box, dtype=float)
+        found = []
+        stack = [0] if len(self.ranges) else []
+        while stack:
+            node = stack.pop()
+            if not _boxes_overlap(self.node_bounds[node], box):
+                continue
+            if self.is_leaf[node]:
+                start, end = self.ranges[node]
+                items = self.order[start:end]
+                found.extend(items[_boxes_overlap(self.item_bounds[items], box)])
+            else:
+                stack.extend(self.children[node])
+        return sorted(found)
+
+
+class MeshBVH(object):
+    """
+    A hierarchy of the triangles of one mesh.
+    """
+
+    def __init__(self, vertices, triangles_indices):
+        vertices = np.asarray(vertices, dtype=float)
+        self.triangles = vertices[np.asarray(triangles_indices, dtype=np.intp)]
+        triangle_bounds = np.stack((self.triangles.min(axis=1),
+                                    self.triangles.max(axis=1)), axis=1)
+        self.hierarchy = _Hierarchy(triangle_bounds)
+
+    def intersect(self, origins, directions, max_distances=None):
+        """
+        Find the nearest triangle hit by each ray.
+
+        :param origins: (N, 3) array of ray origins.
+        :param directions: (N, 3) array of ray directions. Distances are
+            measured in multiples of the directions.
+        :param max_distances: rays are only tested up to these distances.
+        :return: (distances, triangles) arrays, with distances of inf and
+            triangles of -1 for rays that don't hit anything.
+        """
+        origins, directions = _rays(origins, directions)
+        distances = np.full(len(origins), np.inf)
+        if max_distances is not None:
+            distances[:] = max_distances
+        triangles = np.full(len(origins), -1, dtype=np.intp)
+
+        def test_leaf(items, rays):
+            hits = ray_triangle_distances(origins[rays], directions[rays],
+                                          self.triangles[items])
+            nearest = np.argmin(hits, axis=1)
+            nearest_distances = hits[np.arange(len(rays)), nearest]
+            closer = nearest_distances < distances[rays]
+            distances[rays[closer]] = nearest_distances[closer]
+            triangles[rays[closer]] = items[nearest[closer]]
+
+        self.hierarchy.traverse(origins, directions, distances, test_leaf)
+        if max_distances is not None:
+            distances[triangles < 0] = np.inf
+        return distances, triangles
+
+
+_mesh_bvhs = weakref.WeakKeyDictionary()
+
+
+def mesh_bvh(buffers):
+    """
+    The MeshBVH of a MeshBuffers, which is built the first time it's needed
+    (or after the buffers have changed) and shared by every polygon using
+    the mesh.
+    """
+    version, bvh = _mesh_bvhs.get(buffers, (None, None))
+    if version != buffers.version:
+        bvh = MeshBVH(buffers.positions, buffers.triangles_indices)
+        _mesh_bvhs[buffers] = buffers.version, bvh
+    return bvh
+
+
+class SceneBVH(object):
+    """
+    A hierarchy of the GLPolygons inside a polygon, by their bounds in the
+    polygon's space (the world space, for a Scene).
+
+    Moving any of the polygons (or the composites holding them) marks them
+    as changed, and self.refit() (which every query calls) updates their
+    bounds without rebuilding the hierarchy. Bulk updates of TransformPools
+    are noticed too. Adding or removing polygons needs self.rebuild().
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.rebuild()
+
+    def rebuild(self):
+        for subscription in getattr(self, '_subscriptions', ()):
+            subscription.cancel()
+        self._subscriptions = []
+        self._leaves_under = {}
+        self._pools = {}
+        self._dirty = set()
+        self.paths = []
+        self.polygons = []
+        chains = []
+
+        # The polygons from the root to the one being visited
+        chain = []
+        for path, polygon, _ in self.root.walk():
+            del chain[len(path):]
+            chain.append(polygon)
+            if len(chain) > 1:
+                self._leaves_under[id(polygon)] = []
+                self._subscriptions.append(
+                    polygon.subscribe(self._changed, weak=True))
+
+            if isinstance(polygon, GLPolygon):
+                leaf = len(self.polygons)
+                self.paths.append(path)
+                self.polygons.append(polygon)
+                chains.append(list(chain))
+                for node in chain[1:]:
+                    self._leaves_under[id(node)].append(leaf)
+                    if node._pool is not None:
+                        self._pools.setdefault(node._pool, set()).add(leaf)
+
+        self._chains = chains
+        self._pool_versions = dict((pool, pool.version) for pool in self._pools)
+        self.world_matrices = np.empty((len(chains), 4, 4))
+        self._inverses = [None] * len(chains)
+        item_bounds = np.empty((len(chains), 2, 3))
+        for leaf in range(len(chains)):
+            item_bounds[leaf] = self._update_leaf(leaf)
+        self.hierarchy = _Hierarchy(item_bounds)
+
+    def refit(self):
+        """
+        Update the bounds of the polygons that have moved since the last
+        refit.
+        """
+        for pool, leaves in self._pools.items():
+            if pool.version != self._pool_versions[pool]:
+                self._pool_versions[pool] = pool.version
+                self._dirty.update(leaves)
+
+        if not self._dirty:
+            return
+        dirty = sorted(self._dirty)
+        self._dirty.clear()
+        for leaf in dirty:
+            self.hierarchy.item_bounds[leaf] = self._update_leaf(leaf)
+        self.hierarchy.refit(dirty)
+
+    def intersect(self, origins, directions):
+        """
+        Find the nearest polygon hit by each ray.
+
+        :param origins: (N, 3) array of ray origins, in the root's space.
+        :param directions: (N, 3) array of ray directions.
+        :return: (distances, polygons, triangles) arrays, where polygons are
+            indices into self.polygons (and self.paths), and misses have a
+            distance of inf and polygon and triangle of -1.
+        """
+        self.refit()
+        origins, directions = _rays(origins, directions)
+        distances = np.full(len(origins), np.inf)
+        polygons = np.full(len(origins), -1, dtype=np.intp)
+        triangles = np.full(len(origins), -1, dtype=np.intp)
+
+        def test_leaf(items, rays):
+            for leaf in items:
+                leaf_distances, leaf_triangles = self._intersect_leaf(
+                    leaf, origins[rays], directions[rays], distances[rays])
+                closer = leaf_distances < distances[rays]
+                distances[rays[closer]] = leaf_distances[closer]
+                polygons[rays[closer]] = leaf
+                triangles[rays[closer]] = leaf_triangles[closer]
+
+        self.hierarchy.traverse(origins, directions, distances, test_leaf)
+        return distances, polygons, triangles
+
+    def pick(self, origin, direction):
+        """
+        The nearest polygon hit by a single ray.
+
+        :return: a Hit, or None if nothing is hit.
+        """
+        distances, polygons, triangles = self.intersect([origin], [direction])
+        if polygons[0] < 0:
+            return None
+        point = np.asarray(origin, dtype=float) + \
+            distances[0] * np.asarray(direction, dtype=float)
+        return Hit(distances[0], point, self.paths[polygons[0]],
+                   self.polygons[polygons[0]], triangles[0])
+
+    def overlapping(self, box):
+        """
+        :return: the (path, polygon) of each polygon whose bounds overlap the
+            box.
+        """
+        self.refit()
+        return [(self.paths[leaf], self.polygons[leaf])
+                for leaf in self.hierarchy.overlapping(box)]
+
+    def _intersect_leaf(self, leaf, origins, directions, max_distances):
+        mesh = mesh_bvh(self.polygons[leaf].buffers)
+        inverse = self._inverses[leaf]
+        if inverse is not None:
+            # Move the rays into the polygon's space. The directions aren't
+            # normalised, so distances are the same in both.
+            return mesh.intersect(matrix.transform_points(inverse, origins),
+                                  directions.dot(inverse[:3, :3].T),
+                                  max_distances)
+
+        # The polygon is flattened (e.g. scaled to zero along an axis), so
+        # its triangles are moved into the root's space instead
+        world_triangles = matrix.transform_points(
+            self.world_matrices[leaf], mesh.triangles.reshape(-1, 3))
+        hits = ray_triangle_distances(origins, directions,
+                                      world_triangles.reshape(-1, 3, 3))
+        triangles = np.argmin(hits, axis=1)
+        distances = hits[np.arange(len(hits)), triangles]
+        triangles[distances >= max_distances] = -1
+        distances[triangles < 0] = np.inf
+        return distances, triangles
+
+    def _update_leaf(self, leaf):
+        # The leaf's matrix, from its own space to the root's
+        world_matrix = matrix.IDENTITY
+        for node in self._chains[leaf][1:]:
+            world_matrix = world_matrix.dot(node.local_matrix)
+        self.world_matrices[leaf] = world_matrix
+        if abs(np.linalg.det(world_matrix[:3, :3])) > 1e-12:
+            self._inverses[leaf] = np.linalg.inv(world_matrix)
+        else:
+            self._inverses[leaf] = None
+
+        local_bounds = self.polygons[leaf].local_bounds
+        if local_bounds is None:
+            # An empty mesh can't be hit
+            return EMPTY
+        return bounds.transform(world_matrix, local_bounds)
+
+    def _changed(self, object, reason):
+        self._dirty.update(self._leaves_under.get(id(object), ()))
+
+
+def screen_ray(x, y, width, height, field_of_view):
+    """
+    The ray from the eye through a pixel of a viewport with a gluPerspective
+    projection (and an identity modelview matrix).
+
+    :return: (origin, direction)
+    """
+    scale = np.tan(np.radians(field_of_view) / 2.)
+    aspect = width / float(height)
+    direction = np.array([(2. * x / width - 1.) * scale * aspect,
+                          (2. * y / height - 1.) * scale,
+                          -1.])
+    return np.zeros(3), direction
+
+
+def ray_triangle_distances(origins, directions, triangles):
+    """
+    The distance along every ray to every triangle (the Moller-Trumbore
+    algorithm), hitting either side of the triangles.
+
+    :param origins: (R, 3) ray origins.
+    :param directions: (R, 3) ray directions.
+    :param triangles: (T, 3, 3) triangle vertices.
+    :return: (R, T) array of distances, with inf where a ray misses.
+    """
+    a = triangles[:, 0]
+    edge1 = triangles[:, 1] - a
+    edge2 = triangles[:, 2] - a
+
+    p = np.cross(directions[:, np.newaxis], edge2[np.newaxis])
+    determinants = np.einsum('rtj,tj->rt', p, edge1)
+    parallel = np.abs(determinants) < 1e-12
+    inverse = 1. / np.where(parallel, 1., determinants)
+
+    s = origins[:, np.newaxis] - a[np.newaxis]
+    u = np.einsum('rtj,rtj->rt', s, p) * inverse
+    q = np.cross(s, edge1[np.newaxis])
+    v = np.einsum('rj,rtj->rt', directions, q) * inverse
+    distances = np.einsum('rtj,tj->rt', q, edge2) * inverse
+
+    hit = ~parallel & (u >= 0) & (v >= 0) & (u + v <= 1) & (distances >= 0)
+    return np.where(hit, distances, np.inf)
+
+
+def _merge(boxes):
+    # Like bounds.merge(), but with an inside-out box for no boxes, which
+    # nothing hits or overlaps
+    if not len(boxes):
+        return EMPTY
+    return bounds.merge(boxes)
+
+
+def _rays(origins, directions):
+    return (np.asarray(origins, dtype=float).reshape(-1, 3),
+            np.asarray(directions, dtype=float).reshape(-1, 3))
+
+
+def _ray_box_distances(origins, inverse_directions, box):
+    # The distance at which each ray enters the box (the slab method), or
+    # inf if it misses. NaNs (from rays lying in a slab's plane) are ignored.
+    with np.errstate(invalid='ignore'):
+        t1 = (box[0] - origins) * inverse_directions
+        t2 = (box[1] - origins) * inverse_directions
+    near = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+    far = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+    near = np.maximum(near, 0.)
+    return np.where(far >= near, near, np.inf)
+
+
+def _boxes_overlap(boxes, box):
+    return np.all((boxes[..., 0, :] <= box[1]) & (boxes[..., 1, :] >= box[0]),
+                  axis=-1)
@@ -1,4 +1,6 @@
+from core import bounds, culling, matrix, profiling, static_batching
 from core.polygon import Polygon
+from core.utility import Subscription
 
 __author__ = 'eatmuchpie'
 
@@ -20,18 +22,196 @@ class CompositePolygon(Polygon):
         else:
             self._polygons = dict(polygons)
 
+        # The merged mesh drawn in place of the polygons when static. It's
+        # dropped when anything inside changes (see _contents_changed).
+        self._baked = None
+        self._static = to_clone is not None and to_clone.static
+
+        # The bounds of the polygons inside, and whether they're out of date
+        self._local_bounds = None
+        self._local_bounds_dirty = True
+
+        # The subscriptions to the polygons inside (and to the pools they're
+        # in), the _polygons dictionary they were made for, and the
+        # subscriptions to this polygon's contents (see subscribe_contents)
+        self._contents_subscriptions = []
+        self._subscribed_polygons = None
+        self.contents_callbacks = set()
+
+    @property
+    def static(self):
+        """
+        Whether to draw the polygons inside this one as a single merged mesh,
+        in one draw call.
+
+        The mesh is rebuilt whenever any of the polygons inside changes, so
+        this is only worthwhile for subtrees that rarely change (this
+        polygon's own transformation can change freely). Polygons that are
+        drawn differently to a plain GLPolygon (e.g. with their own GL state)
+        can't be baked.
+        """
+        return self._static
+
+    @static.setter
+    def static(self, value):
+        self._static = bool(value)
+        self._baked = None
+
     def draw(self):
         self.transform()
+        try:
+            culler = culling.current()
+            if culler is None:
+                self._draw_contents()
+            elif culler.enter(self):
+                try:
+                    self._draw_contents()
+                finally:
+                    culler.leave()
+        finally:
+            self.untransform()
+
+    def _draw_contents(self):
+        if self._static:
+            if self._baked is None or \
+                    self._subscribed_polygons is not self._polygons:
+                self._bake()
+            self._baked.draw()
+            return
+
+        profiler = profiling.current()
+        if profiler is None:
+            for polygon in self._polygons.values():
+                polygon.draw()
+        else:
+            profiler.each(self._polygons, 'draw',
+                          lambda polygon: polygon.draw())
+
+    @property
+    def local_bounds(self):
+        """
+        The bounding box of the polygons inside this one, in this polygon's
+        space, or None if any of their bounds are unknown.
+
+        The bounds are recalculated after any polygon inside changes (or
+        self._polygons is replaced), but not after self._polygons is
+        modified in place.
+        """
+        if self._subscribed_polygons is not self._polygons:
+            self._subscribe_contents()
+        if self._local_bounds_dirty:
+            self._local_bounds = self._calculate_local_bounds()
+            self._local_bounds_dirty = False
+        return self._local_bounds
+
+    def subscribe_contents(self, callback_func, weak=False):
+        """
+        Call callback_func(self, 'contents') whenever a polygon inside this
+        one (at any depth) changes, including by a TransformPool bulk update.
+
+        The polygons inside are subscribed to when self.local_bounds is
+        read, so read it after replacing self._polygons.
 
+        :param weak: see ObservableMethods.subscribe.
+        :return: a Subscription, which can be cancelled.
+        """
+        subscription = _ContentsSubscription(self, callback_func, weak)
+        self.contents_callbacks.add(subscription)
+        return subscription
+
+    def _subscribe_contents(self):
+        for subscription in self._contents_subscriptions:
+            subscription.cancel()
+        self._contents_subscriptions = []
+        self._subscribed_polygons = self._polygons
+        self._local_bounds_dirty = True
+
+        pools = set()
         for polygon in self._polygons.values():
-            polygon.draw()
+            # Changes to the polygon's transformation or mesh
+            self._contents_subscriptions.append(
+                polygon.subscribe(self._contents_changed, weak=True))
+            if isinstance(polygon, CompositePolygon):
+                self._contents_subscriptions.append(polygon.subscribe_contents(
+                    self._contents_changed, weak=True))
+            # Bulk updates don't call the polygon's callbacks
+            if polygon._pool is not None and polygon._pool not in pools:
+                pools.add(polygon._pool)
+                self._contents_subscriptions.append(polygon._pool.subscribe(
+                    self._contents_changed, weak=True))
 
-        self.untransform()
+    def _contents_changed(self, object=None, reason=None):
+        self._local_bounds_dirty = True
+        self._baked = None
+        if reason == 'pool':
+            # A polygon was moved in or out of a pool, so subscribe again
+            self._subscribed_polygons = None
+        for subscription in tuple(self.contents_callbacks):
+            subscription(self, 'contents')
+
+    def _calculate_local_bounds(self):
+        # Every polygon's bounds are read, even once they're known to be
+        # unknown, so the composites inside subscribe to their contents
+        boxes = []
+        unknown = False
+        for polygon in self._polygons.values():
+            polygon_bounds = polygon.local_bounds
+            if polygon_bounds is None:
+                if not isinstance(polygon, CompositePolygon) or \
+                        polygon._polygons:
+                    unknown = True
+                # Otherwise it's empty, so there's nothing to bound
+                continue
+            boxes.append(bounds.transform(polygon.local_matrix,
+                                          polygon_bounds))
+        if unknown or not boxes:
+            return None
+        return bounds.merge(boxes)
+
+    def _bake(self):
+        # Subscribes to the contents (at any depth), so the baked mesh is
+        # dropped when they change
+        self.local_bounds
+        self._baked = static_batching.bake(self)[0]
 
     def clone(self):
         return CompositePolygon(to_clone=self)
 
+    def walk(self, parent_matrix=matrix.IDENTITY, path=()):
+        """
+        See Polygon.walk. The polygons inside are visited after this one,
+        with their keys appended to the path.
+        """
+        own_matrix = parent_matrix.dot(self.local_matrix)
+        yield path, self, own_matrix
+        for key, polygon in self._polygons.items():
+            for item in polygon.walk(own_matrix, path + (key,)):
+                yield item
+
     def update(self, dt):
         super(CompositePolygon, self).update(dt)
-        for polygon in self._polygons.values():
-            polygon.update(dt)
+        profiler = profiling.current()
+        if profiler is None:
+            for polygon in self._polygons.values():
+                polygon.update(dt)
+        else:
+            profiler.each(self._polygons, 'update',
+                          lambda polygon: polygon.update(dt))
+
+
+class _ContentsSubscription(Subscription):
+    """
+    A subscription to the contents of a CompositePolygon (see
+    CompositePolygon.subscribe_contents).
+    """
+    __slots__ = ()
+
+    @property
+    def active(self):
+        composite = self._observable()
+        return composite is not None and self in composite.contents_callbacks
+
+    def cancel(self):
+        composite = self._observable()
+        if composite is not None and self in composite.contents_callbacks:
+            composite.contents_callbacks.remove(self)
@@ -0,0 +1,103 @@
+"""
+Frustum culling of the polygons being drawn.
+
+While a Culler is current (see using()), GLPolygon.draw() and
+CompositePolygon.draw() skip polygons whose world bounds are outside the
+culler's frustum. A CompositePolygon that is entirely inside the frustum
+doesn't have its contents tested, and one that is entirely outside isn't
+visited at all.
+"""
+from contextlib import contextmanager
+
+from core import bounds
+
+__author__ = 'eatmuchpie'
+
+
+class Culler(object):
+    """
+    Tests polygons against a frustum, counting the polygons visited and
+    culled.
+
+    self.last_frame holds the counts for the last frame (see
+    self.begin_frame()).
+    """
+
+    def __init__(self, frustum=None):
+        """
+        :param frustum: the bounds.Frustum, in world space. If it's None,
+            nothing is culled.
+        """
+        self.frustum = frustum
+        # Whether each polygon being drawn is entirely inside the frustum
+        self._inside = [frustum is None]
+        self.visited = 0
+        self.tested = 0
+        self.culled = 0
+        self.last_frame = {'visited': 0, 'tested': 0, 'culled': 0}
+
+    def begin_frame(self):
+        """
+        Store the counts for the frame just drawn in self.last_frame, and
+        reset them.
+        """
+        self.last_frame = {'visited': self.visited, 'tested': self.tested,
+                           'culled': self.culled}
+        self.visited = self.tested = self.culled = 0
+        self._inside = [self.frustum is None]
+
+    def visible(self, polygon):
+        """
+        Whether the polygon, whose world matrix has been calculated, might
+        be visible.
+        """
+        return self._classify(polygon) != bounds.OUTSIDE
+
+    def enter(self, polygon):
+        """
+        Test a polygon whose contents are about to be drawn. If this returns
+        True, self.leave() must be called once the contents have been drawn.
+        """
+        classification = self._classify(polygon)
+        if classification == bounds.OUTSIDE:
+            return False
+        self._inside.append(classification == bounds.INSIDE)
+        return True
+
+    def leave(self):
+        self._inside.pop()
+
+    def _classify(self, polygon):
+        self.visited += 1
+        if self._inside[-1]:
+            return bounds.INSIDE
+
+        local_bounds = polygon.local_bounds
+        if local_bounds is None:
+            return bounds.INTERSECTING
+
+        self.tested += 1
+        classification = self.frustum.classify(
+            bounds.transform(polygon.world_matrix, local_bounds))
+        if classification == bounds.OUTSIDE:
+            self.culled += 1
+        return classification
+
+
+_culler_stack = [None]
+
+
+def current():
+    """
+    The Culler that polygons should be tested with, or None.
+    """
+    return _culler_stack[-1]
+
+
+@contextmanager
+def using(culler):
+    _culler_stack.append(culler)
+    try:
+        yield culler
+    finally:
+        _culler_stack.pop()
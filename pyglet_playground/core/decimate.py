@@ -0,0 +1,305 @@
+"""
+Mesh simplification by quadric error metric edge collapses.
+
+Every vertex carries a quadric (a 4x4 matrix) summing the squared distances
+to the planes of the triangles around it. Collapsing an edge moves its two
+vertices to the point that minimises the sum of their quadrics, and the
+cost of the collapse is that minimum.
+
+Rather than collapsing one edge at a time from a priority queue, each pass
+collapses a batch of edges at once with numpy: every edge that is the
+cheapest edge of both of its vertices (so no two edges in the batch share a
+vertex). Like mesh.py, this works on plain numpy arrays, so it can be run
+on meshes before they're given to GLPolygon, or offline.
+"""
+import numpy as np
+
+from core import mesh
+from core.gl_polygon import GLPolygon
+from core.lod import LODPolygon
+
+__author__ = 'eatmuchpie'
+
+
+def simplify(vertices, triangles_indices, target_triangles=None,
+             max_error=None, boundary_weight=1000., max_passes=200):
+    """
+    Simplify a mesh by collapsing edges until it has target_triangles
+    triangles, or until every remaining collapse would move the surface by
+    more than max_error.
+
+    :param vertices: numpy.ndarray([[x1,y1,z1], [x2,y2,z2], ...])
+    :param triangles_indices: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
+    :param target_triangles: the number of triangles to stop at.
+    :param max_error: the largest error of a collapse: about how far it
+        moves the surface (see vertex_quadrics()).
+    :param boundary_weight: how strongly the edges of open meshes are kept
+        in place.
+    :return: (vertices, triangles_indices, error), where error is the
+        largest error of the collapses made.
+    """
+    if target_triangles is None and max_error is None:
+        raise ValueError("Needs a target_triangles or a max_error")
+
+    vertices, triangles = mesh.compact(vertices, triangles_indices)
+    vertices = np.array(vertices, dtype=float)
+    max_cost = np.inf if max_error is None else max_error ** 2
+    target = 0 if target_triangles is None else target_triangles
+
+    quadrics = vertex_quadrics(vertices, triangles, boundary_weight)
+    error = 0.
+    for _ in range(max_passes):
+        if len(triangles) <= target:
+            break
+
+        edges, positions, costs = _collapse_candidates(vertices, triangles,
+                                                       quadrics)
+        chosen = _independent_edges(edges, costs, len(vertices))
+        chosen = chosen[costs[chosen] <= max_cost]
+        chosen = _without_flips(vertices, triangles, edges, positions, chosen)
+        # Each collapse removes about two triangles. Checked for flips again,
+        # as triangles can be turned over by moving only some of their
+        # vertices.
+        needed = max(1, (len(triangles) - target + 1) // 2)
+        if needed < len(chosen):
+            chosen = chosen[np.argsort(costs[chosen], kind='mergesort')]
+            chosen = _without_flips(vertices, triangles, edges, positions,
+                                    chosen[:needed])
+        if not len(chosen):
+            break
+
+        keep, remove = edges[chosen, 0], edges[chosen, 1]
+        vertices[keep] = positions[chosen]
+        quadrics[keep] += quadrics[remove]
+        error = max(error, np.sqrt(max(costs[chosen].max(), 0.)))
+
+        triangles = _collapsed(triangles, keep, remove, len(vertices))
+
+    vertices, triangles = mesh.compact(vertices, triangles)
+    return vertices, triangles, error
+
+
+def lod_levels(vertices, triangles_indices, ratios=(1., .5, .25, .125),
+               boundary_weight=1000.):
+    """
+    Simplify a mesh to successive fractions of its triangles, e.g. to make
+    the levels of an LODPolygon offline. Each level is simplified from the
+    one before it.
+
+    :return: a list of (vertices, triangles_indices, error) tuples, one for
+        each ratio, where error is the largest error of any collapse made so
+        far.
+    """
+    vertices, triangles = mesh.compact(vertices, triangles_indices)
+    total = len(triangles)
+    levels = []
+    error = 0.
+    for ratio in ratios:
+        target = int(total * ratio)
+        if target < len(triangles):
+            vertices, triangles, level_error = simplify(
+                vertices, triangles, target_triangles=target,
+                boundary_weight=boundary_weight)
+            error = max(error, level_error)
+        levels.append((vertices, triangles, error))
+    return levels
+
+
+def simplify_polygon(polygon, target_triangles=None, max_error=None,
+                     boundary_weight=1000.):
+    """
+    A GLPolygon of a simplified copy of a GLPolygon's mesh (without its
+    transformation).
+    """
+    vertices, triangles, _ = simplify(
+        polygon.buffers.positions, polygon.buffers.triangles_indices,
+        target_triangles, max_error, boundary_weight)
+    return GLPolygon(vertices, triangles)
+
+
+def lod_polygon(vertices, triangles_indices, ratios=(1., .5, .25, .125),
+                boundary_weight=1000.):
+    """
+    An LODPolygon whose levels are the mesh simplified by lod_levels().
+    """
+    levels = lod_levels(vertices, triangles_indices, ratios, boundary_weight)
+    return LODPolygon([GLPolygon(v, t) for v, t, _ in levels],
+                      [error for _, _, error in levels])
+
+
+def vertex_quadrics(vertices, triangles, boundary_weight=1000.):
+    """
+    The quadric of every vertex: the sum of the plane quadrics of the
+    triangles around it, plus quadrics of planes perpendicular to any
+    boundary edges (edges with only one triangle), weighted by
+    boundary_weight, so that open edges keep their shape.
+
+    The quadrics aren't weighted by area, so the root of a collapse's cost
+    is about how far it moves the surface (erring high).
+
+    :return: (N, 4, 4) array
+    """
+    a = vertices[triangles[:, 0]]
+    normals = np.cross(vertices[triangles[:, 1]] - a,
+                       vertices[triangles[:, 2]] - a)
+    normals = _unit(normals)
+    planes = np.column_stack((normals, -np.einsum('ij,ij->i', normals, a)))
+    face_quadrics = planes[:, :, np.newaxis] * planes[:, np.newaxis, :]
+
+    quadrics = _scatter_add(triangles, face_quadrics, len(vertices))
+
+    if boundary_weight:
+        corners = triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        keys = _edge_keys(corners, len(vertices))
+        _, first, counts = np.unique(keys, return_index=True,
+                                     return_counts=True)
+        boundary = first[counts == 1]
+        if len(boundary):
+            starts = vertices[corners[boundary, 0]]
+            directions = vertices[corners[boundary, 1]] - starts
+            face_normals = normals[boundary // 3]
+            edge_normals = _unit(np.cross(directions, face_normals))
+            edge_planes = np.column_stack(
+                (edge_normals, -np.einsum('ij,ij->i', edge_normals, starts)))
+            edge_quadrics = boundary_weight * \
+                edge_planes[:, :, np.newaxis] * edge_planes[:, np.newaxis, :]
+            quadrics += _scatter_add(corners[boundary], edge_quadrics,
+                                     len(vertices))
+
+    return quadrics
+
+
+def _collapse_candidates(vertices, triangles, quadrics):
+    # Every edge (as [keep, remove] vertex pairs), the position its vertices
+    # would be moved to and the cost of collapsing it
+    corners = triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+    corners = np.sort(corners, axis=1)
+    keys = np.unique(_edge_keys(corners, len(vertices)))
+    edges = np.column_stack((keys // len(vertices), keys % len(vertices)))
+
+    edge_quadrics = quadrics[edges[:, 0]] + quadrics[edges[:, 1]]
+
+    # The best of the optimal point (where it exists), the midpoint and the
+    # two ends
+    candidates = [vertices[edges[:, 0]], vertices[edges[:, 1]],
+                  (vertices[edges[:, 0]] + vertices[edges[:, 1]]) / 2.]
+    candidates.append(_optimal_points(edge_quadrics, candidates[2]))
+
+    costs = np.array([_quadric_costs(edge_quadrics, points)
+                      for points in candidates])
+    best = np.argmin(costs, axis=0)
+    rows = np.arange(len(edges))
+    positions = np.array(candidates)[best, rows]
+    return edges, positions, costs[best, rows]
+
+
+def _optimal_points(quadrics, fallback):
+    # Solve A x = -b for the quadrics [[A, b], [b, c]] by Cramer's rule,
+    # which is much faster than numpy.linalg for lots of 3x3 systems, using
+    # the fallback points where A is singular
+    a = quadrics[:, :3, :3]
+    b = -quadrics[:, :3, 3]
+    cofactors = np.cross(a[:, 1], a[:, 2]), np.cross(a[:, 2], a[:, 0]), \
+        np.cross(a[:, 0], a[:, 1])
+    determinants = np.einsum('ij,ij->i', a[:, 0], cofactors[0])
+    solvable = np.abs(determinants) > 1e-12
+
+    # A is symmetric, so its adjugate's rows are the cofactors
+    optimal = np.column_stack([np.einsum('ij,ij->i', row, b)
+                               for row in cofactors])
+    optimal[solvable] /= determinants[solvable, np.newaxis]
+    optimal[~solvable] = fallback[~solvable]
+    return optimal
+
+
+def _quadric_costs(quadrics, points):
+    homogeneous = np.column_stack((points, np.ones(len(points))))
+    return np.einsum('ei,eij,ej->e', homogeneous, quadrics, homogeneous)
+
+
+def _independent_edges(edges, costs, vertex_count):
+    # The edges that are the cheapest edge of both of their vertices, so no
+    # two share a vertex
+    order = np.argsort(costs, kind='mergesort')
+    ends = edges[order].ravel()
+    ranks = np.repeat(np.arange(len(order)), 2)
+
+    # Sorted by vertex, then (as the sort is stable) by cost, so each
+    # vertex's cheapest edge comes first
+    by_vertex = np.argsort(ends, kind='mergesort')
+    first = np.ones(len(by_vertex), dtype=bool)
+    first[1:] = ends[by_vertex[1:]] != ends[by_vertex[:-1]]
+
+    cheapest = np.full(vertex_count, -1, dtype=np.intp)
+    cheapest[ends[by_vertex[first]]] = order[ranks[by_vertex[first]]]
+
+    candidates = np.arange(len(edges))
+    chosen = (cheapest[edges[:, 0]] == candidates) & \
+             (cheapest[edges[:, 1]] == candidates)
+    return np.flatnonzero(chosen)
+
+
+def _without_flips(vertices, triangles, edges, positions, chosen):
+    # Drop the collapses that would turn any triangle over, and check again
+    # (as dropping a collapse changes the triangles around it)
+    for _ in range(4):
+        if not len(chosen):
+            return chosen
+        moved = vertices.copy()
+        moved[edges[chosen, 0]] = positions[chosen]
+        moved[edges[chosen, 1]] = positions[chosen]
+
+        flipped = np.einsum('ij,ij->i', _triangle_normals(vertices, triangles),
+                            _triangle_normals(moved, triangles)) < 0
+        if not flipped.any():
+            return chosen
+
+        bad_vertices = np.zeros(len(vertices), dtype=bool)
+        bad_vertices[triangles[flipped].ravel()] = True
+        bad = bad_vertices[edges[chosen, 0]] | bad_vertices[edges[chosen, 1]]
+        chosen = chosen[~bad]
+    return chosen[:0]
+
+
+def _collapsed(triangles, keep, remove, vertex_count):
+    # Replace the removed vertices with the kept ones, dropping the
+    # triangles that become degenerate
+    mapping = np.arange(vertex_count)
+    mapping[remove] = keep
+    triangles = mapping[triangles]
+    degenerate = (triangles[:, 0] == triangles[:, 1]) | \
+                 (triangles[:, 1] == triangles[:, 2]) | \
+                 (triangles[:, 2] == triangles[:, 0])
+    return triangles[~degenerate]
+
+
+def _triangle_normals(vertices, triangles):
+    a = vertices[triangles[:, 0]]
+    return np.cross(vertices[triangles[:, 1]] - a,
+                    vertices[triangles[:, 2]] - a)
+
+
+def _edge_keys(corners, vertex_count):
+    low = np.minimum(corners[:, 0], corners[:, 1]).astype(np.int64)
+    high = np.maximum(corners[:, 0], corners[:, 1]).astype(np.int64)
+    return low * vertex_count + high
+
+
+def _scatter_add(indices, values, count):
+    # Add each (4, 4) value to the rows of all the indices on its row, using
+    # bincount as in mesh.vertex_normals
+    per_index = indices.shape[1]
+    flat_indices = indices.ravel()
+    flat_values = np.repeat(values.reshape(len(values), 16), per_index, axis=0)
+    sums = np.empty((count, 16))
+    for component in range(16):
+        sums[:, component] = np.bincount(flat_indices,
+                                         weights=flat_values[:, component],
+                                         minlength=count)
+    return sums.reshape(count, 4, 4)
+
+
+def _unit(vectors):
+    lengths = np.sqrt(np.einsum('ij,ij->i', vectors, vectors))
+    lengths[lengths == 0] = 1.
+    return vectors / lengths[:, np.newaxis]
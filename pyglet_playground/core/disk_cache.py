@@ -0,0 +1,280 @@
+"""
+An optional on-disk cache of prepared meshes.
+
+Preparing a mesh (generating it, compacting it and calculating its normals)
+happens every time the program starts. With the disk cache enabled, the
+interleaved vertex and index arrays are saved as .npy files the first time
+a mesh is prepared, and are memory-mapped on later starts, so preparation
+is skipped and the pages are shared by every process using the same mesh.
+
+The cache is disabled by default. Enable it with:
+
+    disk_cache.enable('/path/to/cache')
+
+Entries are named after a hash of the source of the modules that prepare
+meshes, so editing a generator (or the normal calculation) makes the old
+entries stale. Stale entries are deleted when the cache is opened. Only
+files named like the cache's own are ever deleted, so the directory can be
+shared with other files.
+"""
+import hashlib
+import os
+import re
+import tempfile
+import time
+import numpy as np
+
+from core import mesh, vertex_cache
+from core.buffers import MeshBuffers
+
+__author__ = 'eatmuchpie'
+
+
+# Bump to invalidate every entry if the file layout changes
+FORMAT_VERSION = 1
+
+# The modules whose source determines the prepared meshes
+_SOURCE_MODULES = ('mesh', 'buffers', 'generators', 'vertex_cache')
+
+# The names of entry files, e.g. gen-box-<key hash>-<source hash>.indices.npy,
+# with the source hash as the group
+_ENTRY_NAME = re.compile(
+    r'^(?:gen|mesh)-.+-([0-9a-f]{12})\.(?:vertices|indices)\.npy$')
+
+# Entries are saved to temporary files with this prefix, then renamed. Those
+# left behind by interrupted saves are deleted once they're this old, so
+# saves in progress in other processes aren't disturbed.
+_TEMPORARY_PREFIX = 'saving-'
+STALE_TEMPORARY_SECONDS = 3600.
+
+_active = None
+
+
+def source_hash():
+    """
+    A short hash of FORMAT_VERSION and the source of the modules that
+    prepare meshes.
+    """
+    digest = hashlib.sha1(str(FORMAT_VERSION).encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for module in _SOURCE_MODULES:
+        with open(os.path.join(directory, module + '.py'), 'rb') as source:
+            digest.update(source.read())
+    return digest.hexdigest()[:12]
+
+
+def generator_key(name, params):
+    """
+    The key of the mesh made by the named generator with the given
+    parameters. Numbers are compared by value, so 1 and 1. are the same key.
+    """
+    params = tuple(float(p) if isinstance(p, (int, long, float)) else p
+                   for p in params)
+    return 'gen-{0}-{1}'.format(
+        name, hashlib.sha1(repr(params).encode()).hexdigest()[:16])
+
+
+def content_key(vertices, triangles_indices):
+    """
+    The key of the mesh with the given vertices and triangles.
+    """
+    digest = hashlib.sha1()
+    for array, dtype in (vertices, np.float64), (triangles_indices, np.int64):
+        array = np.ascontiguousarray(array, dtype=dtype)
+        digest.update(repr(array.shape).encode())
+        digest.update(array.data)
+    return 'mesh-' + digest.hexdigest()[:16]
+
+
+def _ordered_key(key):
+    # Meshes reordered for the vertex cache are kept separately
+    cache_size = vertex_cache.active()
+    if cache_size is None:
+        return key
+    return '{0}-vc{1}'.format(key, cache_size)
+
+
+class DiskMeshCache(object):
+    """
+    A directory of prepared meshes, each saved as a pair of .npy files.
+    """
+
+    def __init__(self, directory, min_vertices=256):
+        """
+        :param directory: where to keep the cache. It's created if needed.
+        :param min_vertices: meshes given by their vertices (rather than by
+            a generator) with fewer vertices than this aren't cached, as
+            hashing and loading them takes longer than preparing them.
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+        self.min_vertices = min_vertices
+        self.source_hash = source_hash()
+        self.hits = 0
+        self.misses = 0
+        self.evicted = self.evict_stale()
+
+    def buffers(self, key, prepare):
+        """
+        The MeshBuffers saved with the given key, or the result of prepare()
+        (which is then saved) if there aren't any.
+        """
+        buffers = self.load(key)
+        if buffers is None:
+            self.misses += 1
+            buffers = prepare()
+            self.save(key, buffers)
+        else:
+            self.hits += 1
+        return buffers
+
+    def load(self, key):
+        """
+        :return: the MeshBuffers saved with the given key, with read-only
+            memory-mapped arrays, or None if there aren't any.
+        """
+        vertex_path, index_path = self._paths(key)
+        try:
+            vertex_data = _load(vertex_path)
+            index_data = _load(index_path)
+        except (IOError, OSError, ValueError):
+            return None
+        return MeshBuffers.from_arrays(vertex_data, index_data)
+
+    def save(self, key, buffers):
+        vertex_path, index_path = self._paths(key)
+        # The index file is written first, as an entry only counts once its
+        # vertex file exists
+        self._save(index_path, buffers.index_data)
+        self._save(vertex_path, buffers.vertex_data)
+
+    def evict_stale(self):
+        """
+        Delete the entries saved by a different version of the code, and the
+        temporary files left by saves that were interrupted (at least
+        STALE_TEMPORARY_SECONDS ago).
+
+        :return: the number of files deleted.
+        """
+        oldest_temporary = time.time() - STALE_TEMPORARY_SECONDS
+        evicted = 0
+        for filename in os.listdir(self.directory):
+            path = os.path.join(self.directory, filename)
+            entry = _ENTRY_NAME.match(filename)
+            if entry is not None:
+                stale = entry.group(1) != self.source_hash
+            elif filename.startswith(_TEMPORARY_PREFIX) and \
+                    filename.endswith('.tmp'):
+                stale = _modified(path) < oldest_temporary
+            else:
+                stale = False
+            if stale and _remove(path):
+                evicted += 1
+        return evicted
+
+    def clear(self):
+        """
+        Delete every entry.
+        """
+        for filename in os.listdir(self.directory):
+            if _ENTRY_NAME.match(filename):
+                _remove(os.path.join(self.directory, filename))
+
+    def _paths(self, key):
+        stem = os.path.join(self.directory, key + '-' + self.source_hash)
+        return stem + '.vertices.npy', stem + '.indices.npy'
+
+    def _save(self, path, array):
+        # Written to a temporary file and renamed, so other processes never
+        # see a partly written file
+        handle, temporary_path = tempfile.mkstemp(
+            suffix='.tmp', prefix=_TEMPORARY_PREFIX, dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as temporary_file:
+                np.save(temporary_file, np.asarray(array))
+            os.rename(temporary_path, path)
+        except Exception:
+            os.remove(temporary_path)
+            raise
+
+
+def _modified(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        # Renamed or deleted by another process since it was listed
+        return time.time()
+
+
+def _remove(path):
+    # Another process may have deleted the file already
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+def _load(path):
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Empty arrays can't be memory-mapped
+        array = np.load(path)
+        if array.size:
+            raise
+        return array
+
+
+def enable(directory, min_vertices=256):
+    """
+    Start caching prepared meshes in the given directory.
+
+    :return: the DiskMeshCache
+    """
+    global _active
+    _active = DiskMeshCache(directory, min_vertices)
+    return _active
+
+
+def disable():
+    global _active
+    _active = None
+
+
+def active():
+    """
+    :return: the enabled DiskMeshCache, or None.
+    """
+    return _active
+
+
+def prepared_buffers(vertices, triangles_indices):
+    """
+    The MeshBuffers of the given mesh, after mesh.prepare(). Loaded from the
+    disk cache if it's enabled and the mesh is big enough.
+    """
+    def prepare():
+        return MeshBuffers(*mesh.prepare(vertices, triangles_indices))
+
+    cache = _active
+    if cache is None or len(vertices) < cache.min_vertices:
+        return prepare()
+    return cache.buffers(
+        _ordered_key(content_key(vertices, triangles_indices)), prepare)
+
+
+def generated_buffers(name, params, generator):
+    """
+    The MeshBuffers of the mesh made by generator(*params), after
+    mesh.prepare(). Loaded from the disk cache if it's enabled, in which
+    case the generator isn't called at all.
+    """
+    def prepare():
+        return MeshBuffers(*mesh.prepare(*generator(*params)))
+
+    cache = _active
+    if cache is None:
+        return prepare()
+    return cache.buffers(_ordered_key(generator_key(name, params)), prepare)
@@ -0,0 +1,477 @@
+"""
+Parametric meshes, generated with numpy broadcasting rather than loops.
+
+Every generator returns (vertices, triangles_indices) arrays. Use
+mesh_cache.polygon() (or create()) to get a GLPolygon of a generated mesh:
+meshes are only generated once for each set of parameters, and every
+polygon of the same mesh is a clone, so they also share their GL resources.
+If the disk cache is enabled (see core.disk_cache), generated meshes are
+also kept between runs.
+"""
+from collections import OrderedDict
+import numpy as np
+
+from core import disk_cache, mesh
+from core.gl_polygon import GLPolygon
+from core.lod import LODPolygon
+
+__author__ = 'eatmuchpie'
+
+
+GENERATORS = {}
+
+
+def _generator(function):
+    GENERATORS[function.__name__] = function
+    return function
+
+
+def _circle(segments, radius=0.5, z=0.):
+    """
+    The vertices of a circle about the z axis, going ccw from the +x axis.
+    """
+    angles = 2 * np.pi * np.arange(segments) / segments
+    circle = np.empty((segments, 3))
+    circle[:, 0] = np.cos(angles) * radius
+    circle[:, 1] = np.sin(angles) * radius
+    circle[:, 2] = z
+    return circle
+
+
+def _wall(segments, radius, length):
+    """
+    The wall of a tube along the z axis, facing inwards.
+    """
+    vertices = np.concatenate((_circle(segments, radius),
+                               _circle(segments, radius, length)))
+
+    # A strip going round the front and back circles, back to the start
+    front = np.append(np.arange(segments), 0)
+    strip = np.column_stack((front, front + segments)).ravel()
+    return vertices, mesh.strip_to_triangles(strip)
+
+
+@_generator
+def hole_face(smoothness):
+    """
+    A unit square (centred on the origin) with a circular hole cut out of
+    it, as used for the front and back of an Aperture's hole. Each
+    quadrant of the circle is joined to the nearest corner of the square.
+    """
+    corners = np.array([
+        [0.5, 0.5, 0.],
+        [-0.5, 0.5, 0.],
+        [-0.5, -0.5, 0.],
+        [0.5, -0.5, 0.],
+    ])
+    vertices = np.concatenate((_circle(smoothness), corners))
+
+    indices = np.arange(smoothness)
+    quadrants = 4 * indices // smoothness
+    triangles_indices = np.column_stack((smoothness + quadrants, indices,
+                                         (indices + 1) % smoothness))
+    return vertices, triangles_indices
+
+
+@_generator
+def hole_wall(smoothness):
+    """
+    The inside of an Aperture's hole: a tube of diameter 1 from z=0 to z=1,
+    facing inwards.
+    """
+    return _wall(smoothness, 0.5, 1.)
+
+
+@_generator
+def cylinder(segments, radius=0.5, length=1.):
+    """
+    A closed cylinder along the z axis, from z=0 to z=length.
+    """
+    wall_vertices, wall_triangles = _wall(segments, radius, length)
+
+    # The caps get their own vertices, so their normals aren't smoothed
+    # into the wall's
+    caps = np.concatenate(([[0., 0., 0.]], _circle(segments, radius),
+                           [[0., 0., length]], _circle(segments, radius, length)))
+    vertices = np.concatenate((wall_vertices, caps))
+
+    indices = np.arange(segments)
+    following = (indices + 1) % segments
+    front = len(wall_vertices)
+    back = front + segments + 1
+    front_triangles = np.column_stack((np.full(segments, front),
+                                       front + 1 + following,
+                                       front + 1 + indices))
+    back_triangles = np.column_stack((np.full(segments, back),
+                                      back + 1 + indices,
+                                      back + 1 + following))
+
+    triangles_indices = np.concatenate((wall_triangles[:, ::-1],
+                                        front_triangles, back_triangles))
+    return vertices, triangles_indices
+
+
+@_generator
+def torus(major_radius, minor_radius, major_segments, minor_segments):
+    """
+    A torus about the z axis.
+
+    :param major_radius: the distance from the centre to the middle of the
+        tube.
+    :param minor_radius: the radius of the tube.
+    """
+    u = 2 * np.pi * np.arange(major_segments) / major_segments
+    v = 2 * np.pi * np.arange(minor_segments) / minor_segments
+    u, v = u[:, np.newaxis], v[np.newaxis, :]
+
+    distance = major_radius + minor_radius * np.cos(v)
+    vertices = np.empty((major_segments, minor_segments, 3))
+    vertices[..., 0] = distance * np.cos(u)
+    vertices[..., 1] = distance * np.sin(u)
+    vertices[..., 2] = minor_radius * np.sin(v)
+
+    return vertices.reshape(-1, 3), _grid_triangles(major_segments,
+                                                    minor_segments, True)
+
+
+@_generator
+def sphere(radius, slices, stacks):
+    """
+    A sphere centred on the origin, with a vertex at each pole.
+
+    :param slices: the number of segments around the z axis.
+    :param stacks: the number of segments from pole to pole.
+    """
+    theta = 2 * np.pi * np.arange(slices) / slices
+    phi = np.pi * np.arange(1, stacks) / stacks
+    theta, phi = theta[np.newaxis, :], phi[:, np.newaxis]
+
+    rings = np.empty((stacks - 1, slices, 3))
+    rings[..., 0] = radius * np.sin(phi) * np.cos(theta)
+    rings[..., 1] = radius * np.sin(phi) * np.sin(theta)
+    rings[..., 2] = radius * np.cos(phi)
+    vertices = np.concatenate(([[0., 0., radius]], rings.reshape(-1, 3),
+                               [[0., 0., -radius]]))
+
+    # Quads between the rings, whose vertices start after the top pole
+    quads = _grid_triangles(stacks - 1, slices, False) + 1
+
+    indices = np.arange(slices)
+    following = (indices + 1) % slices
+    bottom = len(vertices) - 1
+    last_ring = bottom - slices
+    top_triangles = np.column_stack((np.zeros(slices, dtype=np.intp),
+                                     1 + indices, 1 + following))
+    bottom_triangles = np.column_stack((np.full(slices, bottom),
+                                        last_ring + following,
+                                        last_ring + indices))
+
+    return vertices, np.concatenate((top_triangles, quads, bottom_triangles))
+
+
+@_generator
+def box():
+    """
+    A unit cube from the origin to [1, 1, 1], with each face having its
+    own vertices so the edges stay sharp.
+    """
+    corners = np.array([
+        [0., 0., 0.],
+        [1., 0., 0.],
+        [0., 1., 0.],
+        [1., 1., 0.],
+        [0., 0., 1.],
+        [1., 0., 1.],
+        [0., 1., 1.],
+        [1., 1., 1.],
+    ])
+    # Each face as a triangle strip, as in cube.create_unit_cube()
+    faces = np.array([[0, 2, 1, 3], [4, 5, 6, 7], [0, 1, 4, 5],
+                      [2, 6, 3, 7], [0, 4, 2, 6], [1, 3, 5, 7]])
+
+    face_triangles = mesh.strip_to_triangles([0, 1, 2, 3])
+    offsets = 4 * np.arange(len(faces))
+    triangles_indices = face_triangles + offsets[:, np.newaxis, np.newaxis]
+    return corners[faces.ravel()], triangles_indices.reshape(-1, 3)
+
+
+# The corners of a unit square centred on the origin, one per quadrant,
+# going ccw from +x+y
+_SQUARE_CORNERS = np.array([[0.5, 0.5], [-0.5, 0.5], [-0.5, -0.5], [0.5, -0.5]])
+
+
+def aperture_segments(smoothness):
+    """
+    The number of segments in an aperture's bore: smoothness rounded up to
+    a multiple of 4, so there's a vertex where the bore touches each side
+    of its bounding square.
+    """
+    return 4 * max(1, -(-int(smoothness) // 4))
+
+
+def aperture_vertices(segments, size, hole_size, hole_position, out=None):
+    """
+    The vertices of aperture(), which can be recalculated in place (into
+    out) as the triangles only depend on the number of segments.
+
+    There are two layers of vertices, at z=0 and z=size[2], each with the
+    bore's circle, the corners of the bore's bounding square and the corners
+    of the aperture.
+    """
+    if out is None:
+        out = np.empty((2 * (segments + 8), 3))
+    layers = out.reshape(2, segments + 8, 3)
+    hole_size = np.asarray(hole_size, dtype=float)[:2]
+    hole_position = np.asarray(hole_position, dtype=float)[:2]
+
+    layers[:, :segments, :2] = hole_position + \
+        _circle(segments, 0.5)[:, :2] * hole_size
+    layers[:, segments:segments + 4, :2] = hole_position + \
+        _SQUARE_CORNERS * hole_size
+    layers[:, segments + 4:, :2] = (_SQUARE_CORNERS + 0.5) * \
+        np.asarray(size, dtype=float)[:2]
+    layers[0, :, 2] = 0.
+    layers[1, :, 2] = size[2]
+    return out
+
+
+def aperture_topology(segments):
+    """
+    The triangles of aperture(), and the part of the aperture each one is
+    in: 0 for the front (z=0), 1 for the back, 2 for the bore and 3 to 6 for
+    the right, top, left and bottom sides.
+    """
+    layer_size = segments + 8
+    ring = np.arange(segments)
+    following = (ring + 1) % segments
+    hole_corners = segments + np.arange(4)
+    outer_corners = segments + 4 + np.arange(4)
+
+    # As in hole_face(), each quadrant of the circle is joined to the
+    # nearest corner of its bounding square. These face -z.
+    fans = np.column_stack((hole_corners[4 * ring // segments], ring,
+                            following))
+
+    # The frame between the bounding square and the aperture's edges is
+    # split into a trapezium on each side, from the corner before the side
+    # to the corner after it, meeting the circle where it touches the side.
+    # These face +z.
+    sides = np.arange(4)
+    before = (sides - 1) % 4
+    touching = sides * segments // 4
+    frame = np.concatenate((
+        np.column_stack((outer_corners[before], outer_corners[sides],
+                         touching)),
+        np.column_stack((outer_corners[before], touching,
+                         hole_corners[before])),
+        np.column_stack((outer_corners[sides], hole_corners[sides],
+                         touching))))
+
+    front = np.concatenate((fans, frame[:, ::-1]))
+    back = np.concatenate((fans[:, ::-1], frame)) + layer_size
+    bore = np.concatenate((
+        np.column_stack((ring, following + layer_size, following)),
+        np.column_stack((ring, ring + layer_size, following + layer_size))))
+    outside = np.concatenate((
+        np.column_stack((outer_corners[before], outer_corners[sides],
+                         outer_corners[sides] + layer_size)),
+        np.column_stack((outer_corners[before],
+                         outer_corners[sides] + layer_size,
+                         outer_corners[before] + layer_size))))
+
+    triangles_indices = np.concatenate((front, back, bore, outside))
+    parts = np.concatenate((np.zeros(len(front), dtype=np.intp),
+                            np.ones(len(back), dtype=np.intp),
+                            np.full(len(bore), 2, dtype=np.intp),
+                            3 + np.tile(sides, 2)))
+    return triangles_indices, parts
+
+
+@_generator
+def aperture(smoothness, size=(1., 1., 1.), hole_size=(1., 1.),
+             hole_position=(0.5, 0.5)):
+    """
+    A cuboid from the origin to size with an elliptical bore through it
+    along the z axis, as one closed mesh: the front, back, bore and sides
+    share the vertices along their edges, so there are no cracks or
+    internal faces. Every part faces outwards.
+
+    As the vertices are shared, their normals are smoothed across the
+    aperture's edges. Use mesh.split_parts() with aperture_topology()'s
+    parts to keep the edges sharp.
+
+    :param hole_size: the width and height of the bore.
+    :param hole_position: the centre of the bore.
+    """
+    segments = aperture_segments(smoothness)
+    vertices = aperture_vertices(segments, size, hole_size, hole_position)
+    return vertices, aperture_topology(segments)[0]
+
+
+# The fewest segments a curve is split into by lod_chain()
+MIN_SEGMENTS = 8
+
+
+def _fewer(segments, divisor, minimum=MIN_SEGMENTS):
+    return max(min(segments, minimum), segments // divisor)
+
+
+def _chord_error(radius, segments):
+    # How far the sides of a regular polygon stray from the circle it
+    # approximates
+    return radius * (1. - np.cos(np.pi / segments))
+
+
+def _hole_detail(divisor, smoothness):
+    segments = _fewer(smoothness, divisor)
+    return (segments,), _chord_error(0.5, segments)
+
+
+def _cylinder_detail(divisor, segments, radius=0.5, length=1.):
+    segments = _fewer(segments, divisor)
+    return (segments, radius, length), _chord_error(radius, segments)
+
+
+def _torus_detail(divisor, major_radius, minor_radius, major_segments,
+                  minor_segments):
+    major_segments = _fewer(major_segments, divisor)
+    minor_segments = _fewer(minor_segments, divisor)
+    error = max(_chord_error(major_radius + minor_radius, major_segments),
+                _chord_error(minor_radius, minor_segments))
+    return (major_radius, minor_radius, major_segments, minor_segments), error
+
+
+def _sphere_detail(divisor, radius, slices, stacks):
+    slices = _fewer(slices, divisor)
+    stacks = _fewer(stacks, divisor, MIN_SEGMENTS // 2)
+    # Each stack covers as much of a circle as two slices
+    error = max(_chord_error(radius, slices), _chord_error(radius, 2 * stacks))
+    return (radius, slices, stacks), error
+
+
+# For each curved generator, a function of a divisor and the generator's
+# parameters giving the parameters with the segment counts divided by the
+# divisor, and the error of the resulting mesh
+_DETAIL = {
+    'hole_face': _hole_detail,
+    'hole_wall': _hole_detail,
+    'cylinder': _cylinder_detail,
+    'torus': _torus_detail,
+    'sphere': _sphere_detail,
+}
+
+
+def lod_chain(name, *params):
+    """
+    The levels of detail of a curved generator: the parameters of each level
+    (halving the number of segments each time, down to MIN_SEGMENTS) and its
+    error, which is how far its surface strays from the true curve.
+
+    :return: (levels, errors), most detailed first
+    """
+    levels = []
+    errors = []
+    divisor = 1
+    while True:
+        level_params, error = _DETAIL[name](divisor, *params)
+        if levels and level_params == levels[-1]:
+            return levels, errors
+        levels.append(level_params)
+        errors.append(error)
+        divisor *= 2
+
+
+def _grid_triangles(rows, columns, wrap_rows):
+    """
+    Two triangles for every quad of a grid of rows * columns vertices,
+    stored row by row. The columns always wrap around, and the rows only
+    wrap around if wrap_rows is True.
+    """
+    row_count = rows if wrap_rows else rows - 1
+    row = np.arange(row_count)[:, np.newaxis]
+    column = np.arange(columns)[np.newaxis, :]
+    next_row = (row + 1) % rows
+    next_column = (column + 1) % columns
+
+    a = row * columns + column
+    b = next_row * columns + column
+    c = next_row * columns + next_column
+    d = row * columns + next_column
+
+    triangles = np.stack((np.stack((a, b, c), axis=-1),
+                          np.stack((a, c, d), axis=-1)), axis=-2)
+    return triangles.reshape(-1, 3)
+
+
+class MeshCache(object):
+    """
+    A least-recently-used cache of generated meshes, keyed on the
+    generator's name and parameters.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._polygons = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._polygons)
+
+    def polygon(self, name, *params):
+        """
+        A GLPolygon of the mesh made by the named generator with the given
+        parameters, which is a clone of any other polygons of that mesh.
+        """
+        def generate():
+            # Loaded from the disk cache, if it's enabled
+            return GLPolygon(buffers=disk_cache.generated_buffers(
+                name, params, GENERATORS[name]))
+        return self._clone((name,) + params, generate)
+
+    def lod_polygon(self, name, *params):
+        """
+        Like self.polygon(), but an LODPolygon with less detailed versions
+        of the mesh (see lod_chain()).
+        """
+        def generate():
+            levels, errors = lod_chain(name, *params)
+            return LODPolygon([self.polygon(name, *level_params)
+                               for level_params in levels], errors)
+        return self._clone(('lod', name) + params, generate)
+
+    def _clone(self, key, generate):
+        prototype = self._polygons.pop(key, None)
+        if prototype is None:
+            self.misses += 1
+            prototype = generate()
+            if len(self._polygons) >= self.maxsize:
+                self._polygons.popitem(last=False)
+        else:
+            self.hits += 1
+
+        # (Re)inserted as the most recently used
+        self._polygons[key] = prototype
+        return prototype.clone()
+
+    def clear(self):
+        self._polygons.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+mesh_cache = MeshCache()
+
+
+def create(name, *params):
+    """
+    Shorthand for mesh_cache.polygon(name, *params).
+    """
+    return mesh_cache.polygon(name, *params)
+
+
+def create_lod(name, *params):
+    """
+    Shorthand for mesh_cache.lod_polygon(name, *params).
+    """
+    return mesh_cache.lod_polygon(name, *params)
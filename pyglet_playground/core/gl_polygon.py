@@ -1,6 +1,6 @@
-import numpy as np
-from pyglet.gl import *
-
+from core import backends, culling, disk_cache, mesh
+from core.buffers import MeshBuffers
+from core.mesh_registry import mesh_registry
 from core.polygon import Polygon
 
 
@@ -8,7 +8,8 @@ __author__ = 'eatmuchpie'
 
 
 class GLPolygon(Polygon):
-    def __init__(self, vertices=None, triangles_indices=None, to_clone=None):
+    def __init__(self, vertices=None, triangles_indices=None, to_clone=None,
+                 normals=None, buffers=None, shared=True):
         """
         Creates a GLPolygon from the supplied vertices and triangles, or
         shallow-copies the supplied GLPolygon.
@@ -16,82 +17,56 @@ class GLPolygon(Polygon):
         :param vertices: numpy.ndarray([[x1,y1,z1], [x2,y2,z2], ...])
         :param triangles_indices: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
         :param to_clone: the triangle strip to copy
+        :param normals: numpy.ndarray with the normal of each vertex. If given,
+            the mesh is used as-is, so every vertex must be used by a
+            triangle. Otherwise unused vertices are removed and the normals
+            are calculated.
+        :param buffers: the MeshBuffers to draw, instead of vertices and
+            triangles_indices.
+        :param shared: if False, the mesh isn't shared with polygons that
+            have an identical one (other than clones), so it can be changed
+            in place.
         """
         if to_clone is not None:
-            self.gl_list = to_clone.gl_list
+            self.buffers = to_clone.buffers
+            self.gl_resources = to_clone.gl_resources
+            self._shared_mesh = to_clone._shared_mesh
+            mesh_registry.acquire(self, self._shared_mesh)
             super(GLPolygon, self).__init__(to_clone=to_clone)
         else:
             super(GLPolygon, self).__init__()
 
-            # Remove unused vertices
-            all_vertices = set(range(len(vertices)))
-            unused_vertices = all_vertices
-            for triangle_indices in triangles_indices:
-                unused_vertices.difference_update(triangle_indices)
-            sorted_unused_vertices = sorted(unused_vertices)
-            vertices = np.delete(vertices, sorted_unused_vertices, 0)
-
-            # Calculate index corrections
-            def corrected_index(index):
-                for n, deleted_index in enumerate(sorted_unused_vertices):
-                    if index < deleted_index:
-                        return index - n
-                return index - len(sorted_unused_vertices)
-
-            # Correct the triangle indices
-            triangles_indices = np.vectorize(corrected_index)(triangles_indices)
-
-            # Calculate sum of normals for each vertex
-            normal_sums_per_vertex = np.zeros([len(vertices), 3])
-            for triangle in triangles_indices:
-                a, b, c = [vertices[i] for i in triangle]
-                ab = b - a
-                bc = c - a
-                normal = np.cross(ab, bc)
-                normal /= np.linalg.norm(normal)
-                for i in triangle:
-                    normal_sums_per_vertex[i] += normal
-
-            # Replace sum of normals for each vertex with average by normalising
-            for i in range(len(vertices)):
-                length = np.linalg.norm(normal_sums_per_vertex[i])
-                normal_sums_per_vertex[i] /= length
-
-            # Linearise the arrays
-            vertices = np.concatenate(vertices).tolist()
-            normals = np.concatenate(normal_sums_per_vertex).tolist()
-            triangles_indices = np.concatenate(triangles_indices).tolist()
+            if buffers is None and normals is not None:
+                buffers = MeshBuffers(vertices, normals, triangles_indices)
+            elif buffers is None:
+                # Loaded from the disk cache, if it's enabled
+                buffers = disk_cache.prepared_buffers(vertices,
+                                                      triangles_indices)
 
-            # Convert arrays to c_type arrays
-            vertices = (GLfloat * len(vertices))(*vertices)
-            normals = (GLfloat * len(normals))(*normals)
-            triangles_indices = (GLuint * len(triangles_indices))(*triangles_indices)
-
-            # Generate and save OpenGl command list
-            self.gl_list = glGenLists(1)
-            glNewList(self.gl_list, GL_COMPILE)
-
-            glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
-            glEnableClientState(GL_VERTEX_ARRAY)
-            glEnableClientState(GL_NORMAL_ARRAY)
-            glVertexPointer(3, GL_FLOAT, 0, vertices)
-            glNormalPointer(GL_FLOAT, 0, normals)
-            glDrawElements(GL_TRIANGLES, len(triangles_indices), GL_UNSIGNED_INT, triangles_indices)
-            glPopClientAttrib()
-
-            glEndList()
+            # Polygons with identical meshes share them, as if they were
+            # clones. GL objects are created by the render backend on first
+            # draw.
+            self._shared_mesh = mesh_registry.intern(self, buffers, shared)
+            self.buffers = self._shared_mesh.buffers
+            self.gl_resources = self._shared_mesh.gl_resources
 
     def draw(self):
-        if self.gl_list is None:
+        if self.buffers is None:
             raise Exception("GLObject has no vertices defined")
 
         self.transform()
 
         try:
-            glCallList(self.gl_list)
+            culler = culling.current()
+            if culler is None or culler.visible(self):
+                backends.current().draw(self)
         finally:
             self.untransform()
 
+    @property
+    def local_bounds(self):
+        return self.buffers.bounds
+
     def clone(self):
         return GLPolygon(to_clone=self)
 
@@ -107,11 +82,5 @@ class GLPolygon(Polygon):
         if to_clone is not None:
             return GLPolygon(to_clone=to_clone)
         else:
-            triangles = []
-            for i in range(len(triangle_strip_indices) - 2):
-                if i % 2 == 0:
-                    triangles.append(triangle_strip_indices[i: i + 3])
-                else:
-                    triangles.append(triangle_strip_indices[i + 2: i - 1: -1])
-
+            triangles = mesh.strip_to_triangles(triangle_strip_indices)
             return GLPolygon(vertices, triangles)
@@ -0,0 +1,473 @@
+"""
+Recording GL calls into command buffers, and replaying them later.
+
+A CommandRecorder stands in for pyglet.gl: point a backend at one (e.g.
+BufferObjectBackend(gl=CommandRecorder())) and everything the backend and
+the Scene would have sent to GL is appended to a CommandBuffer instead. No
+GL context is needed, so scenes can be drawn and measured in tests and
+headless tools.
+
+A CommandBuffer keeps its commands in a few flat numpy arrays: one opcode
+per command, indexing the names of the functions called, and one number and
+one kind code per argument. Data that GL would read through a pointer
+(matrices, light vectors, buffer contents) is copied when it's recorded, so
+it can be changed afterwards. Other pointers, such as the client-side
+vertex arrays that DisplayListBackend compiles into display lists, are kept
+as they are, so those commands must be replayed while the arrays they point
+to are alive.
+
+A Replayer sends recorded buffers to a real context, in the order they were
+recorded. The names of the buffers, display lists, shaders and programs
+that the recorder handed out are mapped to the ones the context creates.
+
+For example, to count what a frame draws, then draw it:
+
+    recorder = gl_recording.CommandRecorder()
+    scene = Scene(backend=backends.BufferObjectBackend(recorder))
+    replayer = gl_recording.Replayer()
+    ...
+    scene.draw()
+    print(recorder.last_frame['draw_calls'])
+    replayer.replay(recorder.last_commands)
+"""
+import ctypes
+import itertools
+import numpy as np
+import pyglet.gl
+from pyglet.gl import GLfloat, GLuint, GL_TRIANGLES
+
+__author__ = 'eatmuchpie'
+
+
+# Argument kinds
+INT, FLOAT, POINTER, DATA, OBJECT = range(5)
+
+# Functions that read data through a pointer argument, as
+# {name: (argument index, ctypes type, function of the arguments giving the
+# number of elements)}. The data is copied when the call is recorded.
+_POINTER_DATA = {
+    'glLoadMatrixf': (0, GLfloat, lambda args: 16),
+    'glMultMatrixf': (0, GLfloat, lambda args: 16),
+    'glBufferData': (2, ctypes.c_char, lambda args: args[1]),
+    'glBufferSubData': (3, ctypes.c_char, lambda args: args[2]),
+}
+
+# Functions that create names. glGenBuffers and glGenTextures write them
+# into their second argument; the others return them.
+_GEN_FUNCTIONS = frozenset(['glGenBuffers', 'glGenTextures'])
+_CREATE_FUNCTIONS = frozenset(['glGenLists', 'glCreateShader',
+                               'glCreateProgram'])
+
+# The arguments of each function that are names, which are mapped to the
+# context's names when replayed
+_NAME_ARGUMENTS = {
+    'glBindBuffer': (1,),
+    'glBindTexture': (1,),
+    'glNewList': (0,),
+    'glCallList': (0,),
+    'glDeleteLists': (0,),
+    'glUseProgram': (0,),
+    'glShaderSource': (0,),
+    'glCompileShader': (0,),
+    'glAttachShader': (0, 1),
+    'glDeleteShader': (0,),
+    'glBindAttribLocation': (0,),
+    'glLinkProgram': (0,),
+    'glDeleteProgram': (0,),
+    'glGetShaderiv': (0,),
+    'glGetProgramiv': (0,),
+    'glGetShaderInfoLog': (0,),
+    'glGetProgramInfoLog': (0,),
+}
+# Functions taking an array of names as their second argument
+_NAME_ARRAYS = frozenset(['glDeleteBuffers', 'glDeleteTextures'])
+
+# How each function is counted by frame_stats()
+DRAW_CALLS = frozenset(['glDrawArrays', 'glDrawElements',
+                        'glDrawArraysInstanced', 'glDrawElementsInstanced',
+                        'glCallList'])
+MATRIX_PUSHES = frozenset(['glPushMatrix'])
+MATRIX_LOADS = frozenset(['glLoadMatrixf', 'glLoadIdentity', 'glMultMatrixf',
+                          'glTranslatef', 'glRotatef', 'glScalef',
+                          'gluPerspective'])
+STATE_CHANGES = frozenset([
+    'glEnable', 'glDisable', 'glEnableClientState', 'glDisableClientState',
+    'glPushClientAttrib', 'glPopClientAttrib', 'glPushAttrib', 'glPopAttrib',
+    'glBindBuffer', 'glBindTexture', 'glUseProgram', 'glMatrixMode',
+    'glVertexPointer', 'glNormalPointer', 'glVertexAttribPointer',
+    'glEnableVertexAttribArray', 'glDisableVertexAttribArray',
+    'glVertexAttribDivisor', 'glColor3f', 'glClearColor', 'glLightfv',
+    'glMaterialf', 'glMaterialfv', 'glPolygonMode', 'glViewport'])
+
+
+class _Column(object):
+    # A numpy array that grows as values are appended to it
+
+    def __init__(self, dtype):
+        self._data = np.empty(64, dtype=dtype)
+        self.size = 0
+
+    def append(self, value):
+        if self.size == len(self._data):
+            self._data = np.resize(self._data, 2 * len(self._data))
+        self._data[self.size] = value
+        self.size += 1
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+class FunctionTable(list):
+    """
+    The names of the functions that opcodes stand for.
+    """
+
+    def __init__(self):
+        super(FunctionTable, self).__init__()
+        self._opcodes = {}
+
+    def opcode(self, name):
+        """
+        The opcode of the named function, which is added if it's new.
+        """
+        opcode = self._opcodes.get(name)
+        if opcode is None:
+            opcode = self._opcodes[name] = len(self)
+            self.append(name)
+        return opcode
+
+
+class CommandBuffer(object):
+    """
+    A sequence of recorded GL calls.
+
+    self.opcodes holds each command's index into self.functions.
+    self.arguments and self.kinds hold the arguments of every command, one
+    after another, and command i's are at self.argument_starts[i] up to
+    self.argument_starts[i + 1]. Arguments of kind INT, FLOAT and POINTER
+    are stored as numbers; those of kind DATA and OBJECT are indices into
+    self.data, which holds copied data as (ctypes type, bytes) and anything
+    else as the object itself.
+
+    self.results holds the names returned by the calls that created them,
+    by command index.
+    """
+
+    def __init__(self, functions=None):
+        """
+        :param functions: the FunctionTable to use, which is shared so
+            buffers from the same recorder have the same opcodes.
+        """
+        self.functions = FunctionTable() if functions is None else functions
+        self._opcodes = _Column(np.uint16)
+        self._argument_starts = _Column(np.uint32)
+        self._argument_starts.append(0)
+        self._arguments = _Column(np.float64)
+        self._kinds = _Column(np.uint8)
+        self.data = []
+        self.results = {}
+
+    def __len__(self):
+        return self._opcodes.size
+
+    @property
+    def opcodes(self):
+        return self._opcodes.values
+
+    @property
+    def argument_starts(self):
+        return self._argument_starts.values
+
+    @property
+    def arguments(self):
+        return self._arguments.values
+
+    @property
+    def kinds(self):
+        return self._kinds.values
+
+    def append(self, name, args):
+        """
+        Record a call of the named function.
+
+        :return: the index of the command.
+        """
+        self._opcodes.append(self.functions.opcode(name))
+
+        pointer_data = _POINTER_DATA.get(name)
+        for index, arg in enumerate(args):
+            if pointer_data is not None and index == pointer_data[0] and \
+                    arg is not None:
+                self._append_data(pointer_data[1], _copy(
+                    arg, pointer_data[1], pointer_data[2](args)))
+            else:
+                self._append_argument(arg)
+        self._argument_starts.append(self._arguments.size)
+        return len(self) - 1
+
+    def _append_argument(self, arg):
+        if isinstance(arg, bool):
+            arg = int(arg)
+        if isinstance(arg, (int, long)):
+            self._append_number(INT, arg)
+        elif isinstance(arg, float):
+            self._append_number(FLOAT, arg)
+        elif arg is None:
+            self._append_number(POINTER, 0)
+        elif isinstance(arg, ctypes.c_void_p):
+            # Byte offsets into a bound buffer, or client-side pointers
+            self._append_number(POINTER, arg.value or 0)
+        elif isinstance(arg, ctypes.Array):
+            # e.g. the vec() of a light's position
+            self._append_data(arg._type_, ctypes.string_at(
+                ctypes.addressof(arg), ctypes.sizeof(arg)))
+        else:
+            self._append_number(OBJECT, len(self.data))
+            self.data.append(arg)
+
+    def _append_number(self, kind, value):
+        self._kinds.append(kind)
+        self._arguments.append(value)
+
+    def _append_data(self, ctype, data):
+        self._append_number(DATA, len(self.data))
+        self.data.append((ctype, data))
+
+    def arguments_of(self, index):
+        """
+        The arguments of the command at index, decoded back into values
+        that can be passed to GL.
+        """
+        start, end = self.argument_starts[index:index + 2]
+        return [self._decode(kind, value) for kind, value in
+                zip(self.kinds[start:end], self.arguments[start:end])]
+
+    def _decode(self, kind, value):
+        if kind == INT:
+            return int(value)
+        if kind == FLOAT:
+            return float(value)
+        if kind == POINTER:
+            return ctypes.c_void_p(int(value)) if value else None
+        if kind == DATA:
+            ctype, data = self.data[int(value)]
+            array = (ctype * (len(data) // ctypes.sizeof(ctype)))()
+            ctypes.memmove(array, data, len(data))
+            return array
+        return self.data[int(value)]
+
+    def calls(self):
+        """
+        :return: an iterator over the commands as (function name, arguments)
+            tuples.
+        """
+        for index, opcode in enumerate(self.opcodes):
+            yield self.functions[opcode], self.arguments_of(index)
+
+    def counts(self):
+        """
+        :return: {function name: number of calls}.
+        """
+        counts = np.bincount(self.opcodes, minlength=len(self.functions))
+        return dict((name, int(count)) for name, count in
+                    zip(self.functions, counts) if count)
+
+
+class CommandRecorder(object):
+    """
+    A stand-in for pyglet.gl that records gl* and glu* calls into
+    self.commands.
+
+    Names are handed out like a real context would, from one sequence for
+    every kind of object, and compiling and linking shaders always succeeds.
+    Other functions return 0.
+
+    Call self.begin_frame() after each frame (a Scene does this at the end
+    of its draw()): it moves the commands recorded so far into
+    self.last_commands, and their counts (see frame_stats()) into
+    self.last_frame.
+    """
+
+    def __init__(self):
+        self.commands = CommandBuffer()
+        self.last_commands = CommandBuffer(self.commands.functions)
+        self._names = itertools.count(1)
+        # The triangles drawn by each display list, for counting glCallList
+        self._list_triangles = {}
+        self.last_frame = frame_stats(self.last_commands, {})
+
+    def __getattr__(self, name):
+        if not name.startswith('gl'):
+            raise AttributeError(name)
+        constant = getattr(pyglet.gl, name, None)
+        if constant is not None and not callable(constant):
+            # e.g. gl.GL_TRIANGLES
+            return constant
+
+        def record(*args):
+            return self._record(name, args)
+        record.__name__ = name
+        return record
+
+    def _record(self, name, args):
+        if name in _GEN_FUNCTIONS:
+            # Called as glGenBuffers(n, byref(GLuint())) or with an array
+            count, names = args[0], getattr(args[1], '_obj', args[1])
+            generated = [next(self._names) for _ in range(count)]
+            if isinstance(names, ctypes.Array):
+                names[:count] = generated
+            else:
+                names.value = generated[0]
+            self.commands.append(name, (count, (GLuint * count)(*generated)))
+            return
+
+        index = self.commands.append(name, args)
+        if name in _CREATE_FUNCTIONS:
+            count = args[0] if name == 'glGenLists' else 1
+            first = next(self._names)
+            for _ in range(count - 1):
+                next(self._names)
+            self.commands.results[index] = first
+            return first
+        if name in ('glGetShaderiv', 'glGetProgramiv'):
+            # The compile and link statuses
+            getattr(args[2], '_obj', args[2]).value = 1
+        return 0
+
+    def begin_frame(self):
+        """
+        Store the commands recorded for the frame just drawn in
+        self.last_commands and their counts in self.last_frame, and start
+        recording a new frame.
+        """
+        self.last_commands = self.commands
+        self.last_frame = frame_stats(self.last_commands, self._list_triangles)
+        self.commands = CommandBuffer(self.last_commands.functions)
+
+
+def frame_stats(commands, list_triangles):
+    """
+    Count what a CommandBuffer draws.
+
+    :param list_triangles: {display list name: triangles}, for the lists
+        that were compiled before the buffer. The lists compiled in the
+        buffer are added to it.
+    :return: a dictionary of
+        'commands': the number of commands,
+        'draw_calls': the glDraw* and glCallList calls, except those
+            compiled into display lists,
+        'triangles': the triangles they draw, including those of the
+            display lists called,
+        'matrix_pushes': the glPushMatrix calls,
+        'matrix_loads': the calls that set or multiply the current matrix,
+        'state_changes': the calls that change other GL state, such as
+            glEnable, glBindBuffer and glUseProgram, and
+        'functions': {function name: number of calls}.
+    """
+    counts = commands.counts()
+
+    def total(names):
+        return sum(counts.get(name, 0) for name in names)
+
+    draw_calls = 0
+    triangles = 0
+    compiling = None
+    important = DRAW_CALLS | set(['glNewList', 'glEndList'])
+    opcodes = np.flatnonzero(np.in1d(commands.functions, list(important)))
+    for index in np.flatnonzero(np.in1d(commands.opcodes, opcodes)):
+        name = commands.functions[commands.opcodes[index]]
+        start = commands.argument_starts[index]
+        args = commands.arguments[start:commands.argument_starts[index + 1]]
+        if name == 'glNewList':
+            compiling = int(args[0])
+            list_triangles[compiling] = 0
+            continue
+        if name == 'glEndList':
+            compiling = None
+            continue
+
+        if name == 'glCallList':
+            drawn = list_triangles.get(int(args[0]), 0)
+        else:
+            drawn = _triangles(name, args)
+        if compiling is None:
+            draw_calls += 1
+            triangles += drawn
+        else:
+            list_triangles[compiling] += drawn
+
+    return {'commands': len(commands),
+            'draw_calls': draw_calls,
+            'triangles': triangles,
+            'matrix_pushes': total(MATRIX_PUSHES),
+            'matrix_loads': total(MATRIX_LOADS),
+            'state_changes': total(STATE_CHANGES),
+            'functions': counts}
+
+
+def _triangles(name, args):
+    # The triangles drawn by a glDraw* call
+    if args[0] != GL_TRIANGLES:
+        return 0
+    count = args[2] if name.startswith('glDrawArrays') else args[1]
+    instances = args[-1] if name.endswith('Instanced') else 1
+    return int(count) // 3 * int(instances)
+
+
+class Replayer(object):
+    """
+    Sends recorded commands to a real GL context, mapping the names in them
+    to the context's.
+
+    Use one Replayer for all the buffers recorded by one CommandRecorder,
+    replaying them in order, so names created in one buffer can be used in
+    the next.
+    """
+
+    def __init__(self, gl=pyglet.gl):
+        """
+        :param gl: the namespace to call GL functions on.
+        """
+        self.gl = gl
+        # {recorded name: the context's name}
+        self.names = {0: 0}
+
+    def replay(self, commands):
+        for index, opcode in enumerate(commands.opcodes):
+            name = commands.functions[opcode]
+            args = commands.arguments_of(index)
+            function = getattr(self.gl, name)
+
+            if name in _GEN_FUNCTIONS:
+                count, recorded = args
+                names = (GLuint * count)()
+                function(count, names)
+                self.names.update(zip(recorded, names))
+                continue
+
+            for arg_index in _NAME_ARGUMENTS.get(name, ()):
+                args[arg_index] = self._name(args[arg_index])
+            if name in _NAME_ARRAYS:
+                args[1] = (GLuint * len(args[1]))(
+                    *[self._name(recorded) for recorded in args[1]])
+
+            result = function(*args)
+            if index in commands.results:
+                recorded = commands.results[index]
+                count = args[0] if name == 'glGenLists' else 1
+                for offset in range(count):
+                    self.names[recorded + offset] = result + offset
+
+    def _name(self, recorded):
+        return self.names.get(recorded, recorded)
+
+
+def _copy(pointer, ctype, count):
+    # The bytes of count ctype elements at pointer, which can be a c_void_p,
+    # a ctypes pointer or a ctypes array
+    if isinstance(pointer, ctypes.c_void_p):
+        address = pointer.value
+    else:
+        address = ctypes.cast(pointer, ctypes.c_void_p).value
+    return ctypes.string_at(address, int(count) * ctypes.sizeof(ctype))
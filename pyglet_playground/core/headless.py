@@ -0,0 +1,22 @@
+"""
+Lets pyglet.gl be imported on machines without a display.
+
+By default, importing pyglet.gl opens a hidden "shadow" window to share GL
+objects with, which fails if there's no display to open it on. Importing
+this module first turns the shadow window off:
+
+    from core import headless
+    from core import software
+    from core.scene import Scene
+
+It's imported by the modules that draw without GL (core.software and
+core.batch), so importing those first is enough. It has no effect if
+pyglet.gl has already been imported. Windows opened later work as usual,
+but GL objects can only be created once one is open.
+"""
+import pyglet
+
+__author__ = 'eatmuchpie'
+
+
+pyglet.options['shadow_window'] = False
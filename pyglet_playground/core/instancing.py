@@ -0,0 +1,88 @@
+"""
+Grouping of GLPolygons that share a mesh, so that each mesh can be drawn
+once for all of its instances.
+
+This module doesn't use GL, so the grouping and the per-instance data can be
+tested without a GPU. See backends.InstancedBackend for the drawing.
+"""
+from collections import OrderedDict
+import numpy as np
+
+from core import matrix
+
+__author__ = 'eatmuchpie'
+
+
+# Floats per instance: a 4x4 model matrix then a 3x3 normal matrix, each
+# stored column by column
+MODEL_MATRIX_OFFSET = 0
+NORMAL_MATRIX_OFFSET = 16
+INSTANCE_COMPONENTS = 25
+
+
+class InstanceBatch(object):
+    """
+    All the instances of one mesh that were drawn in a frame.
+    """
+
+    def __init__(self, polygon):
+        # Any one of the polygons sharing the mesh (they're all clones)
+        self.polygon = polygon
+        self.world_matrices = []
+
+    def __len__(self):
+        return len(self.world_matrices)
+
+    def instance_data(self):
+        return instance_data(self.world_matrices)
+
+
+class InstanceBatcher(object):
+    """
+    Collects polygons as they are drawn, grouping the ones that share a mesh
+    (i.e. clones, which share their gl_resources).
+    """
+
+    def __init__(self):
+        self._batches = OrderedDict()
+
+    def __len__(self):
+        return len(self._batches)
+
+    def add(self, polygon):
+        """
+        Add the polygon, with its current world matrix, to the batch for its
+        mesh.
+        """
+        key = id(polygon.gl_resources)
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = InstanceBatch(polygon)
+        batch.world_matrices.append(polygon.world_matrix)
+
+    def take(self):
+        """
+        Return the batches collected so far, in the order their meshes were
+        first drawn, and start collecting again.
+        """
+        batches = list(self._batches.values())
+        self._batches.clear()
+        return batches
+
+
+def instance_data(world_matrices):
+    """
+    Build the per-instance data for the given world matrices: a contiguous
+    float32 array with INSTANCE_COMPONENTS floats per instance.
+
+    The normal matrix is calculated with matrix.normal_matrix().
+    """
+    world_matrices = np.asarray(world_matrices, dtype=float).reshape(-1, 4, 4)
+    data = np.empty((len(world_matrices), INSTANCE_COMPONENTS),
+                    dtype=np.float32)
+
+    data[:, MODEL_MATRIX_OFFSET:NORMAL_MATRIX_OFFSET] = \
+        matrix.gl_matrix(world_matrices).reshape(-1, 16)
+    data[:, NORMAL_MATRIX_OFFSET:] = \
+        matrix.gl_matrix(matrix.normal_matrix(world_matrices)).reshape(-1, 9)
+    return data
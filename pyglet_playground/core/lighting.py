@@ -0,0 +1,65 @@
+"""
+The lights and material the Scene draws with, and a numpy version of GL's
+fixed-function lighting for renderers without GL.
+
+Scene.gl_setup() gives these values to GL. Lights are directional, with
+their directions in eye space (they're set while the modelview matrix is
+the identity).
+"""
+from collections import namedtuple
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+Light = namedtuple('Light', 'position diffuse specular')
+
+# GL_LIGHT0 and GL_LIGHT1, as (x, y, z, 0) directions and RGBA colours
+LIGHTS = (
+    Light(position=(.5, .5, 1, 0), diffuse=(1, 1, 1, 1),
+          specular=(.5, .5, 1, 1)),
+    Light(position=(1, 0, .5, 0), diffuse=(.5, .5, .5, 1),
+          specular=(1, 1, 1, 1)),
+)
+
+AMBIENT_AND_DIFFUSE = (0.5, 0, 0.3, 1)
+SPECULAR = (1, 1, 1, 1)
+SHININESS = 50
+
+CLEAR_COLOR = (1, 1, 1, 1)
+
+# GL's default GL_LIGHT_MODEL_AMBIENT
+MODEL_AMBIENT = (0.2, 0.2, 0.2, 1)
+
+
+def shade(normals, lights=LIGHTS):
+    """
+    The colour GL's fixed-function lighting gives vertices with the given
+    eye space normals, with a viewer at infinity (GL's default).
+
+    :param normals: numpy.ndarray of unit normals, [[nx, ny, nz], ...]
+    :return: numpy.ndarray of [r, g, b] colours, between 0 and 1
+    """
+    normals = np.asarray(normals, dtype=float)
+    material = np.array(AMBIENT_AND_DIFFUSE[:3])
+    colors = np.tile(np.array(MODEL_AMBIENT[:3]) * material,
+                     (len(normals), 1))
+
+    for light in lights:
+        direction = _unit(light.position[:3])
+        half_vector = _unit(direction + [0., 0., 1.])
+
+        diffuse = normals.dot(direction)
+        lit = diffuse > 0
+        specular = np.where(lit, np.maximum(normals.dot(half_vector), 0.), 0.)
+        colors += np.maximum(diffuse, 0.)[:, np.newaxis] * \
+            (np.array(light.diffuse[:3]) * material)
+        colors += (specular ** SHININESS)[:, np.newaxis] * \
+            (np.array(light.specular[:3]) * np.array(SPECULAR[:3]))
+
+    return np.clip(colors, 0., 1.)
+
+
+def _unit(vector):
+    vector = np.asarray(vector, dtype=float)
+    return vector / np.sqrt(vector.dot(vector))
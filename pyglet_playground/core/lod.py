@@ -0,0 +1,189 @@
+"""
+Levels of detail: polygons with a chain of meshes of decreasing detail, one
+of which is chosen each time they're drawn.
+
+While an LODSelector is current (see using()), an LODPolygon draws the
+least detailed of its meshes whose error (how far it strays from the
+surface it approximates) covers less than the selector's tolerance in
+pixels. Without a selector, the most detailed mesh is drawn.
+"""
+from contextlib import contextmanager
+import numpy as np
+
+from core import backends, bounds, culling
+from core.gl_polygon import GLPolygon
+
+__author__ = 'eatmuchpie'
+
+
+class LODPolygon(GLPolygon):
+    """
+    A GLPolygon with less detailed versions of its mesh.
+
+    Everything but drawing (e.g. bounds, picking and static batching) uses
+    the most detailed mesh.
+    """
+
+    def __init__(self, levels=None, errors=None, to_clone=None):
+        """
+        :param levels: GLPolygons of the meshes, most detailed first. Their
+            own transformations are ignored.
+        :param errors: the error of each level, in this polygon's units,
+            i.e. the furthest the level's surface strays from the surface it
+            approximates. They must increase with the level.
+        :param to_clone: the LODPolygon to copy
+        """
+        if to_clone is not None:
+            super(LODPolygon, self).__init__(to_clone=to_clone)
+            self.levels = [level.clone() for level in to_clone.levels]
+            self.errors = to_clone.errors
+        else:
+            super(LODPolygon, self).__init__(buffers=levels[0].buffers)
+            self.levels = [level.clone() for level in levels]
+            self.errors = np.array(errors, dtype=float)
+
+        # The index of the level drawn last
+        self.level = 0
+
+    def draw(self):
+        self.transform()
+        try:
+            culler = culling.current()
+            if culler is not None and not culler.visible(self):
+                return
+
+            selector = current()
+            if selector is not None:
+                self.level = selector.select(self)
+            level = self.levels[self.level]
+
+            # Drawn directly, as the level's bounds are tested above
+            level.transform()
+            try:
+                backends.current().draw(level)
+            finally:
+                level.untransform()
+        finally:
+            self.untransform()
+
+    def clone(self):
+        return LODPolygon(to_clone=self)
+
+
+class LODSelector(object):
+    """
+    Chooses the level of detail of LODPolygons from their size on screen,
+    for a gluPerspective projection with an identity modelview matrix.
+
+    self.last_frame holds the triangles drawn by LODPolygons in the last
+    frame ('triangles'), the triangles their most detailed levels would have
+    drawn ('full_triangles') and how many of them drew each level ('levels').
+    """
+
+    def __init__(self, field_of_view, viewport_height=1, tolerance=0.5,
+                 hysteresis=0.25):
+        """
+        :param field_of_view: the vertical field of view, in degrees.
+        :param viewport_height: the height of the viewport, in pixels.
+        :param tolerance: the most pixels a level's error can cover.
+        :param hysteresis: a less detailed level is only chosen once its
+            error is this fraction below the tolerance, so polygons at the
+            boundary between two levels don't flick between them.
+        """
+        self.field_of_view = field_of_view
+        self.viewport_height = viewport_height
+        self.tolerance = tolerance
+        self.hysteresis = hysteresis
+        self._reset()
+        self.last_frame = self._frame_counts()
+
+    def begin_frame(self):
+        """
+        Store the counts for the frame just drawn in self.last_frame, and
+        reset them.
+        """
+        self.last_frame = self._frame_counts()
+        self._reset()
+
+    def pixels_per_unit(self, polygon):
+        """
+        The number of pixels covered by one unit of the polygon's space,
+        about its centre. The polygon's world matrix must be up to date.
+        Polygons with empty meshes (no bounds) count as having no size.
+        """
+        local_bounds = polygon.local_bounds
+        if local_bounds is None:
+            return 0.
+        centre, radius = bounds.sphere(
+            bounds.transform(polygon.world_matrix, local_bounds))
+        local_radius = bounds.sphere(local_bounds)[1]
+        if local_radius == 0:
+            return 0.
+
+        distance = np.sqrt(centre.dot(centre))
+        if distance <= radius:
+            # The eye is inside it
+            return np.inf
+
+        half_height = np.tan(np.radians(self.field_of_view) / 2.)
+        pixels_per_world_unit = self.viewport_height / (2. * half_height * distance)
+        return pixels_per_world_unit * radius / local_radius
+
+    def select(self, polygon):
+        """
+        :return: the index of the level the polygon should draw.
+        """
+        pixel_errors = polygon.errors * self.pixels_per_unit(polygon)
+
+        level = polygon.level
+        if pixel_errors[level] > self.tolerance:
+            # Not detailed enough, so switch straight away
+            level = _least_detailed(pixel_errors, self.tolerance)
+        else:
+            coarser = _least_detailed(pixel_errors,
+                                      self.tolerance * (1. - self.hysteresis))
+            level = max(level, coarser)
+
+        self._count(polygon, level)
+        return level
+
+    def _count(self, polygon, level):
+        self._triangles += polygon.levels[level].buffers.index_count // 3
+        self._full_triangles += polygon.buffers.index_count // 3
+        self._levels[level] = self._levels.get(level, 0) + 1
+
+    def _reset(self):
+        self._triangles = 0
+        self._full_triangles = 0
+        self._levels = {}
+
+    def _frame_counts(self):
+        return {'triangles': self._triangles,
+                'full_triangles': self._full_triangles,
+                'levels': self._levels}
+
+
+def _least_detailed(pixel_errors, tolerance):
+    # The last level within the tolerance (the errors increase with the
+    # level, and the first level is always allowed)
+    within = np.flatnonzero(pixel_errors <= tolerance)
+    return int(within[-1]) if len(within) else 0
+
+
+_selector_stack = [None]
+
+
+def current():
+    """
+    The LODSelector that LODPolygons should use, or None.
+    """
+    return _selector_stack[-1]
+
+
+@contextmanager
+def using(selector):
+    _selector_stack.append(selector)
+    try:
+        yield selector
+    finally:
+        _selector_stack.pop()
@@ -0,0 +1,144 @@
+"""
+4x4 transformation matrices, calculated in numpy.
+
+Matrices are in the usual mathematical (row-major, column vector) layout, so
+a point p is transformed by matrix.dot([x, y, z, 1]). Use gl_matrix() to get
+the column-major float32 layout that glLoadMatrixf expects.
+
+All the functions accept stacks of vectors with shape (..., 3) and return
+stacks of matrices with shape (..., 4, 4).
+"""
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+IDENTITY = np.identity(4)
+IDENTITY.flags.writeable = False
+
+
+def transformation(position, orientation, size):
+    """
+    The matrix for scaling by size, then rotating by orientation (in
+    degrees, about the x axis, then y, then z) and then translating by
+    position.
+
+    This is the same transformation as calling, in order:
+        glTranslatef(*position)
+        glRotatef(orientation[0], 0, 0, 1)
+        glRotatef(orientation[1], 0, 1, 0)
+        glRotatef(orientation[2], 1, 0, 0)
+        glScalef(*size)
+
+    Any of the arguments can be None, to skip that transformation.
+    """
+    shapes = [np.shape(v)[:-1] for v in (position, orientation, size)
+              if v is not None]
+    stack_shape = shapes[0] if shapes else ()
+
+    matrices = np.zeros(stack_shape + (4, 4))
+    matrices[..., 3, 3] = 1.
+
+    if orientation is None:
+        linear = np.zeros(stack_shape + (3, 3))
+        linear[..., [0, 1, 2], [0, 1, 2]] = 1.
+    else:
+        linear = rotation(orientation)
+
+    if size is not None:
+        # Scaling first means scaling the columns of the rotation
+        linear = linear * np.asarray(size, dtype=float)[..., np.newaxis, :]
+
+    matrices[..., :3, :3] = linear
+    if position is not None:
+        matrices[..., :3, 3] = position
+
+    return matrices
+
+
+def rotation(orientation):
+    """
+    The 3x3 rotation matrix Rz . Ry . Rx for the given orientation (in
+    degrees), as applied by Transformable.
+    """
+    angles = np.radians(np.asarray(orientation, dtype=float))
+    cos = np.cos(angles)
+    sin = np.sin(angles)
+    cz, cy, cx = cos[..., 0], cos[..., 1], cos[..., 2]
+    sz, sy, sx = sin[..., 0], sin[..., 1], sin[..., 2]
+
+    matrices = np.empty(angles.shape[:-1] + (3, 3))
+    matrices[..., 0, 0] = cz * cy
+    matrices[..., 0, 1] = cz * sy * sx - sz * cx
+    matrices[..., 0, 2] = cz * sy * cx + sz * sx
+    matrices[..., 1, 0] = sz * cy
+    matrices[..., 1, 1] = sz * sy * sx + cz * cx
+    matrices[..., 1, 2] = sz * sy * cx - cz * sx
+    matrices[..., 2, 0] = -sy
+    matrices[..., 2, 1] = cy * sx
+    matrices[..., 2, 2] = cy * cx
+    return matrices
+
+
+def gl_matrix(matrix):
+    """
+    Convert the matrix to the contiguous, column-major float32 array
+    expected by glLoadMatrixf/glMultMatrixf.
+    """
+    return np.ascontiguousarray(np.swapaxes(matrix, -1, -2), dtype=np.float32)
+
+
+def normal_matrix(matrices):
+    """
+    The 3x3 matrix for transforming normals by the given matrices: the
+    cofactor matrix of their upper 3x3, which is the inverse transpose
+    scaled by the determinant. Unlike the inverse it exists even if a
+    matrix scales an axis to zero, and the scale doesn't matter as normals
+    are re-normalised anyway. The sign is kept positive so normals of
+    mirrored objects still point outwards.
+    """
+    a = matrices[..., :3, 0]
+    b = matrices[..., :3, 1]
+    c = matrices[..., :3, 2]
+    cofactors = np.stack((np.cross(b, c), np.cross(c, a), np.cross(a, b)),
+                         axis=-1)
+
+    determinants = np.einsum('...i,...i', a, cofactors[..., 0])
+    cofactors[determinants < 0] *= -1
+    return cofactors
+
+
+def transform_points(matrix, points):
+    """
+    Apply the matrix to an array of [x, y, z] points.
+    """
+    points = np.asarray(points, dtype=float)
+    return points.dot(matrix[:3, :3].T) + matrix[:3, 3]
+
+
+def transform_normals(matrix, normals):
+    """
+    Apply the matrix to an array of [nx, ny, nz] normals, keeping them
+    perpendicular to the transformed surface and of unit length.
+    """
+    normals = np.asarray(normals, dtype=float).dot(normal_matrix(matrix).T)
+    lengths = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+    lengths[lengths == 0] = 1.
+    return normals / lengths[:, np.newaxis]
+
+
+def perspective(field_of_view, aspect, near, far):
+    """
+    The projection matrix set up by gluPerspective.
+
+    :param field_of_view: the vertical field of view, in degrees.
+    :param aspect: the width of the viewport divided by its height.
+    """
+    f = 1. / np.tan(np.radians(field_of_view) / 2.)
+    projection = np.zeros((4, 4))
+    projection[0, 0] = f / aspect
+    projection[1, 1] = f
+    projection[2, 2] = (far + near) / (near - far)
+    projection[2, 3] = 2. * far * near / (near - far)
+    projection[3, 2] = -1.
+    return projection
@@ -0,0 +1,137 @@
+"""
+GL-free mesh preprocessing.
+
+Everything in here works on plain numpy arrays, so it can be tested and
+benchmarked without an OpenGL context.
+"""
+import numpy as np
+
+from core import vertex_cache
+
+__author__ = 'eatmuchpie'
+
+
+def compact(vertices, triangles_indices):
+    """
+    Remove the vertices that aren't used by any triangle, and remap the
+    triangle indices to point into the smaller vertex array.
+
+    The relative order of the remaining vertices is preserved.
+
+    :param vertices: numpy.ndarray([[x1,y1,z1], [x2,y2,z2], ...])
+    :param triangles_indices: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
+    :return: (vertices, triangles_indices) with unused vertices dropped
+    """
+    vertices = np.asarray(vertices, dtype=float).reshape(-1, 3)
+    triangles_indices = np.asarray(triangles_indices, dtype=np.intp)
+    triangles_indices = triangles_indices.reshape(-1, 3)
+
+    used_vertices = np.unique(triangles_indices)
+    remapped = np.searchsorted(used_vertices, triangles_indices)
+
+    return vertices[used_vertices], remapped
+
+
+def face_normals(vertices, triangles_indices):
+    """
+    Calculate the unit normal of every triangle, using the right-hand rule on
+    the winding order (a, b, c).
+
+    Degenerate triangles (with zero area) get a zero normal.
+
+    :return: numpy.ndarray with one [nx, ny, nz] row per triangle
+    """
+    a = vertices[triangles_indices[:, 0]]
+    b = vertices[triangles_indices[:, 1]]
+    c = vertices[triangles_indices[:, 2]]
+
+    normals = np.cross(b - a, c - a)
+    return _normalise_rows(normals)
+
+
+def vertex_normals(vertices, triangles_indices, normals_per_face=None):
+    """
+    Calculate the normal of every vertex as the (normalised) sum of the
+    normals of the triangles that use it.
+
+    :param normals_per_face: the result of face_normals(), if it's already
+        been calculated.
+    :return: numpy.ndarray with one [nx, ny, nz] row per vertex
+    """
+    if normals_per_face is None:
+        normals_per_face = face_normals(vertices, triangles_indices)
+
+    vertex_count = len(vertices)
+    corners = triangles_indices.ravel()
+    corner_normals = np.repeat(normals_per_face, 3, axis=0)
+
+    # bincount is a scatter-add, and is much faster than np.add.at
+    sums = np.empty((vertex_count, 3))
+    for axis in range(3):
+        sums[:, axis] = np.bincount(corners,
+                                    weights=corner_normals[:, axis],
+                                    minlength=vertex_count)
+
+    return _normalise_rows(sums)
+
+
+def strip_to_triangles(triangle_strip_indices):
+    """
+    Expand a triangle strip into a list of triangles, flipping every other
+    triangle so they all keep the same winding order.
+
+    :param triangle_strip_indices: [1, 2, 3, 4, ...]
+    :return: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
+    """
+    strip = np.asarray(triangle_strip_indices, dtype=np.intp)
+    if len(strip) < 3:
+        return np.zeros((0, 3), dtype=np.intp)
+
+    triangles = np.column_stack((strip[:-2], strip[1:-1], strip[2:]))
+    triangles[1::2] = triangles[1::2, ::-1]
+    return triangles
+
+
+def split_parts(triangles_indices, parts):
+    """
+    Give each part of a mesh its own copy of the vertices it shares with
+    other parts, so vertex normals aren't smoothed across the edges between
+    the parts.
+
+    :param triangles_indices: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
+    :param parts: the part number of each triangle
+    :return: (source, triangles_indices), where source is the index of the
+        original vertex that each new vertex copies
+    """
+    triangles_indices = np.asarray(triangles_indices, dtype=np.int64)
+    parts = np.asarray(parts, dtype=np.int64)
+    part_count = int(parts.max()) + 1 if parts.size else 1
+
+    keys = triangles_indices * part_count + parts[:, np.newaxis]
+    unique_keys, new_indices = np.unique(keys, return_inverse=True)
+    return (unique_keys // part_count).astype(np.intp), \
+        new_indices.reshape(-1, 3).astype(np.intp)
+
+
+def prepare(vertices, triangles_indices):
+    """
+    Compact the mesh and calculate its vertex normals, ready to be uploaded.
+    If vertex cache reordering is enabled (see core.vertex_cache), the mesh
+    is reordered too.
+
+    :return: (vertices, normals, triangles_indices)
+    """
+    vertices, triangles_indices = compact(vertices, triangles_indices)
+    normals = vertex_normals(vertices, triangles_indices)
+
+    cache_size = vertex_cache.active()
+    if cache_size is not None:
+        return vertex_cache.optimize(vertices, normals, triangles_indices,
+                                     cache_size)
+    return vertices, normals, triangles_indices
+
+
+def _normalise_rows(rows):
+    lengths = np.sqrt(np.einsum('ij,ij->i', rows, rows))
+    lengths[lengths == 0] = 1.
+    return rows / lengths[:, np.newaxis]
@@ -0,0 +1,119 @@
+"""
+Sharing of identical meshes between GLPolygons.
+
+GLPolygons made from the same vertices and triangles (e.g. the faces of
+every cube made by create_unit_cube()) are given the same MeshBuffers and
+gl_resources, as if they were clones, so each distinct mesh is only
+uploaded to GL once.
+"""
+import weakref
+
+__author__ = 'eatmuchpie'
+
+
+class SharedMesh(object):
+    """
+    One distinct mesh, and the polygons using it.
+    """
+
+    def __init__(self, key, buffers, shared=True):
+        self.key = key
+        self.buffers = buffers
+        # False if the buffers may be changed in place
+        self.shared = shared
+        self.gl_resources = {}
+        self._users = set()
+
+    @property
+    def users(self):
+        return len(self._users)
+
+
+class MeshRegistry(object):
+    """
+    Interns meshes by a hash of their content, counting the polygons that
+    use each one. Meshes are forgotten once no polygons use them.
+    """
+
+    def __init__(self):
+        self._meshes = {}
+        # Called with each SharedMesh once no polygons use it
+        self.on_release = None
+
+    def __len__(self):
+        return len(self._meshes)
+
+    def intern(self, polygon, buffers, shared=True):
+        """
+        Register the polygon as a user of the mesh with the same content as
+        buffers.
+
+        :param shared: if False, the buffers are registered on their own
+            rather than shared with an identical mesh (e.g. because they'll
+            be changed in place).
+        :return: the SharedMesh, whose buffers and gl_resources the polygon
+            should use.
+        """
+        if shared:
+            key = buffers.content_hash()
+        else:
+            # The entry (and so the buffers) lives until it's released, so
+            # the id isn't reused while it's in use
+            key = 'unshared-{0}'.format(id(buffers))
+        shared_mesh = self._meshes.get(key)
+        if shared_mesh is None:
+            shared_mesh = self._meshes[key] = SharedMesh(key, buffers,
+                                                         shared)
+        self.acquire(polygon, shared_mesh)
+        return shared_mesh
+
+    def acquire(self, polygon, shared_mesh):
+        """
+        Register the polygon as another user of the shared mesh (e.g. as a
+        clone of one of its users).
+        """
+        def release(ref, key=shared_mesh.key):
+            self._release(key, ref)
+        shared_mesh._users.add(weakref.ref(polygon, release))
+
+    def get(self, key):
+        return self._meshes.get(key)
+
+    def meshes(self):
+        """
+        :return: a list of every SharedMesh in use.
+        """
+        return list(self._meshes.values())
+
+    def report(self):
+        """
+        :return: dict of the number of distinct meshes ('unique'), the number
+            of polygons using them ('total'), the bytes of mesh data held
+            ('unique_bytes'), the bytes that would be held without sharing
+            ('total_bytes') and the difference ('saved_bytes').
+        """
+        unique_bytes = total_bytes = total = 0
+        for shared_mesh in self._meshes.values():
+            total += shared_mesh.users
+            unique_bytes += shared_mesh.buffers.nbytes
+            total_bytes += shared_mesh.buffers.nbytes * shared_mesh.users
+        return {
+            'unique': len(self._meshes),
+            'total': total,
+            'unique_bytes': unique_bytes,
+            'total_bytes': total_bytes,
+            'saved_bytes': total_bytes - unique_bytes,
+        }
+
+    def _release(self, key, ref):
+        shared_mesh = self._meshes.get(key)
+        if shared_mesh is None:
+            return
+        shared_mesh._users.discard(ref)
+        if not shared_mesh._users:
+            del self._meshes[key]
+            if self.on_release is not None:
+                self.on_release(shared_mesh)
+
+
+mesh_registry = MeshRegistry()
@@ -1,5 +1,6 @@
 import abc
 
+from core import matrix
 from core.transformable import Transformable
 
 
@@ -30,6 +31,27 @@ class Polygon(Transformable):
         """
         pass
 
+    @property
+    def local_bounds(self):
+        """
+        The bounding box of this polygon in its own space (i.e. before its
+        transformations are applied), or None if it's unknown, in which case
+        the polygon is never culled.
+        """
+        return None
+
+    def walk(self, parent_matrix=matrix.IDENTITY, path=()):
+        """
+        Iterate over this polygon and every polygon inside it, depth first.
+
+        :param parent_matrix: the matrix to multiply the local matrices into.
+        :param path: the path of this polygon.
+        :return: an iterator of (path, polygon, matrix) tuples, where path is
+            the tuple of keys leading to the polygon and matrix transforms
+            from the polygon's space to parent_matrix's space.
+        """
+        yield path, self, parent_matrix.dot(self.local_matrix)
+
     def update(self, dt):
         """
         Called before this object is drawn, with the amount of time that has
@@ -0,0 +1,186 @@
+"""
+Timing each node of a scene as it's updated and drawn.
+
+Set scene.profiler to a Profiler and the Scene makes it current (see
+using()) while it updates and draws. CompositePolygons then time each of
+the polygons inside them, which are identified by their path: the keys of
+the _polygons dictionaries leading to them from the scene, joined by '/'
+(e.g. 'aperture/hole/cylinder'). The scene itself has the path ''.
+
+The last few frames are kept, and can be summarized with
+Profiler.report() or saved with Profiler.save_chrome_trace() for viewing in
+chrome://tracing.
+
+Without a current Profiler, each CompositePolygon only checks current()
+once per update and draw, so profiling costs next to nothing when it's
+off.
+"""
+from collections import deque
+from contextlib import contextmanager
+import json
+from timeit import default_timer
+
+__author__ = 'eatmuchpie'
+
+
+class Profiler(object):
+    """
+    Records how long each node takes to update and draw, over the last
+    window frames.
+
+    self.frames holds the finished frames, oldest first. Each is a list of
+    (path, phase, start, seconds) tuples, one per node timed, where path is
+    a tuple of keys and phase is 'update' or 'draw'. Times are in seconds,
+    and include the time taken by the node's descendants.
+    """
+
+    def __init__(self, window=120):
+        """
+        :param window: the number of frames to keep.
+        """
+        self.frames = deque(maxlen=window)
+        self._events = []
+        # The keys of the nodes being timed, and when they started
+        self._path = []
+        self._starts = []
+
+    def enter(self, key, phase):
+        """
+        Start timing a node inside the one being timed.
+        """
+        self._path.append(key)
+        self._starts.append((phase, default_timer()))
+
+    def leave(self):
+        """
+        Stop timing the node last entered.
+        """
+        end = default_timer()
+        phase, start = self._starts.pop()
+        # The scene's key is left out of the path
+        self._events.append((tuple(self._path[1:]), phase, start, end - start))
+        self._path.pop()
+
+    def each(self, polygons, phase, function):
+        """
+        Call function(polygon) for each polygon in a _polygons dictionary,
+        timing each one.
+        """
+        for key, polygon in polygons.iteritems():
+            self.enter(key, phase)
+            try:
+                function(polygon)
+            finally:
+                self.leave()
+
+    def end_frame(self):
+        """
+        Finish the current frame, dropping the oldest frame if there are
+        more than the window.
+        """
+        self.frames.append(self._events)
+        self._events = []
+
+    def summary(self):
+        """
+        The time taken by each node, per frame, averaged over self.frames.
+
+        :return: {(path, phase): (seconds, self seconds, calls)}, where
+            path is a string and self seconds excludes the time taken by the
+            node's descendants.
+        """
+        totals = {}
+        for events in self.frames:
+            for path, phase, start, seconds in events:
+                total = totals.setdefault((path, phase), [0., 0., 0])
+                total[0] += seconds
+                total[1] += seconds
+                total[2] += 1
+                if path:
+                    # Taken from the parent's self time
+                    parent = totals.setdefault((path[:-1], phase), [0., 0., 0])
+                    parent[1] -= seconds
+
+        frames = float(max(len(self.frames), 1))
+        return dict(((_path_name(path), phase),
+                     (seconds / frames, self_seconds / frames, calls / frames))
+                    for (path, phase), (seconds, self_seconds, calls)
+                    in totals.iteritems())
+
+    def report(self, count=10, sort_by_self=True):
+        """
+        A table of the nodes that took longest.
+
+        :param count: the number of nodes to list.
+        :param sort_by_self: if True, the nodes are sorted by their own time,
+            else by the time including their descendants.
+        """
+        column = 1 if sort_by_self else 0
+        rows = sorted(self.summary().iteritems(),
+                      key=lambda row: row[1][column], reverse=True)
+        lines = ['Per frame, over {0} frames:'.format(len(self.frames)),
+                 '{0:>10} {1:>10} {2:>8}  {3:6} {4}'.format(
+                     'total ms', 'self ms', 'calls', 'phase', 'path')]
+        for (path, phase), (seconds, self_seconds, calls) in rows[:count]:
+            lines.append('{0:10.3f} {1:10.3f} {2:8.1f}  {3:6} {4}'.format(
+                seconds * 1000, self_seconds * 1000, calls, phase,
+                path or '(scene)'))
+        return '\n'.join(lines)
+
+    def chrome_trace(self):
+        """
+        The frames as a Chrome trace, with a complete event for each time a
+        node was updated or drawn.
+
+        :return: the trace, as a dictionary to save as JSON.
+        """
+        events = []
+        for events_of_frame in self.frames:
+            for path, phase, start, seconds in events_of_frame:
+                name = _path_name(path)
+                events.append({
+                    'name': str(path[-1]) if path else 'Scene.' + phase,
+                    'cat': phase,
+                    'ph': 'X',
+                    'ts': start * 1e6,
+                    'dur': seconds * 1e6,
+                    'pid': 0,
+                    'tid': 0,
+                    'args': {'path': name}})
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def save_chrome_trace(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.chrome_trace(), trace_file)
+
+
+def _path_name(path):
+    return '/'.join(str(key) for key in path)
+
+
+_profiler_stack = [None]
+
+
+def current():
+    """
+    The Profiler that nodes should be timed with, or None.
+    """
+    return _profiler_stack[-1]
+
+
+@contextmanager
+def using(profiler, phase):
+    """
+    Make the profiler current for the duration of the with-block, which is
+    timed as the scene's update or draw (the phase). The profiler can be
+    None, to not profile.
+    """
+    _profiler_stack.append(profiler)
+    if profiler is not None:
+        profiler.enter('', phase)
+    try:
+        yield profiler
+    finally:
+        if profiler is not None:
+            profiler.leave()
+        _profiler_stack.pop()
@@ -0,0 +1,70 @@
+__author__ = 'eatmuchpie'
+
+
+class RedrawTracker(object):
+    """
+    Decides whether a Scene drawn on demand needs to be redrawn.
+
+    A redraw is needed after the scene or any polygon inside it has changed
+    (see CompositePolygon.subscribe_contents), while there are animations
+    running, or after self.invalidate() has been called. Changes to objects
+    outside the scene are ignored, as are direct modifications of the
+    scene's _polygons dictionaries (call self.invalidate() after those).
+    Each redraw is repeated once per buffer, so every buffer of a
+    double-buffered window ends up holding the latest frame and skipped
+    frames can be flipped safely.
+    """
+
+    def __init__(self, scene, buffers=2):
+        """
+        :param scene: the CompositePolygon to watch for changes.
+        :param buffers: the number of buffers the scene is drawn into.
+        """
+        self.scene = scene
+        self.buffers = buffers
+        self.frames_rendered = 0
+        self.frames_skipped = 0
+
+        self._frames_to_draw = buffers
+        self._changed = False
+        self._subscriptions = [
+            scene.subscribe(self._scene_changed, weak=True),
+            scene.subscribe_contents(self._scene_changed, weak=True)]
+
+    def _scene_changed(self, object=None, reason=None):
+        self._changed = True
+
+    def invalidate(self):
+        """
+        Force the next frame(s) to be drawn.
+        """
+        self._frames_to_draw = self.buffers
+
+    def poll(self, animating=False):
+        """
+        Check for changes since the last poll.
+
+        :param animating: whether anything is being animated.
+        :return: True if a frame needs to be drawn.
+        """
+        # Subscribes the scene to any polygons added to it since the last
+        # poll
+        self.scene.local_bounds
+        if animating or self._changed:
+            self._changed = False
+            self.invalidate()
+        return self._frames_to_draw > 0
+
+    def should_draw(self, animating=False):
+        """
+        Poll for changes, and count the frame as rendered or skipped.
+
+        :return: True if the frame should be drawn.
+        """
+        if self.poll(animating):
+            self._frames_to_draw -= 1
+            self.frames_rendered += 1
+            return True
+        else:
+            self.frames_skipped += 1
+            return False
@@ -0,0 +1,99 @@
+"""
+Lifetime management of the GL objects that render backends create for
+meshes.
+
+Every GL object a backend uploads is tracked here. Once no GLPolygon uses a
+mesh any more (see core.mesh_registry), its GL objects are queued for
+deletion. They're only deleted by collect(), which the Scene calls on the
+GL thread while its context is current, as polygons can be garbage
+collected at any time.
+"""
+from collections import deque
+
+from core.mesh_registry import mesh_registry
+
+__author__ = 'eatmuchpie'
+
+
+class ResourceManager(object):
+    """
+    Tracks the live GL objects of every backend, and deletes the released
+    ones.
+    """
+
+    def __init__(self):
+        # (backend, resource) -> approximate size in bytes
+        self._live = {}
+        # (backend, resource) pairs waiting to be deleted. Appending to a
+        # deque is atomic, so resources can be released from any thread.
+        self._pending = deque()
+        self.created = 0
+        self.deleted = 0
+
+    def track(self, backend, resource, nbytes):
+        """
+        Record a GL object that backend created, which holds about nbytes
+        of mesh data.
+        """
+        self._live[(backend, resource)] = nbytes
+        self.created += 1
+
+    def release(self, gl_resources):
+        """
+        Queue every GL object in a gl_resources dictionary (backend ->
+        resource) for deletion.
+        """
+        for backend, resource in list(gl_resources.items()):
+            self._pending.append((backend, resource))
+        gl_resources.clear()
+
+    def collect(self):
+        """
+        Delete the released GL objects. Must be called with the GL context
+        current.
+
+        :return: the number of GL objects deleted.
+        """
+        collected = 0
+        while self._pending:
+            backend, resource = self._pending.popleft()
+            backend.delete(resource)
+            self._live.pop((backend, resource), None)
+            collected += 1
+        self.deleted += collected
+        return collected
+
+    def live_counts(self):
+        """
+        :return: dict of backend class name to the number of live GL objects
+            created by backends of that class.
+        """
+        counts = {}
+        for backend, resource in self._live:
+            name = type(backend).__name__
+            counts[name] = counts.get(name, 0) + 1
+        return counts
+
+    def report(self):
+        """
+        :return: dict of the number of live GL objects ('live'), their
+            approximate size ('live_bytes'), the number waiting to be deleted
+            ('pending') and the number ever created and deleted.
+        """
+        return {
+            'live': len(self._live),
+            'live_bytes': sum(self._live.values()),
+            'pending': len(self._pending),
+            'created': self.created,
+            'deleted': self.deleted,
+        }
+
+
+resource_manager = ResourceManager()
+
+
+def _release_mesh(shared_mesh):
+    resource_manager.release(shared_mesh.gl_resources)
+
+
+mesh_registry.on_release = _release_mesh
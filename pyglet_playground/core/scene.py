@@ -1,18 +1,88 @@
+import os
+import tempfile
 import pyglet
 from pyglet.gl import *
 import numpy as np
 from aperture import Aperture
 
+from core import backends, bounds, bvh, culling, disk_cache, gl_recording, \
+    lighting, lod, matrix, profiling
+from core.resources import resource_manager
 from core.composite_polygon import CompositePolygon
-from core.utility import vec
+from core.redraw import RedrawTracker
+from core.transform_pool import TransformPool
+from core.utility import vec, change_queue
 
 
 __author__ = 'eatmuchpie'
 
 
 class Scene(CompositePolygon):
-    def __init__(self, polygons=[]):
+    # The perspective projection set up in on_resize
+    field_of_view = 60.
+    near = .1
+    far = 1000.
+
+    def __init__(self, polygons=[], backend=None, batch_changes=False,
+                 on_demand=False, idle_interval=0.25, cull=True,
+                 window=True):
+        """
+        :param backend: the backends.RenderBackend used to draw the scene
+            (display lists by default). If its gl is a
+            gl_recording.CommandRecorder, each frame's commands (with any
+            made since the last frame, e.g. by self.gl_setup()) are recorded
+            and counted in its last_commands and last_frame once the frame
+            has been drawn.
+        :param batch_changes: if True, the callbacks made while the scene
+            is updated (by its animations and polygons) are recorded by
+            utility.change_queue and dispatched once, at the end of
+            self.update(), before the scene is drawn.
+        :param on_demand: if True, the scene is only updated and redrawn
+            after something in it has changed or while there are animations
+            (see self.add_animation). When nothing is happening, the scene
+            checks for changes every idle_interval seconds instead of every
+            frame. self.redraw counts the frames rendered and skipped.
+        :param cull: if True, polygons outside the view frustum aren't drawn.
+            self.culler.last_frame counts the polygons culled.
+        :param window: if False, no window is opened and nothing is
+            scheduled, for drawing offscreen with a backend that doesn't need
+            GL (e.g. software.SoftwareBackend, or one that records GL
+            commands; call self.gl_setup() to record the setup too). Call
+            self.on_resize() to set the size of the image, then self.draw()
+            to draw each frame.
+        """
         super(Scene, self).__init__()
+        if backend is None:
+            backend = backends.DisplayListBackend()
+        self.backend = backend
+
+        self.batch_changes = batch_changes
+
+        self.animations = []
+        self.redraw = RedrawTracker(self) if on_demand else None
+        self.idle_interval = idle_interval
+        self._idle = False
+
+        # The frustum is set in on_resize
+        self.culler = culling.Culler() if cull else None
+
+        # Chooses the detail of LODPolygons. self.lod.last_frame counts the
+        # triangles they drew.
+        self.lod = lod.LODSelector(self.field_of_view)
+
+        # For picking; built on first use
+        self.bvh = None
+
+        # Set to a profiling.Profiler to time each polygon as it's updated
+        # and drawn
+        self.profiler = None
+
+        # (width, height) in pixels, set in on_resize
+        self.viewport = None
+
+        self.window = None
+        if not window:
+            return
 
         try:
             # Try and create a window with multisampling (antialiasing)
@@ -27,75 +97,163 @@ class Scene(CompositePolygon):
         pyglet.clock.schedule(self.update)
         self.gl_setup()
 
+    def add_animation(self, animation):
+        """
+        Call animation(dt) before every frame, until it is removed with
+        self.remove_animation().
+        """
+        self.animations.append(animation)
+
+    def remove_animation(self, animation):
+        self.animations.remove(animation)
+
+    def update(self, dt):
+        if self.redraw is not None:
+            needs_redraw = self.redraw.poll(bool(self.animations))
+            self._set_idle(not needs_redraw)
+            if not needs_redraw:
+                return
+
+        if self.batch_changes:
+            with change_queue.batch():
+                self._update(dt)
+        else:
+            self._update(dt)
+
+    def _update(self, dt):
+        with profiling.using(self.profiler, 'update'):
+            for animation in list(self.animations):
+                animation(dt)
+            super(Scene, self).update(dt)
+
+    def _set_idle(self, idle):
+        # Throttle the clock whilst there's nothing to draw
+        if idle == self._idle:
+            return
+        self._idle = idle
+        pyglet.clock.unschedule(self.update)
+        if idle:
+            pyglet.clock.schedule_interval(self.update, self.idle_interval)
+        else:
+            pyglet.clock.schedule(self.update)
+
     def on_resize(self, width, height):
         # Override the default on_resize handler to create a 3D projection
-        glViewport(0, 0, width, height)
-        glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
-        gluPerspective(60., width / float(height), .1, 1000.)
-        glMatrixMode(GL_MODELVIEW)
+        if self.redraw is not None:
+            self.redraw.invalidate()
+        self.viewport = (width, height)
+        self.backend.set_viewport(width, height, self.field_of_view,
+                                  self.near, self.far)
+        aspect = width / float(height)
+
+        self.lod.viewport_height = height
+
+        if self.culler is not None:
+            # The modelview matrix is the identity, so world space is eye
+            # space
+            self.culler.frustum = bounds.Frustum.from_matrix(matrix.perspective(
+                self.field_of_view, aspect, self.near, self.far))
         return pyglet.event.EVENT_HANDLED
 
     def draw(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        glLoadIdentity()
-        super(Scene, self).draw()
+        # Free the GL objects of meshes that are no longer used, now that
+        # the context is current
+        resource_manager.collect()
+
+        if self.redraw is not None and \
+                not self.redraw.should_draw(bool(self.animations)):
+            return
+
+        self.backend.clear()
+        if self.culler is not None:
+            self.culler.begin_frame()
+        self.lod.begin_frame()
+        with backends.using(self.backend), culling.using(self.culler), \
+                lod.using(self.lod), profiling.using(self.profiler, 'draw'):
+            super(Scene, self).draw()
+            self.backend.flush()
+        if isinstance(self.backend.gl, gl_recording.CommandRecorder):
+            # So last_frame describes the frame just drawn
+            self.backend.gl.begin_frame()
+        if self.profiler is not None:
+            self.profiler.end_frame()
+
+    def pick(self, x, y):
+        """
+        Find the polygon under a pixel of the window.
+
+        The scene's bounding volume hierarchy is built the first time this
+        is called; call self.bvh.rebuild() after adding or removing polygons.
+
+        :return: a bvh.Hit, or None if there's nothing under the pixel.
+        """
+        if self.bvh is None:
+            self.bvh = bvh.SceneBVH(self)
+        width, height = self.viewport
+        origin, direction = bvh.screen_ray(x, y, width, height,
+                                           self.field_of_view)
+        return self.bvh.pick(origin, direction)
 
     def gl_setup(self):
-        # One-time GL setup
-        glClearColor(1, 1, 1, 1)
-        glColor3f(1, 0, 0)
-        glEnable(GL_DEPTH_TEST)
-        glEnable(GL_CULL_FACE)
-        glEnable(GL_NORMALIZE)
+        # One-time GL setup, through the backend so it can be recorded
+        gl = self.backend.gl
+        gl.glClearColor(*lighting.CLEAR_COLOR)
+        gl.glColor3f(1, 0, 0)
+        gl.glEnable(GL_DEPTH_TEST)
+        gl.glEnable(GL_CULL_FACE)
+        gl.glEnable(GL_NORMALIZE)
 
         # Uncomment this line for a wireframe view
-        # glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+        # gl.glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
 
         # Simple light setup.  On Windows GL_LIGHT0 is enabled by default,
         # but this is not the case on Linux or Mac, so remember to always
         # include it.
-        glEnable(GL_LIGHTING)
-        glEnable(GL_LIGHT0)
-        glEnable(GL_LIGHT1)
-
-        # Define a simple function to create ctypes arrays of floats:
+        gl.glEnable(GL_LIGHTING)
+        gl.glEnable(GL_LIGHT0)
+        gl.glEnable(GL_LIGHT1)
 
-        glLightfv(GL_LIGHT0, GL_POSITION, vec(.5, .5, 1, 0))
-        glLightfv(GL_LIGHT0, GL_SPECULAR, vec(.5, .5, 1, 1))
-        glLightfv(GL_LIGHT0, GL_DIFFUSE, vec(1, 1, 1, 1))
-        glLightfv(GL_LIGHT1, GL_POSITION, vec(1, 0, .5, 0))
-        glLightfv(GL_LIGHT1, GL_DIFFUSE, vec(.5, .5, .5, 1))
-        glLightfv(GL_LIGHT1, GL_SPECULAR, vec(1, 1, 1, 1))
+        # The lights and material are defined in core.lighting, so the
+        # software renderer can match them
+        for gl_light, light in zip((GL_LIGHT0, GL_LIGHT1), lighting.LIGHTS):
+            gl.glLightfv(gl_light, GL_POSITION, vec(*light.position))
+            gl.glLightfv(gl_light, GL_SPECULAR, vec(*light.specular))
+            gl.glLightfv(gl_light, GL_DIFFUSE, vec(*light.diffuse))
 
-        glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE, vec(0.5, 0, 0.3, 1))
-        glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, vec(1, 1, 1, 1))
-        glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, 50)
+        gl.glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE,
+                        vec(*lighting.AMBIENT_AND_DIFFUSE))
+        gl.glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR,
+                        vec(*lighting.SPECULAR))
+        gl.glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, lighting.SHININESS)
 
     def exec_(self):
         pyglet.app.run()
 
 
 if __name__ == "__main__":
-    def slowly_rotate(cls):
-        old_update = cls.update
+    def slowly_rotate(pool):
+        rates = np.array([20, 50, 90])
+
+        def update(dt):
+            # One vectorized update for every object in the pool
+            with pool.bulk_update():
+                pool.orientations += rates * dt
 
-        def update(obj, dt):
-            if old_update is not None:
-                old_update(obj, dt)
-            obj.orientation[:] += np.array([20, 50, 90]) * dt
+        return update
 
-        cls.update = update
 
+    # Keep the prepared meshes between runs
+    disk_cache.enable(os.path.join(tempfile.gettempdir(), 'pyglet_playground'))
 
     # cube = Cube()
     # cube.position[2] = -5.
 
-    # torus = Torus(1, 0.3, 50, 30)
+    # torus = generators.create('torus', 1, 0.3, 50, 30)
     # torus.position[2] = -4.
 
     aperture = Aperture()
-    slowly_rotate(Aperture)
+    pool = TransformPool()
+    pool.add(aperture)
 
     aperture.position[2] = -10
     aperture.size[:] = [2., 2., 2.]
@@ -105,4 +263,5 @@ if __name__ == "__main__":
 
     scene = Scene()
     scene._polygons = {'aperture': aperture}
+    scene.add_animation(slowly_rotate(pool))
     scene.exec_()
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+GLSL programs, and a helper to compile them.
+"""
+from ctypes import byref, c_char, c_char_p, cast, create_string_buffer, \
+    pointer, POINTER
+from pyglet.gl import GLint, GL_VERTEX_SHADER, GL_FRAGMENT_SHADER, \
+    GL_COMPILE_STATUS, GL_LINK_STATUS, GL_INFO_LOG_LENGTH
+
+__author__ = 'eatmuchpie'
+
+
+class ShaderError(Exception):
+    pass
+
+
+# Draws instances of a mesh, with a per-instance model matrix and normal
+# matrix. Lighting reproduces the fixed function pipeline for the
+# directional lights set up in Scene.gl_setup.
+INSTANCED_VERTEX_SHADER = """
+#version 120
+
+attribute vec4 model_0;
+attribute vec4 model_1;
+attribute vec4 model_2;
+attribute vec4 model_3;
+attribute vec3 normal_0;
+attribute vec3 normal_1;
+attribute vec3 normal_2;
+
+varying vec4 colour;
+
+void main() {
+    mat4 model = mat4(model_0, model_1, model_2, model_3);
+    mat3 normal_matrix = mat3(normal_0, normal_1, normal_2);
+
+    vec4 position = gl_ModelViewMatrix * model * gl_Vertex;
+    vec3 normal = normalize(gl_NormalMatrix * normal_matrix * gl_Normal);
+    gl_Position = gl_ProjectionMatrix * position;
+
+    colour = gl_FrontLightModelProduct.sceneColor;
+    for (int i = 0; i < 2; i++) {
+        vec3 light = normalize(gl_LightSource[i].position.xyz);
+        float diffuse = max(dot(normal, light), 0.0);
+        colour += gl_FrontLightProduct[i].ambient;
+        colour += gl_FrontLightProduct[i].diffuse * diffuse;
+        if (diffuse > 0.0) {
+            vec3 half_vector = normalize(light + vec3(0.0, 0.0, 1.0));
+            float specular = pow(max(dot(normal, half_vector), 0.0),
+                                 gl_FrontMaterial.shininess);
+            colour += gl_FrontLightProduct[i].specular * specular;
+        }
+    }
+}
+"""
+
+INSTANCED_FRAGMENT_SHADER = """
+#version 120
+
+varying vec4 colour;
+
+void main() {
+    gl_FragColor = colour;
+}
+"""
+
+# Generic attribute locations for the instanced program. Location 0 is left
+# alone as some drivers alias it with gl_Vertex.
+INSTANCED_ATTRIBUTES = {
+    'model_0': 1,
+    'model_1': 2,
+    'model_2': 3,
+    'model_3': 4,
+    'normal_0': 5,
+    'normal_1': 6,
+    'normal_2': 7,
+}
+
+
+def compile_program(gl, vertex_source, fragment_source, attribute_locations):
+    """
+    Compile and link a GLSL program.
+
+    :param gl: the namespace to call GL functions on
+    :param attribute_locations: dict of attribute name to location
+    :return: the program id
+    :raises ShaderError: if compiling or linking fails
+    """
+    program = gl.glCreateProgram()
+    for shader_type, source in (GL_VERTEX_SHADER, vertex_source), \
+                               (GL_FRAGMENT_SHADER, fragment_source):
+        shader = _compile_shader(gl, shader_type, source)
+        gl.glAttachShader(program, shader)
+        # Only flagged for deletion, as it's attached to the program
+        gl.glDeleteShader(shader)
+
+    for name, location in attribute_locations.items():
+        gl.glBindAttribLocation(program, location, c_char_p(name.encode()))
+
+    gl.glLinkProgram(program)
+    _check(gl, program, gl.glGetProgramiv, gl.glGetProgramInfoLog,
+           GL_LINK_STATUS)
+    return program
+
+
+def _compile_shader(gl, shader_type, source):
+    shader = gl.glCreateShader(shader_type)
+    source = c_char_p(source.encode())
+    gl.glShaderSource(shader, 1, cast(pointer(source), POINTER(POINTER(c_char))),
+                      None)
+    gl.glCompileShader(shader)
+    _check(gl, shader, gl.glGetShaderiv, gl.glGetShaderInfoLog,
+           GL_COMPILE_STATUS)
+    return shader
+
+
+def _check(gl, handle, get_iv, get_info_log, status_enum):
+    status = GLint()
+    get_iv(handle, status_enum, byref(status))
+    if status.value:
+        return
+
+    length = GLint()
+    get_iv(handle, GL_INFO_LOG_LENGTH, byref(length))
+    log = create_string_buffer(max(length.value, 1))
+    get_info_log(handle, length, None, log)
+    raise ShaderError(log.value)
@@ -0,0 +1,273 @@
+"""
+A render backend that draws into numpy arrays, without GL or a display.
+
+SoftwareBackend rasterizes each mesh as it's drawn: its vertices are lit
+(with the lights in core.lighting), projected and turned into fragments,
+one for each pixel centre inside each triangle, using edge functions on
+whole arrays of fragments at once. Fragments pass a depth test against the
+framebuffer's depth array, as with GL_DEPTH_TEST and GL_CULL_FACE.
+
+To draw a Scene offscreen:
+
+    backend = software.SoftwareBackend()
+    scene = Scene(backend=backend, window=False)
+    scene.on_resize(320, 240)
+    scene.draw()
+    backend.framebuffer.save('frame.png')
+
+This works without a display, as long as this module is imported before
+anything else imports pyglet.gl (see core.headless).
+
+Triangles that cross the near plane aren't clipped, and are skipped
+instead.
+"""
+import io
+import struct
+import zlib
+import numpy as np
+
+from core import headless
+from core import lighting, matrix
+from core.backends import RenderBackend
+
+__author__ = 'eatmuchpie'
+
+
+# The most fragments made at once, to bound the memory used by big
+# triangles
+MAX_FRAGMENTS = 1 << 20
+
+
+class Framebuffer(object):
+    """
+    The colour and depth arrays drawn into, with row 0 at the top.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        # RGB, between 0 and 1
+        self.color = np.empty((height, width, 3), dtype=np.float32)
+        # Window depths, between 0 (near) and 1 (far)
+        self.depth = np.empty((height, width), dtype=np.float32)
+        self.clear()
+
+    def clear(self, color=lighting.CLEAR_COLOR):
+        self.color[:] = color[:3]
+        self.depth[:] = 1.
+
+    def image(self):
+        """
+        :return: the colours as a (height, width, 3) array of uint8s.
+        """
+        return np.round(self.color * 255).astype(np.uint8)
+
+    def save(self, path):
+        """
+        Save the colours as a PNG image, or (if path ends with .npy) the
+        colour and depth arrays as one (height, width, 4) float32 array.
+        """
+        with open(path, 'wb') as frame_file:
+            frame_file.write(self.encode(path))
+
+    def encode(self, path):
+        """
+        The contents of the file self.save(path) would write.
+        """
+        if path.endswith('.npy'):
+            data = io.BytesIO()
+            np.save(data, np.dstack((self.color, self.depth)))
+            return data.getvalue()
+        return encode_png(self.image())
+
+
+class SoftwareBackend(RenderBackend):
+    """
+    Rasterizes GLPolygons into self.framebuffer with numpy.
+
+    self.triangles and self.fragments count the triangles rasterized (after
+    back face culling) and the fragments tested since the last clear().
+    """
+
+    def __init__(self, width=1, height=1, field_of_view=60., near=.1,
+                 far=1000.):
+        super(SoftwareBackend, self).__init__(gl=None)
+        self.triangles = 0
+        self.fragments = 0
+        # The world matrix of the meshes drawn by draw_resource(), like GL's
+        # modelview matrix
+        self.world_matrix = matrix.IDENTITY
+        self.set_viewport(width, height, field_of_view, near, far)
+
+    def set_viewport(self, width, height, field_of_view, near, far):
+        self.framebuffer = Framebuffer(width, height)
+        self.projection = matrix.perspective(field_of_view,
+                                             width / float(height), near, far)
+
+    def clear(self):
+        self.framebuffer.clear()
+        self.triangles = 0
+        self.fragments = 0
+
+    def draw(self, polygon):
+        # Meshes are drawn straight from their buffers, so nothing is
+        # uploaded
+        self.world_matrix = polygon.world_matrix
+        self.draw_resource(polygon.buffers)
+
+    def draw_resource(self, buffers):
+        triangles = np.asarray(buffers.triangles_indices, dtype=np.intp)
+        if not len(triangles):
+            return
+
+        # The modelview matrix is the identity, so world space is eye space
+        world_matrix = self.world_matrix
+        eye = matrix.transform_points(world_matrix, buffers.positions)
+        colors = lighting.shade(matrix.transform_normals(world_matrix,
+                                                         buffers.normals))
+
+        clip = np.column_stack((eye, np.ones(len(eye)))).dot(self.projection.T)
+        w = clip[:, 3]
+        in_front = (w > 0) & (clip[:, 2] >= -w)
+        triangles = triangles[in_front[triangles].all(axis=1)]
+
+        w = np.where(in_front, w, 1.)
+        framebuffer = self.framebuffer
+        screen = np.empty((len(clip), 3))
+        screen[:, 0] = (clip[:, 0] / w + 1.) * (framebuffer.width / 2.)
+        screen[:, 1] = (1. - clip[:, 1] / w) * (framebuffer.height / 2.)
+        screen[:, 2] = (clip[:, 2] / w + 1.) / 2.
+
+        self._rasterize(screen, 1. / w, colors, triangles)
+
+    def _rasterize(self, screen, inverse_w, colors, triangles):
+        a, b, c = (screen[triangles[:, i], :2] for i in range(3))
+
+        # Twice the signed area. The screen's y axis points down, so
+        # triangles that are anticlockwise on screen (front facing, as in GL)
+        # have negative areas.
+        areas = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - \
+                (c[:, 0] - a[:, 0]) * (b[:, 1] - a[:, 1])
+        front = areas < 0
+        triangles, a, b, c, areas = (triangles[front], a[front], b[front],
+                                     c[front], areas[front])
+
+        # The pixels whose centres are in each triangle's bounding box
+        framebuffer = self.framebuffer
+        corners = np.stack((a, b, c))
+        low = np.maximum(np.ceil(corners.min(axis=0) - 0.5), 0).astype(np.intp)
+        high = np.minimum(np.floor(corners.max(axis=0) - 0.5),
+                          [framebuffer.width - 1, framebuffer.height - 1])
+        spans = np.maximum(high.astype(np.intp) - low + 1, 0)
+        counts = spans[:, 0] * spans[:, 1]
+        has_pixels = counts > 0
+        triangles, a, b, c, areas, low, spans, counts = (
+            array[has_pixels] for array in
+            (triangles, a, b, c, areas, low, spans, counts))
+        self.triangles += len(triangles)
+        if not len(triangles):
+            return
+
+        # Each barycentric coordinate is an edge function, x * dx + y * dy +
+        # constant, divided by the area
+        edges = []
+        for start, end in (b, c), (c, a), (a, b):
+            dx = (start[:, 1] - end[:, 1]) / areas
+            dy = (end[:, 0] - start[:, 0]) / areas
+            constant = (start[:, 0] * end[:, 1] - end[:, 0] * start[:, 1]) / areas
+            edges.append((dx, dy, constant))
+
+        # Split into chunks of about MAX_FRAGMENTS fragments
+        ends = np.cumsum(counts)
+        first = 0
+        while first < len(triangles):
+            last = max(first + 1, np.searchsorted(
+                ends, ends[first] - counts[first] + MAX_FRAGMENTS, 'right'))
+            chunk = slice(first, last)
+            self._fragments(screen, inverse_w, colors, triangles[chunk],
+                            [[term[chunk] for term in edge] for edge in edges],
+                            low[chunk], spans[chunk], counts[chunk])
+            first = last
+
+    def _fragments(self, screen, inverse_w, colors, triangles, edges, low,
+                   spans, counts):
+        framebuffer = self.framebuffer
+        owners = np.repeat(np.arange(len(triangles)), counts)
+        starts = np.cumsum(counts) - counts
+        offsets = np.arange(len(owners)) - starts[owners]
+        x = low[owners, 0] + offsets % spans[owners, 0]
+        y = low[owners, 1] + offsets // spans[owners, 0]
+        self.fragments += len(owners)
+
+        # Barycentric coordinates of the pixel centres
+        centre_x, centre_y = x + 0.5, y + 0.5
+        weights = np.empty((len(owners), 3))
+        for i, (dx, dy, constant) in enumerate(edges):
+            weights[:, i] = dx[owners] * centre_x + dy[owners] * centre_y + \
+                constant[owners]
+        inside = (weights >= 0).all(axis=1)
+        owners, x, y, weights = owners[inside], x[inside], y[inside], \
+            weights[inside]
+        corners = triangles[owners]
+
+        # Window depths are linear on screen. Colours are interpolated with
+        # perspective correction, like GL.
+        depth = np.einsum('ij,ij->i', weights, screen[corners, 2])
+        pixels = y * framebuffer.width + x
+        visible = (depth >= 0) & (depth <= 1) & \
+            (depth < framebuffer.depth.ravel()[pixels])
+        pixels, depth, weights, corners = pixels[visible], depth[visible], \
+            weights[visible], corners[visible]
+
+        # The nearest fragment of each pixel
+        order = np.lexsort((depth, pixels))
+        nearest = np.ones(len(order), dtype=bool)
+        nearest[1:] = pixels[order[1:]] != pixels[order[:-1]]
+        order = order[nearest]
+        pixels, depth, weights, corners = pixels[order], depth[order], \
+            weights[order], corners[order]
+
+        weights = weights * inverse_w[corners]
+        weights /= weights.sum(axis=1)[:, np.newaxis]
+        fragment_colors = np.einsum('ij,ijk->ik', weights, colors[corners])
+
+        framebuffer.depth.ravel()[pixels] = depth
+        framebuffer.color.reshape(-1, 3)[pixels] = fragment_colors
+
+    def upload(self, buffers):
+        return buffers
+
+    def update(self, resource, buffers):
+        return buffers
+
+    def delete(self, resource):
+        pass
+
+
+def write_png(path, image):
+    """
+    Write a (height, width, 3) array of uint8s as an RGB PNG file.
+    """
+    with open(path, 'wb') as png:
+        png.write(encode_png(image))
+
+
+def encode_png(image):
+    """
+    A (height, width, 3) array of uint8s as the bytes of an RGB PNG file.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    height, width = image.shape[:2]
+    # Each row starts with its filter type (0, for none)
+    rows = np.zeros((height, width * 3 + 1), dtype=np.uint8)
+    rows[:, 1:] = image.reshape(height, width * 3)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + \
+            struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    return b''.join((
+        b'\x89PNG\r\n\x1a\n',
+        chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)),
+        chunk(b'IDAT', zlib.compress(rows.tobytes(), 6)),
+        chunk(b'IEND', b'')))
@@ -0,0 +1,57 @@
+"""
+Baking a subtree of polygons into a single pre-transformed mesh.
+"""
+import numpy as np
+
+from core import matrix
+from core.gl_polygon import GLPolygon
+
+__author__ = 'eatmuchpie'
+
+
+class UnbakeablePolygon(Exception):
+    pass
+
+
+def bake(composite):
+    """
+    Merge every GLPolygon inside the composite into one GLPolygon, with
+    their vertices and normals transformed into the composite's space and
+    their triangle indices offset into the merged vertex array.
+
+    :return: (GLPolygon, polygons), where polygons are all the polygons
+        inside the composite, whose transformations the result depends on.
+    :raises UnbakeablePolygon: if the composite holds a polygon that isn't a
+        GLPolygon or a CompositePolygon.
+    """
+    vertices = []
+    normals = []
+    triangles_indices = []
+    polygons = []
+    vertex_count = 0
+
+    for key, child in composite._polygons.items():
+        for path, polygon, polygon_matrix in child.walk(path=(key,)):
+            polygons.append(polygon)
+            if isinstance(polygon, GLPolygon):
+                buffers = polygon.buffers
+                vertices.append(matrix.transform_points(polygon_matrix,
+                                                        buffers.positions))
+                normals.append(matrix.transform_normals(polygon_matrix,
+                                                        buffers.normals))
+                triangles_indices.append(
+                    buffers.triangles_indices.astype(np.intp) + vertex_count)
+                vertex_count += buffers.vertex_count
+            elif not hasattr(polygon, '_polygons'):
+                raise UnbakeablePolygon(
+                    "Can't bake {0} at {1}".format(type(polygon).__name__,
+                                                   '/'.join(map(str, path))))
+
+    if not vertices:
+        empty = np.zeros((0, 3))
+        return GLPolygon(empty, empty.astype(np.intp), normals=empty), polygons
+
+    baked = GLPolygon(np.concatenate(vertices),
+                      np.concatenate(triangles_indices),
+                      normals=np.concatenate(normals))
+    return baked, polygons
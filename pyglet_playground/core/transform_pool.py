@@ -0,0 +1,221 @@
+import weakref
+from contextlib import contextmanager
+import numpy as np
+
+from core import matrix
+from core.utility import ObservableArray, Subscription
+
+__author__ = 'eatmuchpie'
+
+
+class TransformPool(object):
+    """
+    A structure-of-arrays store for the transformations of many
+    Transformables.
+
+    The positions, orientations and sizes of every member live in
+    contiguous (N, 3) arrays, and each member's position, orientation and
+    size are ObservableArray views of its row. Changing a member through its
+    own arrays works as usual, but the whole population can also be changed
+    at once with a single numpy operation, e.g.:
+
+    with pool.bulk_update():
+        pool.orientations += rates * dt
+
+    Bulk updates only invalidate the members' cached matrices (which are
+    then recalculated together); they don't call the members' callbacks.
+    Subscribe to the pool itself to hear about them.
+    """
+
+    def __init__(self, capacity=64):
+        self._positions = np.zeros((capacity, 3))
+        self._orientations = np.zeros((capacity, 3))
+        self._sizes = np.ones((capacity, 3))
+        self._members = []
+
+        # Every member's local matrix, and which ones are out of date
+        self._local_matrices = None
+        self._dirty_rows = set()
+
+        # Incremented after every bulk update
+        self.version = 0
+        self.callbacks = set()
+
+    def __len__(self):
+        return len(self._members)
+
+    @property
+    def capacity(self):
+        return len(self._positions)
+
+    @property
+    def positions(self):
+        return self._positions[:len(self)]
+
+    @positions.setter
+    def positions(self, value):
+        self.positions[:] = value
+
+    @property
+    def orientations(self):
+        return self._orientations[:len(self)]
+
+    @orientations.setter
+    def orientations(self, value):
+        self.orientations[:] = value
+
+    @property
+    def sizes(self):
+        return self._sizes[:len(self)]
+
+    @sizes.setter
+    def sizes(self, value):
+        self.sizes[:] = value
+
+    def subscribe(self, callback_func, weak=False):
+        """
+        Call callback_func(pool, 'bulk_update') after every bulk update.
+
+        :param weak: see ObservableMethods.subscribe.
+        :return: a Subscription, which can be cancelled.
+        """
+        subscription = Subscription(self, callback_func, weak)
+        self.callbacks.add(subscription)
+        return subscription
+
+    def members(self):
+        """
+        The Transformables in the pool, in row order.
+        """
+        return [ref() for ref in self._members]
+
+    def add(self, transformable):
+        """
+        Move the transformable's position, orientation and size into this
+        pool. Its current values are kept.
+
+        :return: the transformable's row in the pool
+        """
+        if transformable._pool is not None:
+            raise ValueError("Transformable is already in a pool")
+
+        index = len(self._members)
+        if index == self.capacity:
+            self._grow()
+
+        self._positions[index] = transformable.position
+        self._orientations[index] = transformable.orientation
+        self._sizes[index] = transformable.size
+        self._members.append(weakref.ref(transformable, self._discard))
+
+        self._bind(transformable, index)
+        return index
+
+    def remove(self, transformable):
+        """
+        Move the transformable's arrays back out of the pool. The last
+        member of the pool is moved into its row.
+        """
+        index = transformable._pool_index
+        if transformable._pool is not self:
+            raise ValueError("Transformable isn't in this pool")
+
+        self._unbind(transformable)
+        self._remove_row(index)
+
+    @contextmanager
+    def bulk_update(self):
+        """
+        Modify self.positions, self.orientations and self.sizes inside the
+        with-block, after which every member's matrix is invalidated.
+        """
+        try:
+            yield self
+        finally:
+            self.invalidate()
+
+    def invalidate(self, index=None):
+        """
+        Mark the local matrix of the member in the given row (or of every
+        member, if no row is given) as out of date.
+        """
+        if index is None:
+            self._local_matrices = None
+            self._dirty_rows.clear()
+            self.version += 1
+            # Bulk updates bypass the members' callbacks, so the pool's
+            # subscribers are told instead (e.g. the scenes they're in)
+            for subscription in list(self.callbacks):
+                subscription(self, 'bulk_update')
+        elif self._local_matrices is not None:
+            self._dirty_rows.add(index)
+
+    def local_matrix(self, index):
+        """
+        The local matrix of the member in the given row. Out of date
+        matrices are recalculated together in one vectorized operation.
+        """
+        if self._local_matrices is None:
+            self._local_matrices = matrix.transformation(
+                self.positions, self.orientations, self.sizes)
+        elif self._dirty_rows:
+            rows = np.fromiter(self._dirty_rows, dtype=np.intp)
+            self._dirty_rows.clear()
+            self._local_matrices[rows] = matrix.transformation(
+                self._positions[rows], self._orientations[rows],
+                self._sizes[rows])
+
+        return self._local_matrices[index]
+
+    def _bind(self, transformable, index):
+        transformable._pool = None
+        with transformable.delayed_callback('pool'):
+            transformable.position = ObservableArray.view_of(self._positions[index])
+            transformable.orientation = ObservableArray.view_of(self._orientations[index])
+            transformable.size = ObservableArray.view_of(self._sizes[index])
+        transformable._pool = self
+        transformable._pool_index = index
+        transformable._pool_version = None
+
+    def _unbind(self, transformable):
+        transformable._pool = None
+        transformable._pool_index = None
+        with transformable.delayed_callback('pool'):
+            transformable.position = ObservableArray.like(transformable.position)
+            transformable.orientation = ObservableArray.like(transformable.orientation)
+            transformable.size = ObservableArray.like(transformable.size)
+
+    def _discard(self, ref):
+        # A member was garbage collected, so free its row
+        self._remove_row(self._members.index(ref))
+
+    def _remove_row(self, index):
+        last = len(self._members) - 1
+        if index != last:
+            for array in self._positions, self._orientations, self._sizes:
+                array[index] = array[last]
+            self._members[index] = self._members[last]
+            moved = self._members[index]()
+            if moved is not None:
+                self._bind(moved, index)
+        self._members.pop()
+        self.invalidate()
+
+    def _grow(self):
+        capacity = self.capacity * 2
+        self._positions = _resized(self._positions, capacity, 0.)
+        self._orientations = _resized(self._orientations, capacity, 0.)
+        self._sizes = _resized(self._sizes, capacity, 1.)
+
+        # The members' views point into the old arrays
+        for index, ref in enumerate(self._members):
+            member = ref()
+            if member is not None:
+                self._bind(member, index)
+        self.invalidate()
+
+
+def _resized(array, capacity, fill):
+    resized = np.full((capacity, array.shape[1]), fill)
+    resized[:len(array)] = array
+    return resized
@@ -1,5 +1,4 @@
-import numpy as np
-from pyglet.gl import *
+from core import matrix
 from core.utility import ObservableProperties, ObservableArray
 
 
@@ -23,7 +22,14 @@ class Transformable(object):
         """
         Create a new Transformable object, optionally cloning the
         transformations of the supplied Transformable object.
+
+        Clones of a Transformable in a TransformPool are not in the pool.
         """
+        # Set by TransformPool.add()
+        self._pool = None
+        self._pool_index = None
+        self._pool_version = None
+
         if to_clone is not None:
             self.orientation = ObservableArray.like(to_clone.orientation)
             self.size = ObservableArray.like(to_clone.size)
@@ -39,8 +45,16 @@ class Transformable(object):
                 'position': True
             }
 
+        self._local_matrix = None
+        # The matrices self.world_matrix was calculated from
+        self._parent_matrix = None
+        self._world_local_matrix = None
+        self.world_matrix = matrix.IDENTITY
+        self._gl_world_matrix = None
+
         self.check_arrays()
         self.callbacks.add(self.check_arrays)
+        self.callbacks.add(self.invalidate_matrix)
 
     def check_arrays(self, object=None, reason=None):
         for array in self.orientation, self.position, self.size:
@@ -50,34 +64,82 @@ class Transformable(object):
                 raise Transformable.BadTransformation(
                     "Array needs shape of (3), not {0}".format(array.shape))
 
+    def invalidate_matrix(self, object=None, reason=None):
+        """
+        Mark the cached local matrix as out of date. This is called whenever
+        the orientation, size or position change, but must be called by hand
+        after changing self.auto_transform.
+        """
+        self._local_matrix = None
+        if self._pool is not None:
+            self._pool.invalidate(self._pool_index)
+
+    @property
+    def local_matrix(self):
+        """
+        The 4x4 matrix for the automated transformations of this object,
+        relative to its parent.
+        """
+        pool = self._pool
+        if pool is not None and self._pool_version != pool.version:
+            # The pool has had a bulk update
+            self._pool_version = pool.version
+            self._local_matrix = None
+
+        if self._local_matrix is None:
+            auto = self.auto_transform
+            if self._pool is not None and all(auto.values()):
+                self._local_matrix = self._pool.local_matrix(self._pool_index)
+            else:
+                self._local_matrix = matrix.transformation(
+                    self.position if auto['position'] else None,
+                    self.orientation if auto['orientation'] else None,
+                    self.size if auto['size'] else None)
+        return self._local_matrix
+
     def transform(self):
         """
         Perform the automated transformations (if desired).
 
-        This is done by pushing a cloned modelview matrix to the stack, then
-        applying the transformations to it. The matrix stays on the stack after
-        this function returns. It can be removed with the self.untransform()
-        method.
-        """
-        glPushMatrix()
+        This calculates self.world_matrix, the transformation from this
+        object's space to the world, and pushes it to the stack of world
+        matrices so it is the parent matrix of anything transformed before
+        self.untransform() is called.
 
-        if self.auto_transform['position']:
-            glTranslatef(*self.position)
+        The world matrix is cached, and is only recalculated if this object's
+        transformations or its parent's world matrix have changed.
+        """
+        parent_matrix = _world_matrices[-1]
 
-        if self.auto_transform['orientation']:
-            glRotatef(self.orientation[0], 0, 0, 1)
-            glRotatef(self.orientation[1], 0, 1, 0)
-            glRotatef(self.orientation[2], 1, 0, 0)
+        # A new local matrix is only made when the old one is out of date
+        local_matrix = self.local_matrix
+        if local_matrix is not self._world_local_matrix or \
+                parent_matrix is not self._parent_matrix:
+            self._parent_matrix = parent_matrix
+            self._world_local_matrix = local_matrix
+            self.world_matrix = parent_matrix.dot(local_matrix)
+            self._gl_world_matrix = None
 
-        if self.auto_transform['size']:
-            glScalef(*self.size)
+        _world_matrices.append(self.world_matrix)
 
     def untransform(self):
         """
         Undo the transformation applied in self.transform().
 
-        This pops the matrix from the modelview stack.
+        This pops the world matrix from the stack.
+        """
+        _world_matrices.pop()
+
+    @property
+    def gl_world_matrix(self):
+        """
+        self.world_matrix in the layout expected by glLoadMatrixf.
         """
-        glPopMatrix()
+        if self._gl_world_matrix is None:
+            self._gl_world_matrix = matrix.gl_matrix(self.world_matrix)
+        return self._gl_world_matrix
 
 
+# The world matrices of the objects currently being transformed. This stands
+# in for the GL modelview stack, but has no depth limit.
+_world_matrices = [matrix.IDENTITY]
@@ -1,3 +1,5 @@
+import weakref
+from collections import OrderedDict
 from contextlib import contextmanager
 import numpy as np
 
@@ -42,6 +44,11 @@ class ObservableMethods(object):
 
     All calls to obj.callback() are subdued within the "with" block. On
     exiting the "with" block, obj.callback() is called.
+
+    Callbacks can also be added with obj.subscribe(), which returns a
+    Subscription handle that can later be cancelled.
+
+    To batch up the callbacks of many objects at once, see ChangeQueue.
     """
     def __init__(self, *observed_method_names):
         self.observed_method_names = observed_method_names
@@ -53,10 +60,20 @@ class ObservableMethods(object):
         def make_method_observable(method_name):
             original_method = getattr(cls, method_name)
 
-            def replacement_method(inner_self, *args, **kwargs):
-                result = original_method(inner_self, *args, **kwargs)
-                inner_self.callback(inner_self, method_name)
-                return result
+            if method_name.startswith('__') and method_name.endswith('__'):
+                # Operators never take keyword arguments, and leaving out
+                # **kwargs makes the wrapper noticeably cheaper
+                def replacement_method(inner_self, *args):
+                    result = original_method(inner_self, *args)
+                    if inner_self.callbacks:
+                        inner_self.callback(inner_self, method_name)
+                    return result
+            else:
+                def replacement_method(inner_self, *args, **kwargs):
+                    result = original_method(inner_self, *args, **kwargs)
+                    if inner_self.callbacks:
+                        inner_self.callback(inner_self, method_name)
+                    return result
 
             setattr(cls, method_name, replacement_method)
 
@@ -68,6 +85,11 @@ class ObservableMethods(object):
 
 
 def _add_callback_to_class(cls):
+    if 'subscribe' in cls.__dict__:
+        # Already decorated (e.g. with both ObservableMethods and
+        # ObservableProperties)
+        return
+
     original_init = cls.__init__
 
     def replacement_init(inner_self, *args, **kwargs):
@@ -77,33 +99,234 @@ def _add_callback_to_class(cls):
         original_init(inner_self, *args, **kwargs)
 
     def callback(inner_self, object, reason):
-        if not inner_self._is_calling_back:
-            inner_self._is_calling_back = True
-            try:
-                for callback_func in inner_self.callbacks:
-                    callback_func(object, reason)
-            finally:
-                inner_self._is_calling_back = False
+        if inner_self._is_calling_back:
+            return
+        if change_queue.active:
+            change_queue.record(inner_self, object, reason)
+        else:
+            _dispatch(inner_self, object, reason)
+
+    def subscribe(inner_self, callback_func, weak=False):
+        """
+        Call callback_func(object, reason) whenever this object changes.
+
+        :param weak: if True, callback_func must be a bound method, and the
+            subscription won't keep its object alive. The subscription is
+            cancelled once the object has been garbage collected.
+        :return: a Subscription, which can be cancelled.
+        """
+        subscription = Subscription(inner_self, callback_func, weak)
+        inner_self.callbacks.add(subscription)
+        return subscription
 
     @contextmanager
     def delayed_callback(inner_self, reason):
         """
         Delay callbacks to this object, then do one callback at the end.
+
+        If callbacks are already being delayed (or this object is calling
+        back), the with-block is simply run, and it's left to the outer
+        delayed_callback (or callback) to report the change.
         """
         if inner_self._is_calling_back:
-            # For now, raise an exception
-            raise Exception(
-                "tried a delayed_callback during a delayed_callback or callback")
+            yield
+            return
         inner_self._is_calling_back = True
-        yield
-        inner_self._is_calling_back = False
+        try:
+            yield
+        finally:
+            inner_self._is_calling_back = False
         inner_self.callback(inner_self, reason)
 
     cls.__init__ = replacement_init
     cls.callback = callback
+    cls.subscribe = subscribe
     cls.delayed_callback = delayed_callback
 
 
+def _dispatch(observable, object, reason):
+    observable._is_calling_back = True
+    try:
+        # Copied, as callbacks can cancel their own subscriptions
+        for callback_func in tuple(observable.callbacks):
+            callback_func(object, reason)
+    finally:
+        observable._is_calling_back = False
+
+
+# The most times an (obj, reason) is dispatched in one flush, which is only
+# reached if callbacks change each other in a cycle
+MAX_REDISPATCHES = 100
+
+
+class ChangeQueue(object):
+    """
+    Batches up the callbacks of every observable object.
+
+    Whilst a batch is open, obj.callback() records (obj, reason) instead of
+    calling obj's callbacks. Repeated records of the same (obj, reason) are
+    coalesced. When the outermost batch ends (or flush() is called) the
+    recorded callbacks are dispatched, each (obj, reason) once. Callbacks
+    made during the flush are queued behind the ones that caused them, so
+    changes are dispatched in dependency order: an array's callbacks run
+    before those of the object that owns the array. If a callback changes an
+    (obj, reason) that has already been dispatched, it's dispatched again,
+    so observers always see the final state.
+
+    Because callbacks run after all the changes in the batch have been made,
+    they should read the current state of the objects they observe rather
+    than rely on being told about each individual change.
+
+    Batches can be nested:
+
+    with change_queue.batch():
+        aperture.size[:] = [2., 2., 2.]
+        with change_queue.batch():
+            aperture.hole.size[:2] = [1., 1.]
+    """
+
+    def __init__(self):
+        self._depth = 0
+        self._flushing = False
+        self._pending = OrderedDict()
+
+        # Statistics for the batch being recorded, and the last flush
+        self.recorded = 0
+        self.last_flush = {'recorded': 0, 'dispatched': 0, 'coalesced': 0}
+
+    @property
+    def active(self):
+        return self._depth > 0 or self._flushing
+
+    def begin(self):
+        """
+        Start recording callbacks. Must be matched by a call to self.end().
+        """
+        self._depth += 1
+
+    def end(self):
+        """
+        Stop recording callbacks, dispatching them if this ends the
+        outermost batch.
+        """
+        self._depth -= 1
+        if self._depth == 0:
+            self.flush()
+
+    @contextmanager
+    def batch(self):
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.end()
+
+    def record(self, observable, object, reason):
+        self.recorded += 1
+        key = (id(observable), reason)
+        if key not in self._pending:
+            self._pending[key] = (observable, object, reason)
+
+    def flush(self):
+        """
+        Dispatch the recorded callbacks now, even if a batch is still open.
+        """
+        if self._flushing:
+            return
+
+        self._flushing = True
+        # Keeps the dispatched objects alive, so their ids aren't reused,
+        # and counts how many times each was dispatched
+        dispatched = {}
+        dispatch_count = 0
+        try:
+            while self._pending:
+                key, (observable, object, reason) = \
+                    self._pending.popitem(last=False)
+                count = dispatched.get(key, (None, 0))[1] + 1
+                if count > MAX_REDISPATCHES:
+                    raise RuntimeError(
+                        "Callbacks keep changing {0!r} ({1})".format(
+                            observable, reason))
+                dispatched[key] = (observable, count)
+                dispatch_count += 1
+                _dispatch(observable, object, reason)
+        finally:
+            self._flushing = False
+            self.last_flush = {
+                'recorded': self.recorded,
+                'dispatched': dispatch_count,
+                'coalesced': self.recorded - dispatch_count,
+            }
+            self.recorded = 0
+
+
+change_queue = ChangeQueue()
+
+
+class Subscription(object):
+    """
+    A handle to a callback function subscribed to an observable object.
+
+    The subscription only holds a weak reference to the observable object,
+    so it doesn't keep it alive.
+    """
+    __slots__ = ('_observable', '_callback', '_callback_self', '__weakref__')
+
+    def __init__(self, observable, callback, weak=False):
+        self._observable = weakref.ref(observable)
+        if weak:
+            self._callback = callback.__func__
+            self._callback_self = weakref.ref(callback.__self__)
+        else:
+            self._callback = callback
+            self._callback_self = None
+
+    def __call__(self, object, reason):
+        if self._callback_self is None:
+            self._callback(object, reason)
+        else:
+            callback_self = self._callback_self()
+            if callback_self is None:
+                self.cancel()
+            else:
+                self._callback(callback_self, object, reason)
+
+    @property
+    def active(self):
+        observable = self._observable()
+        return observable is not None and self in observable.callbacks
+
+    def cancel(self):
+        """
+        Stop calling the callback function. Does nothing if the subscription
+        has already been cancelled.
+        """
+        observable = self._observable()
+        if observable is not None and self in observable.callbacks:
+            observable.callbacks.remove(self)
+
+
+class _PropertySubscription(Subscription):
+    """
+    Forwards changes to the value of an observed property to the object that
+    owns the property, using the property name as the reason.
+    """
+    __slots__ = ('_property',)
+
+    def __init__(self, value, owner, prop):
+        super(_PropertySubscription, self).__init__(value, owner.callback,
+                                                    weak=True)
+        self._property = prop
+
+    def __call__(self, object, reason):
+        owner = self._callback_self()
+        if owner is None:
+            self.cancel()
+        else:
+            owner.callback(owner, self._property)
+
+
 class ObservableProperties(object):
     """
     Add observed properties to the decorated class.
@@ -115,7 +338,9 @@ class ObservableProperties(object):
     If the new property value is observable itself (i.e. it has an obj.callbacks
     set) then any internal mutations to the new object will trigger
     self.callback(). The arguments given to the self.callbacks functions are
-    the same as in the above paragraph.
+    the same as in the above paragraph. When the property is replaced, the
+    old value stops triggering self.callback(), and the old value never keeps
+    self alive.
 
     Whilst self.callback() is running, modifications won't trigger another
     self.callback(). If you want to run another code block without triggering
@@ -142,13 +367,22 @@ class ObservableProperties(object):
 
         def add_observable_property_to_class(prop):
             hidden_property = '_' + prop
+            hidden_subscription = '_' + prop + '_subscription'
             setattr(cls, hidden_property, None)
+            setattr(cls, hidden_subscription, None)
 
             def setter(inner_self, value):
+                old_subscription = getattr(inner_self, hidden_subscription)
+                if old_subscription is not None:
+                    old_subscription.cancel()
+
                 setattr(inner_self, hidden_property, value)
                 if hasattr(value, 'callbacks'):
-                    value.callbacks.add(
-                        lambda x, y: inner_self.callback(inner_self, prop))
+                    subscription = _PropertySubscription(value, inner_self, prop)
+                    value.callbacks.add(subscription)
+                    setattr(inner_self, hidden_subscription, subscription)
+                else:
+                    setattr(inner_self, hidden_subscription, None)
                 inner_self.callback(inner_self, prop)
 
             def getter(inner_self):
@@ -156,18 +390,30 @@ class ObservableProperties(object):
 
             setattr(cls, prop, property(getter, setter))
 
-
         for observable_property in self.observable_properties:
             add_observable_property_to_class(observable_property)
 
         return cls
 
 
-@ObservableMethods('__setitem__', '__setslice__')
+@ObservableMethods('__setitem__', '__iadd__', '__isub__', '__imul__',
+                   '__idiv__', '__itruediv__', '__ipow__')
 class ObservableArray(np.ndarray):
     """
     An observable Numpy array. See ObservableMethods for details.
+
+    Item assignment (including slices) and the in-place arithmetic operators
+    trigger callbacks. (On Python 2 numpy implements __setslice__ with
+    __setitem__, so it is not wrapped separately.)
     """
+    def __array_finalize__(self, obj):
+        # Views (e.g. the slice in a[:2] *= 2) and results of arithmetic
+        # start with no callbacks of their own. An in-place operator on a
+        # slice is still seen, as Python assigns the slice back to a with
+        # __setitem__ afterwards.
+        self.callbacks = set()
+        self._is_calling_back = False
+
     @staticmethod
     def like(input_array):
         """
@@ -176,4 +422,16 @@ class ObservableArray(np.ndarray):
         input_array = np.array(input_array)
         new_array = ObservableArray(np.array(input_array).shape)
         new_array[:] = input_array
-        return new_array
\ No newline at end of file
+        return new_array
+
+    @staticmethod
+    def view_of(input_array):
+        """
+        Creates an ObservableArray that shares its memory with the given
+        array, so writes to either are seen by both. Only writes made through
+        the ObservableArray trigger callbacks.
+        """
+        new_array = input_array.view(ObservableArray)
+        new_array.callbacks = set()
+        new_array._is_calling_back = False
+        return new_array
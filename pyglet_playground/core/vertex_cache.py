@@ -0,0 +1,250 @@
+"""
+Reordering of meshes for the GPU's post-transform vertex cache.
+
+The GPU keeps the last few transformed vertices in a small cache, so a
+triangle whose vertices were used recently is cheaper to draw. tipsify()
+reorders triangles so they reuse cached vertices (P. Sander, D. Nehab and J.
+Barczak, "Fast Triangle Reordering for Vertex Locality and Reduced
+Overdraw", 2007), sort_clusters() then puts the outward-facing parts of the
+mesh first to reduce overdraw, and fetch_order() renumbers the vertices in
+the order they're first used, so they're read from memory in order.
+
+The reordering is disabled by default, as it takes a while for large meshes.
+Enable it for every mesh prepared (by core.mesh.prepare()) from then on
+with:
+
+    vertex_cache.enable()
+
+Meshes already in generators.mesh_cache aren't reordered, so enable it
+before creating any.
+
+acmr() and atvr() measure the result by simulating a FIFO vertex cache, so
+it can be checked without a GPU.
+"""
+from collections import deque
+import numpy as np
+
+__author__ = 'eatmuchpie'
+
+
+# The cache size assumed by default. Real caches hold between about 12 and
+# 32 vertices, and orderings for a slightly smaller cache than the real one
+# do nearly as well.
+CACHE_SIZE = 16
+
+_cache_size = None
+
+
+def enable(cache_size=CACHE_SIZE):
+    """
+    Reorder every mesh prepared from now on, for a cache of the given size.
+    """
+    global _cache_size
+    _cache_size = cache_size
+
+
+def disable():
+    global _cache_size
+    _cache_size = None
+
+
+def active():
+    """
+    :return: the cache size meshes are reordered for, or None if they
+        aren't.
+    """
+    return _cache_size
+
+
+def optimize(vertices, normals, triangles_indices, cache_size=CACHE_SIZE):
+    """
+    Reorder a mesh's triangles for the vertex cache and overdraw, and then
+    its vertices for fetching. The triangles keep their order if it misses
+    the cache less (as for long fans, which tipsify() can only reorder as
+    well as they were ordered already).
+
+    :return: (vertices, normals, triangles_indices), with any unused
+        vertices dropped
+    """
+    reordered, clusters = tipsify(triangles_indices, len(vertices),
+                                  cache_size)
+    reordered = sort_clusters(vertices, reordered, clusters)
+    if cache_misses(reordered, cache_size) < \
+            cache_misses(triangles_indices, cache_size):
+        triangles_indices = reordered
+    return fetch_order(vertices, normals, triangles_indices)
+
+
+def tipsify(triangles_indices, vertex_count, cache_size=CACHE_SIZE):
+    """
+    Reorder triangles so that they reuse recently used vertices, by fanning
+    around each vertex in turn and choosing the next vertex to fan around
+    from the ones that are still in the cache.
+
+    :param triangles_indices: numpy.ndarray([[a1,b1,c1], [a2,b2,c2], ...])
+    :param vertex_count: the number of vertices
+    :param cache_size: the number of vertices in the cache
+    :return: (triangles_indices, clusters), where clusters holds the indices
+        (into the reordered triangles) of the triangles at which the ordering
+        had to jump to somewhere uncached, starting with 0.
+    """
+    triangles_indices = np.asarray(triangles_indices, dtype=np.intp)
+    triangles_indices = triangles_indices.reshape(-1, 3)
+    if not len(triangles_indices):
+        return triangles_indices, np.zeros(0, dtype=np.intp)
+
+    # Each vertex's triangles, as slices of adjacent_triangles
+    corners = triangles_indices.ravel()
+    adjacent_triangles = (np.argsort(corners, kind='mergesort') // 3).tolist()
+    live = np.bincount(corners, minlength=vertex_count)
+    offsets = np.concatenate(([0], np.cumsum(live))).tolist()
+    live = live.tolist()
+
+    triangles = triangles_indices.tolist()
+    emitted = [False] * len(triangles)
+    # When each vertex last entered the cache
+    cache_times = [0] * vertex_count
+    time = cache_size + 1
+    dead_ends = []
+    order = []
+    clusters = [0]
+    cursor = 0
+
+    fan = int(corners[0])
+    while fan >= 0:
+        candidates = []
+        for triangle in adjacent_triangles[offsets[fan]:offsets[fan + 1]]:
+            if emitted[triangle]:
+                continue
+            emitted[triangle] = True
+            order.append(triangle)
+            for vertex in triangles[triangle]:
+                dead_ends.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if time - cache_times[vertex] > cache_size:
+                    cache_times[vertex] = time
+                    time += 1
+
+        # The candidate that will still be in the cache after its fan,
+        # which entered the cache first
+        fan = -1
+        best_priority = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                age = time - cache_times[vertex]
+                priority = age if age + 2 * live[vertex] <= cache_size else 0
+                if priority > best_priority:
+                    best_priority = priority
+                    fan = vertex
+
+        if fan < 0:
+            # A dead end: go back to a recently used vertex, or failing that
+            # the next vertex with triangles left
+            while dead_ends:
+                vertex = dead_ends.pop()
+                if live[vertex] > 0:
+                    fan = vertex
+                    break
+            else:
+                while cursor < vertex_count and live[cursor] == 0:
+                    cursor += 1
+                if cursor < vertex_count:
+                    fan = cursor
+                    clusters.append(len(order))
+
+    return triangles_indices[order], np.array(clusters, dtype=np.intp)
+
+
+def sort_clusters(vertices, triangles_indices, clusters):
+    """
+    Sort clusters of triangles so the ones facing out of the mesh, which are
+    the most likely to hide the others, come first.
+
+    :param clusters: the index of the first triangle in each cluster,
+        starting with 0.
+    """
+    if len(clusters) < 2:
+        return triangles_indices
+
+    vertices = np.asarray(vertices, dtype=float)
+    corners = vertices[triangles_indices]
+    normals = np.cross(corners[:, 1] - corners[:, 0],
+                       corners[:, 2] - corners[:, 0])
+    centres = corners.mean(axis=1)
+    areas = np.sqrt(np.einsum('ij,ij->i', normals, normals))
+
+    # The area-weighted centre and (unnormalised) normal of each cluster
+    cluster_areas = np.add.reduceat(areas, clusters)
+    cluster_areas[cluster_areas == 0] = 1.
+    cluster_centres = np.add.reduceat(centres * areas[:, np.newaxis],
+                                      clusters) / cluster_areas[:, np.newaxis]
+    cluster_normals = np.add.reduceat(normals, clusters)
+
+    facing = np.einsum('ij,ij->i', cluster_centres - centres.mean(axis=0),
+                       cluster_normals)
+    cluster_order = np.argsort(-facing, kind='mergesort')
+
+    ends = np.append(clusters[1:], len(triangles_indices))
+    return np.concatenate([triangles_indices[clusters[c]:ends[c]]
+                           for c in cluster_order])
+
+
+def fetch_order(vertices, normals, triangles_indices):
+    """
+    Renumber the vertices in the order the triangles first use them.
+
+    :return: (vertices, normals, triangles_indices), with any unused
+        vertices dropped
+    """
+    triangles_indices = np.asarray(triangles_indices, dtype=np.intp)
+    used, first_use = np.unique(triangles_indices, return_index=True)
+    order = used[np.argsort(first_use)]
+
+    remapped = np.empty(len(vertices), dtype=np.intp)
+    remapped[order] = np.arange(len(order))
+    return (np.asarray(vertices)[order], np.asarray(normals)[order],
+            remapped[triangles_indices])
+
+
+def cache_misses(triangles_indices, cache_size=CACHE_SIZE):
+    """
+    The number of vertices that miss a FIFO cache of the given size when the
+    triangles are drawn in order.
+    """
+    cache = deque()
+    cached = set()
+    misses = 0
+    for vertex in np.asarray(triangles_indices).ravel().tolist():
+        if vertex in cached:
+            continue
+        misses += 1
+        cache.append(vertex)
+        cached.add(vertex)
+        if len(cache) > cache_size:
+            cached.discard(cache.popleft())
+    return misses
+
+
+def acmr(triangles_indices, cache_size=CACHE_SIZE):
+    """
+    The average cache miss ratio: the vertices transformed per triangle.
+    Between 3 (no reuse) and about 0.5 (a regular grid, if it could be
+    ordered perfectly).
+    """
+    triangle_count = np.asarray(triangles_indices).size // 3
+    if not triangle_count:
+        return 0.
+    return cache_misses(triangles_indices, cache_size) / float(triangle_count)
+
+
+def atvr(triangles_indices, cache_size=CACHE_SIZE):
+    """
+    The average transform to vertex ratio: the vertices transformed per
+    vertex used. 1 is the best possible, as every vertex must be transformed
+    at least once.
+    """
+    vertex_count = np.unique(triangles_indices).size
+    if not vertex_count:
+        return 0.
+    return cache_misses(triangles_indices, cache_size) / float(vertex_count)
@@ -0,0 +1,49 @@
+"""
+A stand-in for pyglet.gl that records the functions called on it instead of
+needing a GL context.
+"""
+import ctypes
+import itertools
+
+__author__ = 'eatmuchpie'
+
+
+class RecordingGL(object):
+    """
+    Records every gl* function call as a (name, args) tuple in self.calls.
+
+    The glGen* functions hand out increasing ids, like a real context would.
+    """
+
+    def __init__(self):
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    def __getattr__(self, name):
+        if not name.startswith('gl'):
+            raise AttributeError(name)
+
+        def record(*args):
+            self.calls.append((name, args))
+            if name in ('glGenLists', 'glCreateShader', 'glCreateProgram'):
+                return next(self._ids)
+            if name in ('glGenBuffers', 'glGenTextures'):
+                # Called as glGenBuffers(1, byref(GLuint())), or with an
+                # array of GLuints
+                if isinstance(args[1], ctypes.Array):
+                    args[1][:args[0]] = [next(self._ids)
+                                         for _ in range(args[0])]
+                else:
+                    args[1]._obj.value = next(self._ids)
+            if name in ('glGetShaderiv', 'glGetProgramiv'):
+                # Called as glGetShaderiv(shader, enum, byref(GLint())), and
+                # compiling and linking always succeeds
+                args[2]._obj.value = 1
+
+        return record
+
+    def names(self):
+        return [name for name, args in self.calls]
+
+    def count(self, name):
+        return self.names().count(name)
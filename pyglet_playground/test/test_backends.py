@@ -0,0 +1,64 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import backends
+from core.gl_polygon import GLPolygon
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestBackends(object):
+
+    def setup(self):
+        self.gl = RecordingGL()
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.], [1., 1., 0.]])
+        self.polygon = GLPolygon.triangle_strip(vertices, [0, 1, 2, 3])
+
+    def test_display_list_compiled_once(self):
+        backend = backends.DisplayListBackend(self.gl)
+        backend.draw(self.polygon)
+        backend.draw(self.polygon.clone())
+
+        assert_equals(1, self.gl.count('glNewList'))
+        assert_equals(1, self.gl.count('glDrawElements'))
+        assert_equals(2, self.gl.count('glCallList'))
+
+    def test_buffer_objects_uploaded_once(self):
+        backend = backends.BufferObjectBackend(self.gl)
+        backend.draw(self.polygon)
+        clone = self.polygon.clone()
+        backend.draw(clone)
+
+        assert_equals(2, self.gl.count('glGenBuffers'))
+        assert_equals(2, self.gl.count('glBufferData'))
+        assert_equals(2, self.gl.count('glDrawElements'))
+        assert self.polygon.gl_resources[backend] is clone.gl_resources[backend]
+
+    def test_buffer_objects_upload_data(self):
+        backend = backends.BufferObjectBackend(self.gl)
+        backend.draw(self.polygon)
+
+        buffer_data = [args for name, args in self.gl.calls
+                       if name == 'glBufferData']
+        assert_equals(self.polygon.buffers.vertex_data.nbytes, buffer_data[0][1])
+        assert_equals(self.polygon.buffers.index_data.nbytes, buffer_data[1][1])
+
+        draw_args = [args for name, args in self.gl.calls
+                     if name == 'glDrawElements'][0]
+        assert_equals(6, draw_args[1])
+
+    def test_backends_keep_separate_resources(self):
+        display_lists = backends.DisplayListBackend(self.gl)
+        buffer_objects = backends.BufferObjectBackend(self.gl)
+        display_lists.draw(self.polygon)
+        buffer_objects.draw(self.polygon)
+
+        assert_equals(2, len(self.polygon.gl_resources))
+
+    def test_using(self):
+        backend = backends.BufferObjectBackend(self.gl)
+        default = backends.current()
+
+        with backends.using(backend):
+            assert backends.current() is backend
+        assert backends.current() is default
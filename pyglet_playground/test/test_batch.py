@@ -0,0 +1,72 @@
+import os
+import shutil
+import tempfile
+from nose.tools import assert_equals
+import numpy as np
+from aperture import SolidAperture
+from core import batch, generators, software
+from core.scene import Scene
+
+__author__ = 'eatmuchpie'
+
+
+def _create_scene():
+    scene = Scene(backend=software.SoftwareBackend(), window=False)
+    torus = generators.create('torus', 1, 0.3, 24, 12)
+    torus.position[2] = -5.
+    scene._polygons = {'torus': torus}
+    return scene
+
+
+def _turn(scene, angle):
+    scene._polygons['torus'].orientation[1] = angle
+
+
+class TestRenderFrames(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.pattern = os.path.join(self.directory, '{0:03d}.npy')
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def _render(self, processes):
+        paths = list(batch.render_frames(_create_scene, _turn,
+                                         [0., 30., 60., 90.], self.pattern,
+                                         width=32, height=24,
+                                         processes=processes))
+        return paths, [np.load(path) for path in paths]
+
+    def test_in_order(self):
+        paths, frames = self._render(processes=2)
+        assert_equals([self.pattern.format(i) for i in range(4)], paths)
+        assert_equals((24, 32, 4), frames[0].shape)
+        # The torus is drawn, and turns
+        assert frames[0][..., 3].min() < 1.
+        assert not np.array_equal(frames[0], frames[1])
+
+    def test_same_as_one_process(self):
+        parallel = self._render(processes=2)[1]
+        serial = self._render(processes=1)[1]
+        for parallel_frame, serial_frame in zip(parallel, serial):
+            np.testing.assert_equal(serial_frame, parallel_frame)
+
+
+class TestShareMeshes(object):
+
+    def test_moves_shared_meshes(self):
+        torus = generators.create('torus', 1, 0.3, 20, 10)
+        solid = SolidAperture(smoothness=8)
+        vertex_data = np.array(torus.buffers.vertex_data)
+
+        batch.share_meshes()
+        assert batch._is_shared(torus.buffers.vertex_data)
+        assert batch._is_shared(torus.buffers.index_data)
+        np.testing.assert_equal(vertex_data, torus.buffers.vertex_data)
+        assert not batch._is_shared(solid.buffers.vertex_data)
+
+        # Already shared meshes aren't moved again
+        data = torus.buffers.vertex_data
+        batch.share_meshes()
+        assert torus.buffers.vertex_data is data
@@ -0,0 +1,56 @@
+import os
+import tempfile
+from nose.tools import assert_equals
+from benchmarks import suite
+
+__author__ = 'eatmuchpie'
+
+
+def _results(**seconds):
+    return {'environment': {}, 'seconds': seconds}
+
+
+class TestSuite(object):
+
+    def setup(self):
+        self._min_repeat_seconds = suite.MIN_REPEAT_SECONDS
+        suite.MIN_REPEAT_SECONDS = 0.
+
+    def teardown(self):
+        suite.MIN_REPEAT_SECONDS = self._min_repeat_seconds
+
+    def test_compare(self):
+        baseline = _results(a=1., b=1., c=1., d=1.)
+        results = _results(a=1.2, b=1.3, c=0.5, d=2., e=10.)
+        assert_equals([('d', 1., 2.), ('b', 1., 1.3)],
+                      suite.compare(results, baseline, 0.25))
+        assert_equals([], suite.compare(results, results))
+
+    def test_run_and_save(self):
+        logged = []
+        results = suite.run(['aperture_resize', 'tree_update'], quick=True,
+                            log=lambda key, seconds: logged.append(key))
+        assert_equals(['aperture_resize[400]', 'tree_update[100]',
+                       'tree_update[1000]', 'tree_update[10000]'], logged)
+        assert_equals(sorted(logged), sorted(results['seconds']))
+
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            suite.save(results, path)
+            assert_equals(results, suite.load(path))
+        finally:
+            os.remove(path)
+
+    def test_main_fails_on_regression(self):
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            suite.save(_results(**{'observer_callbacks[1]': 1e-9}), path)
+            assert_equals(1, suite.main(['--baseline', path,
+                                         'observer_callbacks']))
+            suite.save(_results(**{'observer_callbacks[1]': 1.}), path)
+            assert_equals(0, suite.main(['--baseline', path,
+                                         'observer_callbacks']))
+        finally:
+            os.remove(path)
@@ -0,0 +1,72 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import bounds, matrix
+
+__author__ = 'eatmuchpie'
+
+
+class TestBounds(object):
+
+    def setup(self):
+        self.frustum = bounds.Frustum.from_matrix(
+            matrix.perspective(90., 1., 1., 100.))
+
+    def test_aabb(self):
+        box = bounds.aabb([[0., 1., 2.], [3., -1., 0.], [1., 1., 1.]])
+        np.testing.assert_array_equal([[0., -1., 0.], [3., 1., 2.]], box)
+        assert bounds.aabb(np.zeros((0, 3))) is None
+
+    def test_merge(self):
+        box = bounds.merge([[[0., 0., 0.], [1., 1., 1.]],
+                            [[-1., 0.5, 0.], [0., 2., 0.5]]])
+        np.testing.assert_array_equal([[-1., 0., 0.], [1., 2., 1.]], box)
+
+    def test_transform(self):
+        unit = np.array([[0., 0., 0.], [1., 1., 1.]])
+        transformation = matrix.transformation([1., 2., 3.], [90., 0., 0.],
+                                               [2., 1., 1.])
+        np.testing.assert_array_almost_equal(
+            [[0., 2., 3.], [1., 4., 4.]], bounds.transform(transformation, unit))
+
+    def test_transform_stack(self):
+        unit = np.array([[0., 0., 0.], [1., 1., 1.]])
+        matrices = matrix.transformation(np.array([[1., 0., 0.], [0., 0., 5.]]),
+                                         None, None)
+        boxes = bounds.transform(matrices, np.array([unit, unit]))
+        np.testing.assert_array_almost_equal([[1., 0., 0.], [2., 1., 1.]], boxes[0])
+        np.testing.assert_array_almost_equal([[0., 0., 5.], [1., 1., 6.]], boxes[1])
+
+    def test_sphere(self):
+        centre, radius = bounds.sphere(np.array([[0., 0., 0.], [2., 2., 1.]]))
+        np.testing.assert_array_equal([1., 1., 0.5], centre)
+        assert_equals(1.5, radius)
+
+    def test_perspective_matches_glu(self):
+        # A point on the far plane at the top of the field of view
+        projection = matrix.perspective(90., 2., 1., 100.)
+        clip = projection.dot([0., 100., -100., 1.])
+        np.testing.assert_array_almost_equal([0., 1., 1.], clip[:3] / clip[3])
+
+    def test_classify(self):
+        def box(centre, half_size=0.5):
+            return np.array([np.subtract(centre, half_size),
+                             np.add(centre, half_size)])
+
+        assert_equals(bounds.INSIDE, self.frustum.classify(box([0., 0., -10.])))
+        assert_equals(bounds.OUTSIDE, self.frustum.classify(box([0., 0., 10.])))
+        assert_equals(bounds.OUTSIDE, self.frustum.classify(box([20., 0., -10.])))
+        assert_equals(bounds.OUTSIDE, self.frustum.classify(box([0., 0., -200.])))
+        assert_equals(bounds.INTERSECTING,
+                      self.frustum.classify(box([10., 0., -10.])))
+
+    def test_classify_stack(self):
+        boxes = np.array([[[-1., -1., -11.], [1., 1., -9.]],
+                          [[-1., -1., 9.], [1., 1., 11.]]])
+        np.testing.assert_array_equal([bounds.INSIDE, bounds.OUTSIDE],
+                                      self.frustum.classify(boxes))
+
+    def test_classify_spheres(self):
+        classes = self.frustum.classify_spheres(
+            [[0., 0., -10.], [0., 0., 10.], [10., 0., -10.]], [1., 1., 1.])
+        np.testing.assert_array_equal(
+            [bounds.INSIDE, bounds.OUTSIDE, bounds.INTERSECTING], classes)
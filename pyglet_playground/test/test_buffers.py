@@ -0,0 +1,35 @@
+from nose.tools import assert_equals
+import numpy as np
+from core.buffers import MeshBuffers, index_array
+
+__author__ = 'eatmuchpie'
+
+
+class TestMeshBuffers(object):
+
+    def setup(self):
+        self.vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.]])
+        self.normals = np.array([[0., 0., 1.]] * 3)
+        self.buffers = MeshBuffers(self.vertices, self.normals, [[0, 1, 2]])
+
+    def test_interleaved(self):
+        assert_equals(np.float32, self.buffers.vertex_data.dtype)
+        assert self.buffers.vertex_data.flags['C_CONTIGUOUS']
+        assert_equals(24, self.buffers.stride)
+        assert np.array_equal(self.vertices, self.buffers.positions)
+        assert np.array_equal(self.normals, self.buffers.normals)
+
+    def test_pointers_read_interleaved_data(self):
+        positions = self.buffers.position_pointer()
+        normals = self.buffers.normal_pointer()
+
+        # Each pointer steps over 6 floats to get to the next vertex
+        assert_equals(1., positions[6])
+        assert_equals(1., positions[13])
+        assert_equals(1., normals[2])
+        assert_equals(1., normals[8])
+
+    def test_smallest_index_type(self):
+        assert_equals(np.uint16, self.buffers.index_data.dtype)
+        assert_equals(np.uint16, index_array([[0, 1, 65535]]).dtype)
+        assert_equals(np.uint32, index_array([[0, 1, 65536]]).dtype)
@@ -0,0 +1,102 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import bvh, generators
+from core.composite_polygon import CompositePolygon
+from core.transform_pool import TransformPool
+from cube import create_unit_cube
+
+__author__ = 'eatmuchpie'
+
+
+class TestMeshBVH(object):
+
+    def test_ray_triangle_distances(self):
+        triangle = np.array([[[0., 0., 0.], [1., 0., 0.], [0., 1., 0.]]])
+        distances = bvh.ray_triangle_distances(
+            np.array([[0.2, 0.2, 1.], [0.2, 0.2, -2.], [2., 2., 1.],
+                      [0.2, 0.2, 1.]]),
+            np.array([[0., 0., -1.], [0., 0., 1.], [0., 0., -1.],
+                      [0., 0., 1.]]),
+            triangle)
+        np.testing.assert_array_almost_equal([[1.], [2.], [np.inf], [np.inf]],
+                                             distances)
+
+    def test_matches_brute_force(self):
+        vertices, triangles_indices = generators.sphere(1., 24, 12)
+        mesh_bvh = bvh.MeshBVH(vertices, triangles_indices)
+
+        random = np.random.RandomState(0)
+        origins = random.uniform(-3., 3., (200, 3))
+        directions = random.uniform(-1., 1., (200, 3)) - origins / 3.
+        distances, triangles = mesh_bvh.intersect(origins, directions)
+
+        brute_force = bvh.ray_triangle_distances(
+            origins, directions, vertices[triangles_indices])
+        np.testing.assert_array_almost_equal(brute_force.min(axis=1), distances)
+        hit = np.isfinite(distances)
+        assert hit.any() and not hit.all()
+        np.testing.assert_array_equal(brute_force[hit].argmin(axis=1),
+                                      triangles[hit])
+        assert np.all(triangles[~hit] == -1)
+
+
+class TestSceneBVH(object):
+
+    def setup(self):
+        self.near = create_unit_cube()
+        self.near.position[:] = [-0.5, -0.5, -5.]
+        self.far = create_unit_cube()
+        self.far.position[:] = [-0.5, -0.5, -10.]
+        self.root = CompositePolygon({'near': self.near, 'far': self.far})
+        self.bvh = bvh.SceneBVH(self.root)
+
+    def test_pick_nearest(self):
+        hit = self.bvh.pick([0., 0., 0.], [0., 0., -1.])
+        np.testing.assert_almost_equal(4., hit.distance)
+        np.testing.assert_array_almost_equal([0., 0., -4.], hit.point)
+        assert_equals(('near', 'bottom'), hit.path)
+        assert hit.polygon is self.near._polygons['bottom']
+
+    def test_miss(self):
+        assert self.bvh.pick([0., 0., 0.], [0., 1., 0.]) is None
+
+    def test_refit_after_move(self):
+        hierarchy = self.bvh.hierarchy
+        self.near.position[0] = 5.
+        hit = self.bvh.pick([0., 0., 0.], [0., 0., -1.])
+
+        assert_equals('far', hit.path[0])
+        assert self.bvh.hierarchy is hierarchy
+
+    def test_refit_after_pool_update(self):
+        pool = TransformPool()
+        pool.add(self.near)
+        self.bvh.rebuild()
+        with pool.bulk_update():
+            pool.positions[0, 1] = 5.
+        hit = self.bvh.pick([0., 0., 0.], [0., 0., -1.])
+
+        assert_equals('far', hit.path[0])
+
+    def test_batch_of_rays(self):
+        origins = np.zeros((3, 3))
+        directions = np.array([[0., 0., -1.], [0., 1., 0.], [0.05, 0., -1.]])
+        distances, polygons, triangles = self.bvh.intersect(origins, directions)
+
+        np.testing.assert_array_almost_equal([4., np.inf, 4.], distances)
+        assert_equals(-1, polygons[1])
+        assert_equals('near', self.bvh.paths[polygons[2]][0])
+
+    def test_overlapping(self):
+        found = self.bvh.overlapping([[-1., -1., -4.8], [1., 1., -4.2]])
+        assert_equals(set(['near']), set(path[0] for path, polygon in found))
+        # The faces at z=-5 and z=-4 are outside the box
+        assert_equals(4, len(found))
+
+    def test_screen_ray(self):
+        origin, direction = bvh.screen_ray(50, 50, 100, 100, 60.)
+        np.testing.assert_array_almost_equal([0., 0., -1.], direction)
+        origin, direction = bvh.screen_ray(100, 50, 200, 100, 90.)
+        np.testing.assert_array_almost_equal([0., 0., -1.], direction)
+        origin, direction = bvh.screen_ray(200, 100, 200, 100, 90.)
+        np.testing.assert_array_almost_equal([2., 1., -1.], direction)
@@ -0,0 +1,88 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import backends, bounds, culling, matrix
+from core.composite_polygon import CompositePolygon
+from core.transform_pool import TransformPool
+from cube import create_unit_cube
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestCulling(object):
+
+    def setup(self):
+        self.gl = RecordingGL()
+        self.culler = culling.Culler(bounds.Frustum.from_matrix(
+            matrix.perspective(60., 1., .1, 100.)))
+        self.visible = create_unit_cube()
+        self.visible.position[:] = [0., 0., -10.]
+        self.hidden = create_unit_cube()
+        self.hidden.position[:] = [0., 0., 10.]
+        self.scene = CompositePolygon({'visible': self.visible,
+                                       'hidden': self.hidden})
+
+    def _draw(self):
+        self.culler.begin_frame()
+        with backends.using(backends.BufferObjectBackend(self.gl)), \
+                culling.using(self.culler):
+            self.scene.draw()
+        self.culler.begin_frame()
+        return self.gl.count('glDrawElements')
+
+    def test_composite_bounds(self):
+        np.testing.assert_array_almost_equal(
+            [[0., 0., -10.], [1., 1., 11.]], self.scene.local_bounds)
+
+    def test_hidden_subtree_culled(self):
+        assert_equals(6, self._draw())
+        frame = self.culler.last_frame
+        assert_equals(1, frame['culled'])
+        # The scene, both cubes and the visible cube's faces
+        assert_equals(9, frame['visited'])
+        # The visible cube is inside, so its faces aren't tested
+        assert_equals(3, frame['tested'])
+
+    def test_bounds_follow_transformations(self):
+        self.hidden.position[2] = -20.
+        assert_equals(12, self._draw())
+        np.testing.assert_array_almost_equal(
+            [[0., 0., -20.], [1., 1., -9.]], self.scene.local_bounds)
+
+    def test_nothing_culled_without_culler(self):
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.scene.draw()
+        assert_equals(12, self.gl.count('glDrawElements'))
+
+    def test_pooled_bulk_update(self):
+        pool = TransformPool()
+        pool.add(self.hidden)
+        self._draw()
+        with pool.bulk_update():
+            pool.positions[0] = [0., 0., -20.]
+        assert_equals(6 + 12, self._draw())
+
+    def test_nested_bounds_follow_transformations(self):
+        outer = CompositePolygon({'scene': self.scene})
+        self.scene.position[0] = 2.
+        np.testing.assert_array_almost_equal(
+            [[2., 0., -10.], [3., 1., 11.]], outer.local_bounds)
+
+        self.hidden.position[2] = -20.
+        np.testing.assert_array_almost_equal(
+            [[2., 0., -20.], [3., 1., -9.]], outer.local_bounds)
+
+    def test_nested_pooled_bulk_update(self):
+        pool = TransformPool()
+        pool.add(self.hidden)
+        outer = CompositePolygon({'scene': self.scene})
+        outer.local_bounds
+        with pool.bulk_update():
+            pool.positions[0] = [0., 0., -20.]
+        np.testing.assert_array_almost_equal(
+            [[0., 0., -20.], [1., 1., -9.]], outer.local_bounds)
+
+    def test_bounds_kept_after_unrelated_changes(self):
+        bounds_before = self.scene.local_bounds
+        create_unit_cube().position[0] = 5.
+        assert self.scene.local_bounds is bounds_before
@@ -0,0 +1,97 @@
+from nose.tools import assert_equals, assert_raises
+import numpy as np
+from core import decimate, generators, mesh
+from core.lod import LODPolygon
+
+__author__ = 'eatmuchpie'
+
+
+def _grid(size):
+    # A flat, open square of 2 * (size - 1)^2 triangles
+    xs, ys = np.meshgrid(np.arange(size, dtype=float),
+                         np.arange(size, dtype=float))
+    vertices = np.column_stack((xs.ravel(), ys.ravel(), np.zeros(size * size)))
+    corners = (np.arange(size - 1)[:, np.newaxis] * size +
+               np.arange(size - 1)).ravel()
+    triangles = np.vstack((
+        np.column_stack((corners, corners + 1, corners + size + 1)),
+        np.column_stack((corners, corners + size + 1, corners + size))))
+    return vertices, triangles
+
+
+class TestSimplify(object):
+
+    def test_needs_a_target(self):
+        vertices, triangles = _grid(4)
+        assert_raises(ValueError, decimate.simplify, vertices, triangles)
+
+    def test_reaches_target(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        simplified, simplified_triangles, error = decimate.simplify(
+            vertices, triangles, target_triangles=200)
+        assert len(simplified_triangles) <= 200
+        assert len(simplified_triangles) > 150
+        assert_equals(len(simplified), np.unique(simplified_triangles).size)
+
+    def test_stays_near_surface(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        simplified, _, error = decimate.simplify(vertices, triangles,
+                                                 target_triangles=200)
+        radii = np.sqrt(np.einsum('ij,ij->i', simplified, simplified))
+        assert np.abs(radii - 1.).max() < 0.05
+        assert 0 < error < 0.5
+
+    def test_keeps_winding(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        simplified, simplified_triangles, _ = decimate.simplify(
+            vertices, triangles, target_triangles=200)
+        normals = mesh.face_normals(simplified, simplified_triangles)
+        centres = simplified[simplified_triangles].mean(axis=1)
+        assert (np.einsum('ij,ij->i', normals, centres) > 0).all()
+
+    def test_flat_mesh_is_free(self):
+        # Collapses in a plane don't move the surface, and the boundary
+        # stays on the square
+        vertices, triangles = _grid(9)
+        simplified, simplified_triangles, error = decimate.simplify(
+            vertices, triangles, max_error=1e-6)
+        assert len(simplified_triangles) < len(triangles) // 4
+        assert error < 1e-6
+        np.testing.assert_almost_equal(0, simplified[:, 2])
+        np.testing.assert_almost_equal([0, 0], simplified[:, :2].min(axis=0))
+        np.testing.assert_almost_equal([8, 8], simplified[:, :2].max(axis=0))
+
+    def test_max_error_stops_early(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        _, loose, _ = decimate.simplify(vertices, triangles, max_error=0.1)
+        _, tight, error = decimate.simplify(vertices, triangles,
+                                            max_error=0.01)
+        assert len(loose) < len(tight) < len(triangles)
+        assert error <= 0.01
+
+
+class TestLODLevels(object):
+
+    def test_levels(self):
+        vertices, triangles = generators.torus(1., 0.3, 32, 16)
+        levels = decimate.lod_levels(vertices, triangles)
+        counts = [len(level_triangles) for _, level_triangles, _ in levels]
+        errors = [error for _, _, error in levels]
+        assert_equals(len(triangles), counts[0])
+        assert_equals(0, errors[0])
+        assert_equals(sorted(counts, reverse=True), counts)
+        assert_equals(sorted(errors), errors)
+        assert counts[-1] <= len(triangles) // 8
+
+    def test_lod_polygon(self):
+        vertices, triangles = generators.torus(1., 0.3, 32, 16)
+        polygon = decimate.lod_polygon(vertices, triangles, ratios=(1, .25))
+        assert isinstance(polygon, LODPolygon)
+        assert_equals(2, len(polygon.levels))
+        assert (polygon.levels[1].buffers.index_count <
+                polygon.levels[0].buffers.index_count)
+
+    def test_simplify_polygon(self):
+        polygon = generators.create('sphere', 1., 32, 16)
+        simplified = decimate.simplify_polygon(polygon, target_triangles=100)
+        assert simplified.buffers.index_count <= 300
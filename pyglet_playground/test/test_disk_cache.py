@@ -0,0 +1,102 @@
+import gc
+import os
+import shutil
+import tempfile
+import time
+from nose.tools import assert_equals
+import numpy as np
+from core import disk_cache, generators
+from core.gl_polygon import GLPolygon
+
+__author__ = 'eatmuchpie'
+
+
+class TestDiskCache(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = disk_cache.enable(self.directory, min_vertices=0)
+        generators.mesh_cache.clear()
+
+    def teardown(self):
+        disk_cache.disable()
+        generators.mesh_cache.clear()
+        shutil.rmtree(self.directory)
+
+    def test_generated_mesh_saved_and_loaded(self):
+        generated = generators.create('sphere', 1., 8, 4).buffers
+        vertex_data = np.array(generated.vertex_data)
+        index_data = np.array(generated.index_data)
+        assert_equals(1, self.cache.misses)
+        assert_equals(2, len(os.listdir(self.directory)))
+
+        # Nothing in memory shares the mesh any more
+        generators.mesh_cache.clear()
+        del generated
+        gc.collect()
+
+        loaded = generators.create('sphere', 1, 8, 4)
+        assert_equals(1, self.cache.hits)
+        assert isinstance(loaded.buffers.vertex_data, np.memmap)
+        np.testing.assert_array_equal(vertex_data, loaded.buffers.vertex_data)
+        np.testing.assert_array_equal(index_data, loaded.buffers.index_data)
+
+    def test_content_keyed_mesh(self):
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.]])
+        first = GLPolygon(vertices, [[0, 1, 2]])
+        second = GLPolygon(vertices.copy(), [[0, 1, 2]])
+        third = GLPolygon(vertices, [[0, 2, 1]])
+
+        assert_equals(1, self.cache.hits)
+        assert_equals(2, self.cache.misses)
+        np.testing.assert_array_equal(first.buffers.normals,
+                                      second.buffers.normals)
+        np.testing.assert_array_equal(-first.buffers.normals,
+                                      third.buffers.normals)
+
+    def test_small_meshes_not_cached(self):
+        self.cache.min_vertices = 4
+        GLPolygon(np.eye(3), [[0, 1, 2]])
+        assert_equals(0, self.cache.misses)
+        assert_equals([], os.listdir(self.directory))
+
+    def test_stale_entries_evicted(self):
+        generators.create('box')
+        stale = os.path.join(self.directory, 'gen-box-0-000000000000.vertices.npy')
+        np.save(stale, np.zeros(3))
+        interrupted = os.path.join(self.directory, 'saving-1.tmp')
+        open(interrupted, 'w').close()
+        old = time.time() - disk_cache.STALE_TEMPORARY_SECONDS - 1
+        os.utime(interrupted, (old, old))
+
+        cache = disk_cache.DiskMeshCache(self.directory)
+        assert_equals(2, cache.evicted)
+        assert_equals(2, len(os.listdir(self.directory)))
+
+    def test_other_files_kept(self):
+        generators.create('box')
+        others = ['user.npy', 'gen-box.npy', 'partial.tmp',
+                  # Being saved by another process
+                  'saving-2.tmp']
+        for filename in others:
+            open(os.path.join(self.directory, filename), 'w').close()
+
+        cache = disk_cache.DiskMeshCache(self.directory)
+        assert_equals(0, cache.evicted)
+        cache.clear()
+        assert_equals(sorted(others), sorted(os.listdir(self.directory)))
+
+    def test_corrupt_entry_regenerated(self):
+        generators.create('box')
+        for filename in os.listdir(self.directory):
+            open(os.path.join(self.directory, filename), 'w').close()
+
+        generators.mesh_cache.clear()
+        box = generators.create('box')
+        assert_equals(2, self.cache.misses)
+        assert_equals(24, box.buffers.vertex_count)
+
+    def test_disabled(self):
+        disk_cache.disable()
+        generators.create('box')
+        assert_equals([], os.listdir(self.directory))
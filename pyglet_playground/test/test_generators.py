@@ -0,0 +1,122 @@
+from math import pi, sin, cos
+from nose.tools import assert_equals
+import numpy as np
+from aperture import Aperture
+from core import generators, mesh
+
+__author__ = 'eatmuchpie'
+
+
+def _outward(vertices, triangles_indices, centres):
+    # The face normals point away from the given centres
+    normals = mesh.face_normals(vertices, triangles_indices)
+    middles = vertices[triangles_indices].mean(axis=1)
+    return np.all(np.einsum('ij,ij->i', normals, middles - centres) > 0)
+
+
+class TestGenerators(object):
+
+    def test_hole_face_matches_loops(self):
+        smoothness = 12
+        vertices, triangles_indices = generators.hole_face(smoothness)
+
+        for i in range(smoothness):
+            angle = 2 * pi * i / smoothness
+            np.testing.assert_array_almost_equal(
+                [cos(angle) * 0.5, sin(angle) * 0.5, 0.], vertices[i])
+            quadrant = int(4 * float(i) / smoothness)
+            assert_equals([smoothness + quadrant, i, (i + 1) % smoothness],
+                          list(triangles_indices[i]))
+
+    def test_hole_wall_faces_inwards(self):
+        vertices, triangles_indices = generators.hole_wall(16)
+        assert_equals((32, 3), vertices.shape)
+        assert_equals((32, 3), triangles_indices.shape)
+
+        middles = vertices[triangles_indices].mean(axis=1)
+        middles[:, :2] = 0.
+        assert not _outward(vertices, triangles_indices, middles)
+
+    def test_cylinder_faces_outwards(self):
+        vertices, triangles_indices = generators.cylinder(16, 1., 2.)
+        assert_equals(4 * 16, len(triangles_indices))
+        assert _outward(vertices, triangles_indices, [0., 0., 1.])
+
+    def test_torus_faces_outwards(self):
+        vertices, triangles_indices = generators.torus(1., 0.3, 20, 10)
+        assert_equals((200, 3), vertices.shape)
+        assert_equals((400, 3), triangles_indices.shape)
+
+        middles = vertices[triangles_indices].mean(axis=1)
+        centres = np.zeros_like(middles)
+        centres[:, :2] = middles[:, :2] / np.sqrt(
+            (middles[:, :2] ** 2).sum(axis=1))[:, np.newaxis]
+        assert _outward(vertices, triangles_indices, centres)
+
+    def test_sphere_faces_outwards(self):
+        vertices, triangles_indices = generators.sphere(2., 16, 8)
+        assert_equals(16 * 7 + 2, len(vertices))
+        assert_equals(2 * 16 * 7, len(triangles_indices))
+        np.testing.assert_array_almost_equal(
+            np.full(len(vertices), 2.), np.sqrt((vertices ** 2).sum(axis=1)))
+        assert _outward(vertices, triangles_indices, np.zeros(3))
+
+    def test_box_faces_outwards(self):
+        vertices, triangles_indices = generators.box()
+        assert_equals((24, 3), vertices.shape)
+        assert_equals((12, 3), triangles_indices.shape)
+        assert _outward(vertices, triangles_indices, np.full(3, 0.5))
+
+
+class TestMeshCache(object):
+
+    def setup(self):
+        self.cache = generators.MeshCache(maxsize=2)
+
+    def test_same_parameters_share_mesh(self):
+        first = self.cache.polygon('torus', 1, 0.3, 8, 4)
+        second = self.cache.polygon('torus', 1., 0.3, 8, 4)
+
+        assert first is not second
+        assert first.buffers is second.buffers
+        assert first.gl_resources is second.gl_resources
+        assert_equals(1, self.cache.misses)
+        assert_equals(1, self.cache.hits)
+
+    def test_least_recently_used_evicted(self):
+        box = self.cache.polygon('box')
+        self.cache.polygon('sphere', 1., 8, 4)
+        self.cache.polygon('box')
+        self.cache.polygon('hole_face', 8)
+
+        assert_equals(2, len(self.cache))
+        assert self.cache.polygon('box').buffers is box.buffers
+        assert_equals(3, self.cache.misses)
+
+    def test_apertures_share_hole(self):
+        generators.mesh_cache.clear()
+        apertures = [Aperture(smoothness=40) for i in range(5)]
+
+        # Each level of the face and wall, and the two LODPolygons
+        levels, errors = generators.lod_chain('hole_face', 40)
+        assert_equals(2 * len(levels) + 2, generators.mesh_cache.misses)
+        faces = set(id(a.hole._polygons['front_face'].buffers)
+                    for a in apertures)
+        assert_equals(1, len(faces))
+
+
+class TestLODChain(object):
+
+    def test_segments_halved(self):
+        levels, errors = generators.lod_chain('hole_wall', 100)
+        assert_equals([(100,), (50,), (25,), (12,), (8,)], levels)
+        assert np.all(np.diff(errors) > 0)
+
+    def test_few_segments(self):
+        levels, errors = generators.lod_chain('hole_face', 6)
+        assert_equals([(6,)], levels)
+
+    def test_torus(self):
+        levels, errors = generators.lod_chain('torus', 1, 0.3, 50, 30)
+        assert_equals((1, 0.3, 50, 30), levels[0])
+        assert_equals((1, 0.3, 8, 8), levels[-1])
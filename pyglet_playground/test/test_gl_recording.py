@@ -0,0 +1,202 @@
+from ctypes import POINTER
+from nose.tools import assert_equals
+import numpy as np
+from pyglet.gl import GLfloat, GL_ARRAY_BUFFER, GL_TRIANGLES
+from core import backends, gl_recording
+from core.gl_polygon import GLPolygon
+from core.scene import Scene
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+def _square(z=-5.):
+    vertices = np.array([[-1., -1., z], [1., -1., z], [1., 1., z],
+                         [-1., 1., z]])
+    return GLPolygon(vertices, [[0, 1, 2], [0, 2, 3]])
+
+
+class TestCommandBuffer(object):
+
+    def setup(self):
+        self.recorder = gl_recording.CommandRecorder()
+
+    def test_arrays(self):
+        self.recorder.glEnable(7)
+        self.recorder.glColor3f(1., 0.5, 0.)
+        self.recorder.glEnable(8)
+        commands = self.recorder.commands
+
+        assert_equals(3, len(commands))
+        assert_equals(np.uint16, commands.opcodes.dtype)
+        assert_equals([0, 1, 0], list(commands.opcodes))
+        assert_equals(['glEnable', 'glColor3f'], list(commands.functions))
+        assert_equals([0, 1, 4, 5], list(commands.argument_starts))
+        assert_equals([('glEnable', [7]), ('glColor3f', [1., 0.5, 0.]),
+                       ('glEnable', [8])], list(commands.calls()))
+        assert_equals({'glEnable': 2, 'glColor3f': 1}, commands.counts())
+
+    def test_grows(self):
+        for i in range(1000):
+            self.recorder.glEnable(i)
+        commands = self.recorder.commands
+        assert_equals(1000, len(commands))
+        assert_equals(range(1000), list(commands.arguments.astype(int)))
+
+    def test_pointer_data_copied(self):
+        matrix = np.arange(16, dtype=np.float32)
+        self.recorder.glLoadMatrixf(matrix.ctypes.data_as(POINTER(GLfloat)))
+        matrix[:] = 0
+
+        loaded = self.recorder.commands.arguments_of(0)[0]
+        assert_equals(range(16), list(loaded))
+
+    def test_names(self):
+        program = self.recorder.glCreateProgram()
+        gl_list = self.recorder.glGenLists(2)
+        assert_equals(1, program)
+        assert_equals(2, gl_list)
+        assert_equals(4, self.recorder.glCreateShader(0))
+
+
+class TestFrameStats(object):
+
+    def setup(self):
+        self.recorder = gl_recording.CommandRecorder()
+        self.polygon = _square()
+
+    def _draw_frame(self, backend):
+        backend.draw(self.polygon)
+        backend.draw(self.polygon.clone())
+        backend.flush()
+        self.recorder.begin_frame()
+        return self.recorder.last_frame
+
+    def test_buffer_objects(self):
+        backend = backends.BufferObjectBackend(self.recorder)
+        frame = self._draw_frame(backend)
+        assert_equals(2, frame['draw_calls'])
+        assert_equals(4, frame['triangles'])
+        assert_equals(2, frame['matrix_loads'])
+        assert_equals(0, frame['matrix_pushes'])
+        assert_equals(2, frame['functions']['glGenBuffers'])
+        # Binding and unbinding the buffers and client state of each draw,
+        # and binding the buffers to upload them, then unbinding them
+        assert_equals(2 * 10 + 4, frame['state_changes'])
+
+        frame = self._draw_frame(backend)
+        assert_equals(2 * 10, frame['state_changes'])
+
+    def test_display_lists(self):
+        # The list's glDrawElements isn't a draw call, but its triangles
+        # are counted by each glCallList, including in later frames
+        backend = backends.DisplayListBackend(self.recorder)
+        for _ in range(2):
+            frame = self._draw_frame(backend)
+            assert_equals(2, frame['draw_calls'])
+            assert_equals(4, frame['triangles'])
+
+    def test_instanced(self):
+        backend = backends.InstancedBackend(self.recorder)
+        frame = self._draw_frame(backend)
+        assert_equals(1, frame['draw_calls'])
+        assert_equals(4, frame['triangles'])
+
+    def test_scene(self):
+        scene = Scene(backend=backends.BufferObjectBackend(self.recorder),
+                      window=False)
+        scene._polygons = {'square': self.polygon}
+        scene.on_resize(320, 240)
+        scene.gl_setup()
+        scene.draw()
+        # The setup is counted with the first frame
+        first = self.recorder.last_frame
+        assert_equals(1, first['functions']['gluPerspective'])
+        assert_equals(6, first['functions']['glEnable'])
+        assert_equals(1, first['draw_calls'])
+        assert_equals(2, first['triangles'])
+
+        scene.draw()
+        second = self.recorder.last_frame
+        assert 'gluPerspective' not in second['functions']
+        assert_equals(1, second['draw_calls'])
+        assert_equals(2, second['triangles'])
+        assert_equals(1, second['functions']['glClear'])
+        assert_equals(0, len(self.recorder.commands))
+
+
+class TestReplay(object):
+
+    def setup(self):
+        self.recorder = gl_recording.CommandRecorder()
+        self.gl = RecordingGL()
+        # So the context's names differ from the recorder's
+        for _ in range(10):
+            self.gl.glGenLists(1)
+        self.gl.calls = []
+        self.replayer = gl_recording.Replayer(self.gl)
+
+    def _replay_frame(self):
+        self.recorder.begin_frame()
+        self.replayer.replay(self.recorder.last_commands)
+        return self.gl.calls
+
+    def test_buffer_names_mapped(self):
+        backend = backends.BufferObjectBackend(self.recorder)
+        polygon = _square()
+        backend.draw(polygon)
+        calls = self._replay_frame()
+
+        vertex_buffer = polygon.gl_resources[backend].vertex_buffer
+        bound = [args[1] for name, args in calls
+                 if name == 'glBindBuffer' and args[0] == GL_ARRAY_BUFFER]
+        assert_equals([self.replayer.names[vertex_buffer], 0,
+                       self.replayer.names[vertex_buffer], 0], bound)
+        assert vertex_buffer != self.replayer.names[vertex_buffer]
+
+        draw = [args for name, args in calls if name == 'glDrawElements'][0]
+        assert_equals((GL_TRIANGLES, 6), draw[:2])
+
+        # Deleting the buffers in a later frame uses the context's names
+        backend.delete(polygon.gl_resources[backend])
+        self.gl.calls = []
+        deleted = dict(self._replay_frame())['glDeleteBuffers'][1]
+        assert_equals([self.replayer.names[vertex_buffer],
+                       self.replayer.names[vertex_buffer + 1]], list(deleted))
+
+    def test_data_replayed(self):
+        data = np.arange(6, dtype=np.float32)
+        backend = backends.BufferObjectBackend(self.recorder)
+        backend._create_buffer(GL_ARRAY_BUFFER, data)
+        data[:] = 0
+
+        calls = self._replay_frame()
+        target, size, pointer, usage = dict(calls)['glBufferData']
+        assert_equals(data.nbytes, size)
+        np.testing.assert_equal(np.arange(6), np.frombuffer(
+            bytearray(pointer), dtype=np.float32))
+
+    def test_display_lists_mapped(self):
+        backend = backends.DisplayListBackend(self.recorder)
+        backend.draw(_square())
+        recorded = self.recorder.commands
+        calls = dict(self._replay_frame())
+        assert_equals([name for name, args in recorded.calls()],
+                      self.gl.names())
+        recorded_list, = recorded.results.values()
+        gl_list = self.replayer.names[recorded_list]
+        assert gl_list != recorded_list
+        assert_equals(gl_list, calls['glNewList'][0])
+        assert_equals(gl_list, calls['glCallList'][0])
+
+    def test_programs_mapped(self):
+        backend = backends.InstancedBackend(self.recorder)
+        backend.draw(_square())
+        backend.flush()
+        calls = self._replay_frame()
+
+        program = self.replayer.names[backend._program]
+        assert program != backend._program
+        assert_equals([(program,), (0,)],
+                      [args for name, args in calls if name == 'glUseProgram'])
+        assert_equals(program, dict(calls)['glLinkProgram'][0])
@@ -0,0 +1,79 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import backends, instancing, matrix
+from core.composite_polygon import CompositePolygon
+from cube import create_unit_cube
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestInstancing(object):
+
+    def setup(self):
+        cube = create_unit_cube()
+        self.cubes = [cube] + [cube.clone() for _ in range(9)]
+        for n, cube in enumerate(self.cubes):
+            cube.position[0] = n
+        self.scene = CompositePolygon(dict(enumerate(self.cubes)))
+
+        self.gl = RecordingGL()
+        self.backend = backends.InstancedBackend(self.gl)
+
+    def draw(self):
+        with backends.using(self.backend):
+            self.scene.draw()
+            self.backend.flush()
+
+    def test_batches_group_clones(self):
+        with backends.using(self.backend):
+            self.scene.draw()
+        batches = self.backend.batcher.take()
+
+        assert_equals(6, len(batches))
+        assert_equals([10] * 6, [len(batch) for batch in batches])
+        assert_equals(0, len(self.backend.batcher))
+
+    def test_one_draw_call_per_mesh(self):
+        self.draw()
+
+        assert_equals(6, self.backend.draw_calls)
+        assert_equals(60, self.backend.instances)
+        assert_equals(6, self.gl.count('glDrawElementsInstanced'))
+        assert_equals(0, self.gl.count('glDrawElements'))
+        assert_equals(0, self.gl.count('glLoadMatrixf'))
+
+        instance_counts = [args[4] for name, args in self.gl.calls
+                           if name == 'glDrawElementsInstanced']
+        assert_equals([10] * 6, instance_counts)
+
+    def test_program_compiled_once(self):
+        self.draw()
+        self.draw()
+
+        assert_equals(1, self.gl.count('glLinkProgram'))
+        assert_equals(12, self.gl.count('glDrawElementsInstanced'))
+
+    def test_instance_data(self):
+        world_matrix = matrix.transformation([1., 2., 3.], [0., 0., 90.],
+                                             [2., 1., 4.])
+        data = instancing.instance_data([world_matrix, np.identity(4)])
+
+        assert_equals((2, instancing.INSTANCE_COMPONENTS), data.shape)
+        assert_equals(np.float32, data.dtype)
+        model = data[0, :16].reshape(4, 4).T
+        assert np.allclose(world_matrix, model)
+
+        normal_matrix = data[0, 16:].reshape(3, 3).T
+        inverse_transpose = np.linalg.inv(world_matrix[:3, :3]).T
+        assert np.allclose(inverse_transpose * np.linalg.det(world_matrix[:3, :3]),
+                           normal_matrix)
+        assert np.allclose(np.identity(3), data[1, 16:].reshape(3, 3))
+
+    def test_normal_matrix_with_zero_size(self):
+        world_matrix = matrix.transformation(None, None, [0., 1., 1.])
+        data = instancing.instance_data([world_matrix])
+
+        assert np.all(np.isfinite(data))
+        # Faces perpendicular to the flattened axis still have normals
+        assert np.allclose([1., 0., 0.], data[0, 16:19])
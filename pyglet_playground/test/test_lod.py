@@ -0,0 +1,79 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import backends, generators, lod
+from core.gl_polygon import GLPolygon
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestLOD(object):
+
+    def setup(self):
+        self.gl = RecordingGL()
+        self.selector = lod.LODSelector(60., viewport_height=1000)
+        self.polygon = generators.create_lod('sphere', 1., 64, 32)
+
+    def _draw(self, distance):
+        self.polygon.position[2] = -distance
+        self.selector.begin_frame()
+        with backends.using(backends.BufferObjectBackend(self.gl)), \
+                lod.using(self.selector):
+            self.polygon.draw()
+        self.selector.begin_frame()
+        return self.polygon.level
+
+    def _drawn_index_count(self):
+        return [args[1] for name, args in self.gl.calls
+                if name == 'glDrawElements'][-1]
+
+    def test_most_detailed_without_selector(self):
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.polygon.draw()
+        assert_equals(self.polygon.buffers.index_count,
+                      self._drawn_index_count())
+
+    def test_detail_falls_with_distance(self):
+        levels = [self._draw(distance) for distance in (2., 20., 200., 2000.)]
+        assert_equals(sorted(levels), levels)
+        assert levels[0] < levels[-1]
+        assert_equals(len(self.polygon.levels) - 1, levels[-1])
+
+        assert_equals(self.polygon.levels[-1].buffers.index_count,
+                      self._drawn_index_count())
+
+    def test_triangle_counts(self):
+        self._draw(2000.)
+        frame = self.selector.last_frame
+        assert_equals(self.polygon.buffers.index_count // 3,
+                      frame['full_triangles'])
+        assert_equals(self.polygon.levels[-1].buffers.index_count // 3,
+                      frame['triangles'])
+        assert_equals({len(self.polygon.levels) - 1: 1}, frame['levels'])
+
+    def test_hysteresis(self):
+        # Find the distance at which the level first drops
+        distances = np.linspace(2., 200., 400)
+        for distance in distances:
+            if self._draw(distance) > 0:
+                break
+        switch = distance
+        coarser = self.polygon.level
+
+        # Moving back a little keeps the coarser level...
+        assert_equals(coarser, self._draw(switch * 0.95))
+        # ...until the error is too big
+        assert self._draw(switch * 0.5) < coarser
+
+    def test_clone_shares_levels(self):
+        clone = self.polygon.clone()
+        for level, cloned_level in zip(self.polygon.levels, clone.levels):
+            assert level.gl_resources is cloned_level.gl_resources
+        assert clone.buffers is self.polygon.buffers
+
+    def test_empty_mesh(self):
+        empty = GLPolygon(np.zeros((0, 3)), np.zeros((0, 3), dtype=int),
+                          shared=False)
+        self.polygon = lod.LODPolygon([empty, empty], [0., 1.])
+        assert_equals(None, self.polygon.local_bounds)
+        assert_equals(1, self._draw(10.))
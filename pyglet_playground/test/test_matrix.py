@@ -0,0 +1,60 @@
+import numpy as np
+from core import matrix
+
+__author__ = 'eatmuchpie'
+
+
+def _rotation(angle, axis):
+    # Rodrigues' formula, as used by glRotatef
+    angle = np.radians(angle)
+    x, y, z = axis
+    k = np.array([[0, -z, y], [z, 0, -x], [-y, x, 0]])
+    result = np.identity(4)
+    result[:3, :3] += np.sin(angle) * k + (1 - np.cos(angle)) * k.dot(k)
+    return result
+
+
+class TestMatrix(object):
+
+    def test_matches_gl_call_order(self):
+        position = [1., 2., 3.]
+        orientation = [30., 45., 60.]
+        size = [2., 3., 4.]
+
+        translate = np.identity(4)
+        translate[:3, 3] = position
+        scale = np.diag(size + [1.])
+        expected = translate \
+            .dot(_rotation(orientation[0], [0, 0, 1])) \
+            .dot(_rotation(orientation[1], [0, 1, 0])) \
+            .dot(_rotation(orientation[2], [1, 0, 0])) \
+            .dot(scale)
+
+        assert np.allclose(expected,
+                           matrix.transformation(position, orientation, size))
+
+    def test_skipped_transformations(self):
+        assert np.array_equal(np.identity(4),
+                              matrix.transformation(None, None, None))
+
+        result = matrix.transformation([1., 2., 3.], None, [2., 2., 2.])
+        assert np.array_equal([1., 2., 3., 1.], result[:, 3])
+        assert np.array_equal([2., 2., 2.], np.diag(result)[:3])
+
+    def test_stacked(self):
+        positions = np.arange(12.).reshape(4, 3)
+        orientations = np.random.uniform(0, 360, (4, 3))
+        sizes = np.random.uniform(1, 2, (4, 3))
+
+        stacked = matrix.transformation(positions, orientations, sizes)
+
+        assert stacked.shape == (4, 4, 4)
+        for i in range(4):
+            assert np.allclose(stacked[i], matrix.transformation(
+                positions[i], orientations[i], sizes[i]))
+
+    def test_gl_matrix_is_column_major(self):
+        result = matrix.gl_matrix(matrix.transformation([1., 2., 3.], None, None))
+
+        assert result.dtype == np.float32
+        assert np.array_equal([1., 2., 3., 1.], result.ravel()[12:])
@@ -0,0 +1,68 @@
+from nose.tools import assert_equals
+import numpy as np
+from core import mesh
+
+__author__ = 'eatmuchpie'
+
+
+class TestMesh(object):
+
+    def setup(self):
+        # A unit square in the xy plane, with two unused vertices mixed in
+        self.vertices = np.array([
+            [9., 9., 9.],
+            [0., 0., 0.],
+            [1., 0., 0.],
+            [9., 9., 9.],
+            [0., 1., 0.],
+            [1., 1., 0.],
+        ])
+        self.triangles = np.array([[1, 2, 4], [4, 2, 5]])
+
+    def test_compact(self):
+        vertices, triangles = mesh.compact(self.vertices, self.triangles)
+
+        assert np.array_equal(self.vertices[[1, 2, 4, 5]], vertices)
+        assert np.array_equal([[0, 1, 2], [2, 1, 3]], triangles)
+
+    def test_compact_keeps_used_vertices(self):
+        vertices, triangles = mesh.compact(self.vertices[1:3], [[0, 1, 0]])
+
+        assert_equals(2, len(vertices))
+        assert np.array_equal([[0, 1, 0]], triangles)
+
+    def test_face_normals(self):
+        vertices, triangles = mesh.compact(self.vertices, self.triangles)
+        normals = mesh.face_normals(vertices, triangles)
+
+        assert np.allclose([[0., 0., 1.], [0., 0., 1.]], normals)
+
+    def test_degenerate_face_normal(self):
+        normals = mesh.face_normals(self.vertices, np.array([[1, 2, 2]]))
+
+        assert np.array_equal([[0., 0., 0.]], normals)
+
+    def test_vertex_normals_are_averaged(self):
+        # Two faces of a cube sharing an edge
+        vertices = np.array([
+            [0., 0., 0.],
+            [1., 0., 0.],
+            [0., 1., 0.],
+            [0., 0., 1.],
+        ])
+        triangles = np.array([[0, 2, 1], [0, 1, 3]])
+        normals = mesh.vertex_normals(vertices, triangles)
+
+        diagonal = np.array([0., -1., -1.]) / np.sqrt(2)
+        assert np.allclose(diagonal, normals[0])
+        assert np.allclose(diagonal, normals[1])
+        assert np.allclose([0., 0., -1.], normals[2])
+        assert np.allclose([0., -1., 0.], normals[3])
+
+    def test_strip_to_triangles(self):
+        triangles = mesh.strip_to_triangles([0, 2, 1, 3, 4])
+
+        assert np.array_equal([[0, 2, 1], [3, 1, 2], [1, 3, 4]], triangles)
+
+    def test_short_strip(self):
+        assert_equals((0, 3), mesh.strip_to_triangles([0, 1]).shape)
@@ -0,0 +1,76 @@
+import gc
+from nose.tools import assert_equals
+import numpy as np
+from core import backends
+from core.buffers import MeshBuffers
+from core.gl_polygon import GLPolygon
+from core.mesh_registry import MeshRegistry
+from cube import create_unit_cube
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestMeshRegistry(object):
+
+    def setup(self):
+        self.registry = MeshRegistry()
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.]])
+        normals = np.array([[0., 0., 1.]] * 3)
+        self.buffers = MeshBuffers(vertices, normals, [[0, 1, 2]])
+        self.same_buffers = MeshBuffers(vertices.copy(), normals, [[0, 1, 2]])
+        self.polygons = [GLPolygon(buffers=self.buffers) for i in range(3)]
+
+    def test_identical_content_shared(self):
+        first = self.registry.intern(self.polygons[0], self.buffers)
+        second = self.registry.intern(self.polygons[1], self.same_buffers)
+
+        assert first is second
+        assert second.buffers is self.buffers
+        assert_equals(1, len(self.registry))
+        assert_equals(2, first.users)
+
+    def test_report(self):
+        shared_mesh = self.registry.intern(self.polygons[0], self.buffers)
+        self.registry.acquire(self.polygons[1], shared_mesh)
+        self.registry.acquire(self.polygons[2], shared_mesh)
+
+        report = self.registry.report()
+        assert_equals(1, report['unique'])
+        assert_equals(3, report['total'])
+        assert_equals(2 * self.buffers.nbytes, report['saved_bytes'])
+
+    def test_released_when_unused(self):
+        released = []
+        self.registry.on_release = released.append
+        shared_mesh = self.registry.intern(self.polygons[0], self.buffers)
+        self.registry.acquire(self.polygons[1], shared_mesh)
+
+        del self.polygons[:2]
+        gc.collect()
+
+        assert_equals(0, len(self.registry))
+        assert_equals([shared_mesh], released)
+
+
+class TestInternedPolygons(object):
+
+    def test_cubes_share_faces(self):
+        first = create_unit_cube()
+        second = create_unit_cube()
+        for name, face in first._polygons.items():
+            assert face.buffers is second._polygons[name].buffers
+            assert face.gl_resources is second._polygons[name].gl_resources
+
+        gl = RecordingGL()
+        with backends.using(backends.DisplayListBackend(gl)):
+            first.draw()
+            second.draw()
+        assert_equals(6, gl.count('glNewList'))
+        assert_equals(12, gl.count('glCallList'))
+
+    def test_different_meshes_not_shared(self):
+        vertices = np.array([[0., 0., 0.], [1., 0., 0.], [0., 1., 0.]])
+        front = GLPolygon(vertices, [[0, 1, 2]])
+        back = GLPolygon(vertices, [[0, 2, 1]])
+        assert front.gl_resources is not back.gl_resources
@@ -1,5 +1,7 @@
+import gc
 from nose.tools import assert_equals
-from core.utility import ObservableProperties, ObservableMethods
+from core.transformable import Transformable
+from core.utility import ObservableProperties, ObservableMethods, change_queue
 
 __author__ = 'eatmuchpie'
 
@@ -53,4 +55,172 @@ class TestObservables(object):
         self.obj.a.a = 3
 
         assert_equals(3, self.obj.a.a, "Nested object's setter didnt work")
-        assert self.callback_args == [(self.obj, 'a')]
\ No newline at end of file
+        assert self.callback_args == [(self.obj, 'a')]
+
+
+class TestSubscriptions(object):
+
+    def setup(self):
+        self.obj = Obs()
+        self.callback_args = []
+
+    def callback(self, *args):
+        self.callback_args.append(args)
+
+    def test_cancel(self):
+        subscription = self.obj.subscribe(self.callback)
+        self.obj.func_a()
+        assert subscription.active
+
+        subscription.cancel()
+        self.obj.func_a()
+        assert not subscription.active
+        assert_equals([(self.obj, 'func_a')], self.callback_args)
+
+    def test_weak_subscription(self):
+        class Listener(object):
+            def __init__(self, calls):
+                self.calls = calls
+
+            def on_change(self, obj, reason):
+                self.calls.append(reason)
+
+        calls = []
+        listener = Listener(calls)
+        subscription = self.obj.subscribe(listener.on_change, weak=True)
+        self.obj.func_b()
+
+        del listener
+        self.obj.func_b()
+        assert_equals(['func_b'], calls)
+        assert not subscription.active
+
+    def test_reassignment_unsubscribes(self):
+        old_value = Obs()
+        self.obj.a = old_value
+        self.obj.a = Obs()
+        self.obj.subscribe(self.callback)
+
+        old_value.b = 3
+        assert_equals([], self.callback_args)
+        assert_equals(0, len(old_value.callbacks))
+
+    def test_repeated_reassignment_doesnt_grow_callbacks(self):
+        value = Obs()
+        for _ in range(10):
+            self.obj.a = value
+
+        assert_equals(1, len(value.callbacks))
+
+    def test_property_doesnt_keep_owner_alive(self):
+        value = Obs()
+        self.obj.a = value
+        del self.obj
+        gc.collect()
+
+        value.b = 3
+        assert_equals(0, len(value.callbacks))
+
+
+class TestChangeQueue(object):
+
+    def setup(self):
+        self.queue = change_queue
+        self.callback_args = []
+
+    def callback(self, *args):
+        self.callback_args.append(args)
+
+    def test_callbacks_delayed_and_coalesced(self):
+        obj = Obs()
+        obj.subscribe(self.callback)
+
+        with self.queue.batch():
+            obj.func_a()
+            obj.func_a()
+            obj.func_b()
+            assert_equals([], self.callback_args)
+
+        assert_equals([(obj, 'func_a'), (obj, 'func_b')], self.callback_args)
+        assert_equals(3, self.queue.last_flush['recorded'])
+        assert_equals(2, self.queue.last_flush['dispatched'])
+
+    def test_nested_batches(self):
+        obj = Obs()
+        obj.subscribe(self.callback)
+
+        with self.queue.batch():
+            with self.queue.batch():
+                obj.func_a()
+            assert_equals([], self.callback_args)
+
+        assert_equals([(obj, 'func_a')], self.callback_args)
+
+    def test_dependency_order(self):
+        obj = Obs()
+        obj.a = Obs()
+        obj.a.subscribe(lambda *args: self.callback('inner'))
+        obj.subscribe(lambda *args: self.callback('outer'))
+
+        with self.queue.batch():
+            obj.a.func_a()
+            obj.a.func_b()
+
+        assert_equals([('inner',), ('inner',), ('outer',)], self.callback_args)
+
+    def test_callback_count_independent_of_changes(self):
+        obj = Transformable()
+        obj.subscribe(self.callback)
+        counts = []
+
+        for changes in 1, 3, 30:
+            with self.queue.batch():
+                for n in range(changes):
+                    obj.position[n % 3] = n
+                    obj.size[n % 3] = n
+            counts.append(self.queue.last_flush['dispatched'])
+
+        assert_equals(1, len(set(counts)))
+
+    def test_changes_during_flush_redispatched(self):
+        # A callback that changes an object whose change has already been
+        # dispatched, which must be dispatched again
+        first, second = Obs(), Obs()
+        seen = []
+        first.subscribe(lambda obj, reason: second.func_a())
+        second.subscribe(lambda obj, reason: seen.append(obj.a))
+
+        with self.queue.batch():
+            second.a = 1
+            second.func_a()
+            first.func_a()
+            second.a = 2
+
+        # second.a is dispatched, then second's func_a change from first's
+        # callback is dispatched again
+        assert_equals([2, 2, 2], seen)
+        assert_equals(4, self.queue.last_flush['dispatched'])
+
+
+class TestSceneBatching(object):
+
+    def test_batch_scoped_to_update(self):
+        from core.scene import Scene
+        obj = Transformable()
+        args = []
+        obj.subscribe(lambda *callback_args: args.append(callback_args))
+
+        scene = Scene(batch_changes=True, cull=False, window=False)
+
+        def animate(dt):
+            obj.position[0] += dt
+            obj.position[1] += dt
+            assert_equals([], args)
+        scene.add_animation(animate)
+        scene.update(1.)
+        assert_equals([(obj, 'position')], args)
+
+        # Outside the update, changes aren't batched
+        assert not change_queue.active
+        obj.size[0] = 2.
+        assert_equals((obj, 'size'), args[-1])
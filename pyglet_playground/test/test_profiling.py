@@ -0,0 +1,88 @@
+import gc
+import json
+import os
+import tempfile
+from nose.tools import assert_equals, assert_almost_equals
+from aperture import Aperture
+from core import backends, gl_recording, profiling
+from core.scene import Scene
+
+__author__ = 'eatmuchpie'
+
+
+class TestProfiler(object):
+
+    def setup(self):
+        self.scene = Scene(backend=backends.BufferObjectBackend(
+            gl_recording.CommandRecorder()), window=False)
+        aperture = Aperture(smoothness=40)
+        aperture.position[2] = -5.
+        self.scene._polygons = {'aperture': aperture}
+        self.scene.on_resize(320, 240)
+        self.profiler = profiling.Profiler(window=3)
+        self.scene.profiler = self.profiler
+
+    def teardown(self):
+        # Release the meshes, so they don't count as live in other tests
+        del self.scene
+        gc.collect()
+
+    def _frames(self, count):
+        for _ in range(count):
+            self.scene.update(1 / 60.)
+            self.scene.draw()
+
+    def test_paths(self):
+        self._frames(2)
+        summary = self.profiler.summary()
+        for path in ('', 'aperture', 'aperture/hole',
+                     'aperture/hole/cylinder', 'aperture/lbox/top'):
+            for phase in 'update', 'draw':
+                assert_equals(1., summary[path, phase][2])
+
+        # Each node's time is its own plus its children's
+        for phase in 'update', 'draw':
+            total = sum(self_seconds for (path, node_phase),
+                        (seconds, self_seconds, calls) in summary.items()
+                        if node_phase == phase)
+            assert_almost_equals(summary['', phase][0], total)
+            hole = summary['aperture/hole', phase]
+            assert hole[1] <= hole[0]
+
+    def test_rolling_window(self):
+        self._frames(5)
+        assert_equals(3, len(self.profiler.frames))
+        # A title, the column headings and one row
+        assert_equals(3, len(self.profiler.report(count=1).split('\n')))
+
+    def test_chrome_trace(self):
+        self._frames(2)
+        handle, path = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        try:
+            self.profiler.save_chrome_trace(path)
+            with open(path) as trace_file:
+                events = json.load(trace_file)['traceEvents']
+        finally:
+            os.remove(path)
+
+        cylinders = [event for event in events
+                     if event['args']['path'] == 'aperture/hole/cylinder']
+        assert_equals(4, len(cylinders))
+        assert_equals(set(['cylinder']),
+                      set(event['name'] for event in cylinders))
+        assert_equals(set(['X']), set(event['ph'] for event in events))
+
+        scene = [event for event in events if event['name'] == 'Scene.draw']
+        assert_equals(2, len(scene))
+        for event in cylinders:
+            if event['cat'] == 'draw':
+                assert any(
+                    frame['ts'] <= event['ts'] and event['ts'] + event['dur']
+                    <= frame['ts'] + frame['dur'] for frame in scene)
+
+    def test_off_by_default(self):
+        self.scene.profiler = None
+        self._frames(1)
+        assert_equals(None, profiling.current())
+        assert_equals(0, len(self.profiler.frames))
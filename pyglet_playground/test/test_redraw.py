@@ -0,0 +1,92 @@
+from nose.tools import assert_equals
+from core import software
+from core.composite_polygon import CompositePolygon
+from core.redraw import RedrawTracker
+from core.scene import Scene
+from core.transform_pool import TransformPool
+from cube import create_unit_cube
+
+__author__ = 'eatmuchpie'
+
+
+class TestRedrawTracker(object):
+
+    def setup(self):
+        self.obj = create_unit_cube()
+        self.scene = CompositePolygon({'obj': self.obj})
+        self.tracker = RedrawTracker(self.scene, buffers=2)
+
+    def draw_frames(self, frames, animating=False):
+        return [self.tracker.should_draw(animating) for _ in range(frames)]
+
+    def test_idle_frames_skipped(self):
+        # The first frame is drawn into each buffer
+        assert_equals([True, True, False, False], self.draw_frames(4))
+        assert_equals(2, self.tracker.frames_rendered)
+        assert_equals(2, self.tracker.frames_skipped)
+
+    def test_change_redraws(self):
+        self.draw_frames(2)
+        self.obj.position[0] = 1.
+
+        assert_equals([True, True, False], self.draw_frames(3))
+
+    def test_animation_redraws(self):
+        self.draw_frames(2)
+
+        assert_equals([True] * 3, self.draw_frames(3, animating=True))
+        # Only the buffer holding the second-last frame is out of date
+        assert_equals([True, False, False], self.draw_frames(3))
+
+    def test_invalidate(self):
+        self.draw_frames(2)
+        self.tracker.invalidate()
+
+        assert_equals([True, True, False], self.draw_frames(3))
+
+    def test_changes_outside_scene_ignored(self):
+        self.draw_frames(2)
+        create_unit_cube().position[0] = 1.
+
+        assert_equals([False], self.draw_frames(1))
+
+    def test_nested_change_redraws(self):
+        inner = create_unit_cube()
+        self.scene._polygons = {'obj': self.obj,
+                                'group': CompositePolygon({'inner': inner})}
+        self.tracker.invalidate()
+        self.draw_frames(2)
+        inner.size[0] = 2.
+
+        assert_equals([True, True, False], self.draw_frames(3))
+
+    def test_pooled_bulk_update_redraws(self):
+        pool = TransformPool()
+        pool.add(self.obj)
+        self.draw_frames(3)
+        with pool.bulk_update():
+            pool.positions[0] = [1., 0., 0.]
+
+        assert_equals([True, True, False], self.draw_frames(3))
+
+
+class TestOnDemandScene(object):
+
+    def setup(self):
+        self.cube = create_unit_cube()
+        self.scene = Scene(backend=software.SoftwareBackend(32, 32),
+                           on_demand=True, window=False)
+        self.scene._polygons = {'cube': self.cube}
+        self.scene.on_resize(32, 32)
+
+    def test_only_own_changes_redraw(self):
+        for _ in range(3):
+            self.scene.draw()
+        create_unit_cube().position[0] = 1.
+        self.scene.draw()
+        assert_equals((2, 2), (self.scene.redraw.frames_rendered,
+                               self.scene.redraw.frames_skipped))
+
+        self.cube.position[0] = 1.
+        self.scene.draw()
+        assert_equals(3, self.scene.redraw.frames_rendered)
@@ -0,0 +1,76 @@
+import gc
+from nose.tools import assert_equals
+import numpy as np
+from aperture import Aperture
+from core import backends, generators
+from core.gl_polygon import GLPolygon
+from core.resources import resource_manager
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestResources(object):
+
+    def setup(self):
+        self.gl = RecordingGL()
+        # Random, so the mesh isn't shared with any other test's polygons
+        self.polygon = GLPolygon(np.random.rand(3, 3), [[0, 1, 2]])
+        gc.collect()
+        resource_manager.collect()
+
+    def _draw(self, backend, *polygons):
+        with backends.using(backend):
+            for polygon in polygons:
+                polygon.draw()
+
+    def test_deleted_after_last_clone_dropped(self):
+        backend = backends.DisplayListBackend(self.gl)
+        clone = self.polygon.clone()
+        self._draw(backend, self.polygon, clone)
+        live = resource_manager.report()['live']
+
+        del self.polygon
+        gc.collect()
+        assert_equals(0, resource_manager.report()['pending'])
+
+        del clone
+        gc.collect()
+        assert_equals(1, resource_manager.report()['pending'])
+        assert_equals(0, self.gl.count('glDeleteLists'))
+
+        assert_equals(1, resource_manager.collect())
+        assert_equals(1, self.gl.count('glDeleteLists'))
+        assert_equals(live - 1, resource_manager.report()['live'])
+
+    def test_buffer_objects_deleted(self):
+        backend = backends.BufferObjectBackend(self.gl)
+        self._draw(backend, self.polygon)
+        nbytes = self.polygon.buffers.nbytes
+        live_bytes = resource_manager.report()['live_bytes']
+
+        del self.polygon
+        gc.collect()
+        resource_manager.collect()
+
+        assert_equals(1, self.gl.count('glDeleteBuffers'))
+        assert_equals(live_bytes - nbytes,
+                      resource_manager.report()['live_bytes'])
+
+    def test_rebuilt_apertures_dont_leak(self):
+        backend = backends.DisplayListBackend(self.gl)
+        live = []
+        for smoothness in 20, 30, 40, 50:
+            aperture = Aperture(smoothness=smoothness)
+            self._draw(backend, aperture)
+            del aperture
+            # The hole meshes are otherwise kept by the generators' cache
+            generators.mesh_cache.clear()
+            gc.collect()
+            resource_manager.collect()
+            live.append(resource_manager.report()['live'])
+
+        assert_equals(1, len(set(live)))
+        # At least the hole's face and wall are deleted each time (the cube
+        # faces may be shared with other tests' polygons)
+        assert self.gl.count('glDeleteLists') >= 2 * 4
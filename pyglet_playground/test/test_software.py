@@ -0,0 +1,180 @@
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+from nose.tools import assert_equals
+import numpy as np
+from core import backends, lighting, software
+from core.gl_polygon import GLPolygon
+from core.scene import Scene
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+def _square(z, size=1.):
+    # A square facing +z (towards the camera), centred on the z axis
+    vertices = np.array([[-size, -size, z], [size, -size, z],
+                         [size, size, z], [-size, size, z]])
+    return GLPolygon(vertices, [[0, 1, 2], [0, 2, 3]])
+
+
+class TestLighting(object):
+
+    def test_facing_camera(self):
+        # Both lights are in front, so the diffuse and specular terms are
+        # all positive
+        color = lighting.shade([[0., 0., 1.]])[0]
+        material = np.array(lighting.AMBIENT_AND_DIFFUSE[:3])
+        expected = 0.2 * material
+        for light in lighting.LIGHTS:
+            direction = np.array(light.position[:3], dtype=float)
+            direction /= np.linalg.norm(direction)
+            half = direction + [0, 0, 1]
+            half /= np.linalg.norm(half)
+            expected = expected + direction[2] * material * light.diffuse[:3] + \
+                half[2] ** lighting.SHININESS * np.array(light.specular[:3])
+        np.testing.assert_almost_equal(np.clip(expected, 0, 1), color)
+
+    def test_facing_away(self):
+        # Only the ambient light
+        color = lighting.shade([[0., 0., -1.]])[0]
+        np.testing.assert_almost_equal(
+            0.2 * np.array(lighting.AMBIENT_AND_DIFFUSE[:3]), color)
+
+
+class TestSoftwareBackend(object):
+
+    def setup(self):
+        self.backend = software.SoftwareBackend(64, 48)
+        self.scene = Scene(backend=self.backend, window=False, cull=False)
+        self.scene.on_resize(64, 48)
+
+    def _draw(self, polygons):
+        self.scene._polygons = polygons
+        self.scene.draw()
+        return self.backend.framebuffer
+
+    def test_headless_scene(self):
+        assert self.scene.window is None
+        assert_equals((64, 48), self.scene.viewport)
+        framebuffer = self.backend.framebuffer
+        assert_equals((48, 64, 3), framebuffer.color.shape)
+
+    def test_draws_lit_square(self):
+        framebuffer = self._draw({'square': _square(-5.)})
+        np.testing.assert_almost_equal(lighting.shade([[0., 0., 1.]])[0],
+                                       framebuffer.color[24, 32])
+        np.testing.assert_almost_equal(lighting.CLEAR_COLOR[:3],
+                                       framebuffer.color[0, 0])
+        assert framebuffer.depth[24, 32] < 1.
+        assert_equals(1., framebuffer.depth[0, 0])
+
+    def test_covers_projected_area(self):
+        # The square spans 2 units at a distance where the view is
+        # 2 * tan(30 degrees) * 5 units high
+        framebuffer = self._draw({'square': _square(-5.)})
+        covered = (framebuffer.depth < 1).sum(axis=0).max()
+        expected = 48 * 2. / (2 * np.tan(np.radians(30)) * 5)
+        assert abs(covered - expected) <= 1
+
+    def test_depth_test(self):
+        near, far = _square(-5., 0.5), _square(-6., 3.)
+        for polygons in {'a': near, 'b': far}, {'a': far, 'b': near}:
+            framebuffer = self._draw(polygons)
+            centre_depth = framebuffer.depth[24, 32]
+            edge_depth = framebuffer.depth[24, 20]
+            assert 0 < centre_depth < edge_depth < 1
+
+    def test_back_faces_culled(self):
+        square = _square(-5.)
+        square.orientation[1] = 180.
+        framebuffer = self._draw({'square': square})
+        assert_equals(1., framebuffer.depth.min())
+        assert_equals(0, self.backend.triangles)
+
+    def test_behind_camera_skipped(self):
+        framebuffer = self._draw({'square': _square(5.)})
+        assert_equals(1., framebuffer.depth.min())
+
+    def test_chunks(self):
+        original = software.MAX_FRAGMENTS
+        software.MAX_FRAGMENTS = 100
+        try:
+            chunked = self._draw({'square': _square(-5.)}).color.copy()
+        finally:
+            software.MAX_FRAGMENTS = original
+        np.testing.assert_equal(chunked,
+                                self._draw({'square': _square(-5.)}).color)
+
+
+# Imports and draws a scene in a new process, where pyglet.gl hasn't been
+# imported yet
+_WITHOUT_DISPLAY = """
+from core import software
+from core.scene import Scene
+from aperture import Aperture
+backend = software.SoftwareBackend(64, 48)
+scene = Scene(backend=backend, window=False)
+scene.on_resize(64, 48)
+aperture = Aperture()
+aperture.position[2] = -5.
+scene._polygons = {'aperture': aperture}
+scene.draw()
+print(backend.triangles)
+"""
+
+
+class TestWithoutDisplay(object):
+
+    def test_import_and_draw(self):
+        environment = dict(os.environ)
+        environment.pop('DISPLAY', None)
+        environment.pop('PYGLET_SHADOW_WINDOW', None)
+        directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen(
+            [sys.executable, '-c', _WITHOUT_DISPLAY], cwd=directory,
+            env=environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output, errors = process.communicate()
+        assert_equals(0, process.returncode, errors)
+        assert int(output) > 0
+
+
+class TestFrames(object):
+
+    def setup(self):
+        self.directory = tempfile.mkdtemp()
+        self.framebuffer = software.Framebuffer(4, 3)
+        self.framebuffer.color[1, 2] = [0., 0.5, 1.]
+
+    def teardown(self):
+        shutil.rmtree(self.directory)
+
+    def test_png(self):
+        path = os.path.join(self.directory, 'frame.png')
+        self.framebuffer.save(path)
+        with open(path, 'rb') as png:
+            data = png.read()
+        assert data.startswith(b'\x89PNG\r\n\x1a\n')
+        assert_equals((4, 3), struct.unpack('>II', data[16:24]))
+
+    def test_npy(self):
+        path = os.path.join(self.directory, 'frame.npy')
+        self.framebuffer.save(path)
+        frame = np.load(path)
+        assert_equals((3, 4, 4), frame.shape)
+        np.testing.assert_almost_equal([0., 0.5, 1., 1.], frame[1, 2])
+
+
+class TestGLViewport(object):
+
+    def test_set_viewport(self):
+        gl = RecordingGL()
+        backend = backends.DisplayListBackend(gl)
+        backend.set_viewport(640, 480, 60., .1, 1000.)
+        backend.clear()
+        assert_equals(['glViewport', 'glMatrixMode', 'glLoadIdentity',
+                       'gluPerspective', 'glMatrixMode', 'glClear',
+                       'glLoadIdentity'], gl.names())
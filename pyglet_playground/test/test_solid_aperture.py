@@ -0,0 +1,139 @@
+from nose.tools import assert_equals, assert_raises
+import numpy as np
+from aperture import SolidAperture
+from core import backends, bvh, generators, mesh
+from core.composite_polygon import CompositePolygon
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+def _edge_counts(triangles):
+    edges = np.sort(triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+    return np.unique(edges[:, 0] * (triangles.max() + 1) + edges[:, 1],
+                     return_counts=True)[1]
+
+
+class TestApertureMesh(object):
+
+    def setup(self):
+        self.vertices, self.triangles = generators.aperture(
+            16, (3., 2., 1.), (1., 0.5), (1.2, 0.8))
+
+    def test_segments(self):
+        assert_equals(16, generators.aperture_segments(16))
+        assert_equals(20, generators.aperture_segments(17))
+        assert_equals(4, generators.aperture_segments(1))
+
+    def test_watertight(self):
+        # Every edge is shared by exactly two triangles, which use it in
+        # opposite directions
+        assert np.all(_edge_counts(self.triangles) == 2)
+        directed = self.triangles[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2)
+        assert_equals(len(directed),
+                      len(np.unique(directed[:, 0] * 1000 + directed[:, 1])))
+
+    def test_faces_outwards(self):
+        # The divergence theorem gives the volume (the bore is a 16-gon
+        # inscribed in the ellipse)
+        a, b, c = (self.vertices[self.triangles[:, i]] for i in range(3))
+        volume = np.einsum('ij,ij->i', a, np.cross(b, c)).sum() / 6.
+        bore_area = 16 / 2. * 0.5 * 0.25 * np.sin(2 * np.pi / 16)
+        np.testing.assert_almost_equal(6. - bore_area, volume)
+
+    def test_parts(self):
+        triangles, parts = generators.aperture_topology(16)
+        source, split_triangles = mesh.split_parts(triangles, parts)
+        normals = mesh.face_normals(self.vertices[source], split_triangles)
+        expected = {0: [0, 0, -1], 1: [0, 0, 1], 3: [1, 0, 0], 4: [0, 1, 0],
+                    5: [-1, 0, 0], 6: [0, -1, 0]}
+        for part, normal in expected.items():
+            np.testing.assert_almost_equal(
+                np.tile(normal, (np.sum(parts == part), 1)),
+                normals[parts == part])
+
+        # The bore faces its axis
+        bore = self.vertices[source][split_triangles[parts == 2]].mean(axis=1)
+        inwards = [1.2, 0.8, 0.] - bore
+        assert np.all(np.einsum('ij,ij->i', inwards,
+                                normals[parts == 2]) > 0)
+
+
+class TestSolidAperture(object):
+
+    def setup(self):
+        self.aperture = SolidAperture(smoothness=16)
+        self.gl = RecordingGL()
+
+    def test_bounds_follow_size(self):
+        np.testing.assert_almost_equal([[0, 0, 0], [1, 1, 1]],
+                                       self.aperture.local_bounds)
+        self.aperture.size[:] = [4., 3., 2.]
+        np.testing.assert_almost_equal([[0, 0, 0], [4, 3, 2]],
+                                       self.aperture.local_bounds)
+
+    def test_scales_hole(self):
+        self.aperture.hole_size[:] = [0.5, 0.5]
+        self.aperture.size[:] = [4., 2., 1.]
+        np.testing.assert_almost_equal([2., 1.], self.aperture.hole_size)
+        np.testing.assert_almost_equal([2., 1.], self.aperture.hole_position)
+
+        self.aperture.scale_hole = False
+        self.aperture.size[:] = [8., 2., 1.]
+        np.testing.assert_almost_equal([2., 1.], self.aperture.hole_size)
+
+    def test_hole_must_fit(self):
+        def move_hole():
+            self.aperture.hole_position[0] = 0.9
+        assert_raises(AssertionError, move_hole)
+
+    def test_changed_in_place(self):
+        buffers = self.aperture.buffers
+        version = buffers.version
+        self.aperture.hole_size[:] = [0.5, 0.5]
+        assert self.aperture.buffers is buffers
+        assert buffers.version > version
+
+        positions = buffers.positions
+        radii = np.sqrt(((positions[:16, :2] - 0.5) ** 2).sum(axis=1))
+        np.testing.assert_almost_equal(0.25, radii, decimal=6)
+
+    def test_not_shared(self):
+        other = SolidAperture(smoothness=16)
+        assert other.buffers is not self.aperture.buffers
+        clone = self.aperture.clone()
+        assert clone.buffers is not self.aperture.buffers
+
+        clone.size[:] = [2., 2., 2.]
+        np.testing.assert_almost_equal([[0, 0, 0], [1, 1, 1]],
+                                       self.aperture.local_bounds)
+
+    def test_buffer_object_updated_in_place(self):
+        backend = backends.BufferObjectBackend(self.gl)
+        with backends.using(backend):
+            self.aperture.draw()
+            self.aperture.hole_size[:] = [0.5, 0.5]
+            self.aperture.draw()
+            self.aperture.draw()
+        assert_equals(2, self.gl.count('glBufferData'))
+        assert_equals(1, self.gl.count('glBufferSubData'))
+
+    def test_display_list_recompiled(self):
+        backend = backends.DisplayListBackend(self.gl)
+        with backends.using(backend):
+            self.aperture.draw()
+            self.aperture.size[:] = [2., 2., 2.]
+            self.aperture.draw()
+        assert_equals(2, self.gl.count('glNewList'))
+        assert_equals(2, len(set(args[0] for name, args in self.gl.calls
+                                 if name == 'glCallList')))
+
+    def test_picking_follows_changes(self):
+        self.aperture.position[:] = [-2., -2., -5.]
+        self.aperture.size[:] = [4., 4., 1.]
+        scene_bvh = bvh.SceneBVH(CompositePolygon({'aperture': self.aperture}))
+        assert scene_bvh.pick([1.5, 0., 0.], [0., 0., -1.]) is None
+
+        self.aperture.hole_size[:] = [1., 1.]
+        hit = scene_bvh.pick([1.5, 0., 0.], [0., 0., -1.])
+        np.testing.assert_almost_equal(4., hit.distance)
@@ -0,0 +1,120 @@
+from nose.tools import assert_equals, assert_raises
+import numpy as np
+from core import backends, static_batching
+from core.composite_polygon import CompositePolygon
+from core.polygon import Polygon
+from core.transform_pool import TransformPool
+from cube import create_unit_cube
+from test.gl_stub import RecordingGL
+
+__author__ = 'eatmuchpie'
+
+
+class TestStaticBatching(object):
+
+    def setup(self):
+        self.gl = RecordingGL()
+        self.left = create_unit_cube()
+        self.right = create_unit_cube()
+        self.right.position[:] = [2., 0., 0.]
+        self.composite = CompositePolygon({'left': self.left,
+                                           'right': self.right})
+
+    def test_walk_paths(self):
+        paths = set(path for path, polygon, m in self.composite.walk())
+        assert ('right', 'top') in paths
+        assert () in paths
+        assert_equals(1 + 2 * 7, len(paths))
+
+    def test_bake_merges_meshes(self):
+        baked, polygons = static_batching.bake(self.composite)
+
+        assert_equals(2 * 6 * 4, baked.buffers.vertex_count)
+        assert_equals(2 * 6 * 6, baked.buffers.index_count)
+        assert_equals(2 * 7, len(polygons))
+
+        positions = baked.buffers.positions
+        np.testing.assert_array_almost_equal([0., 0., 0.], positions.min(axis=0))
+        np.testing.assert_array_almost_equal([3., 1., 1.], positions.max(axis=0))
+
+    def test_bake_transforms_normals(self):
+        self.right.orientation[0] = 90.
+        baked, polygons = static_batching.bake(self.composite)
+
+        lengths = np.sqrt((baked.buffers.normals ** 2).sum(axis=1))
+        np.testing.assert_array_almost_equal(np.ones(len(lengths)), lengths)
+
+    def test_static_draws_once(self):
+        self.composite.static = True
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+            self.composite.draw()
+
+        assert_equals(2, self.gl.count('glDrawElements'))
+        assert_equals(2, self.gl.count('glGenBuffers'))
+
+    def test_rebaked_after_change_inside(self):
+        self.composite.static = True
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+            baked = self.composite._baked
+            self.right.position[1] = 1.
+            assert self.composite._baked is None
+            self.composite.draw()
+
+        assert self.composite._baked is not baked
+        positions = self.composite._baked.buffers.positions
+        np.testing.assert_array_almost_equal([3., 2., 1.], positions.max(axis=0))
+
+    def test_rebaked_after_pooled_bulk_update(self):
+        pool = TransformPool()
+        pool.add(self.left)
+        pool.add(self.right)
+        self.composite.static = True
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+            baked = self.composite._baked
+            with pool.bulk_update():
+                pool.positions[0] = [5., 0., 0.]
+            assert self.composite._baked is None
+            self.composite.draw()
+
+        assert self.composite._baked is not baked
+        positions = self.composite._baked.buffers.positions
+        np.testing.assert_array_almost_equal([6., 1., 1.], positions.max(axis=0))
+
+    def test_rebaked_after_polygons_replaced(self):
+        self.composite.static = True
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+            self.composite._polygons = {'left': self.left}
+            self.composite.draw()
+
+        assert_equals(6 * 4, self.composite._baked.buffers.vertex_count)
+
+    def test_not_rebaked_after_own_change(self):
+        self.composite.static = True
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+            baked = self.composite._baked
+            self.composite.position[0] = 5.
+
+        assert self.composite._baked is baked
+
+    def test_not_static_draws_each_polygon(self):
+        with backends.using(backends.BufferObjectBackend(self.gl)):
+            self.composite.draw()
+
+        assert_equals(12, self.gl.count('glDrawElements'))
+
+    def test_unbakeable(self):
+        class Other(Polygon):
+            def draw(self):
+                pass
+
+            def clone(self):
+                return Other()
+
+        self.composite._polygons['other'] = Other()
+        assert_raises(static_batching.UnbakeablePolygon,
+                      static_batching.bake, self.composite)
@@ -0,0 +1,80 @@
+import gc
+from nose.tools import assert_equals, assert_raises
+import numpy as np
+from core import matrix
+from core.transform_pool import TransformPool
+from core.transformable import Transformable
+
+__author__ = 'eatmuchpie'
+
+
+class TestTransformPool(object):
+
+    def setup(self):
+        self.pool = TransformPool(capacity=2)
+        self.objs = [Transformable() for _ in range(5)]
+        for n, obj in enumerate(self.objs):
+            obj.position[:] = [n, 0., 0.]
+            self.pool.add(obj)
+
+    def world_matrix(self, obj):
+        obj.transform()
+        obj.untransform()
+        return obj.world_matrix
+
+    def test_values_kept_after_growing(self):
+        assert_equals(5, len(self.pool))
+        assert self.pool.capacity >= 5
+        assert np.array_equal(np.arange(5.), self.pool.positions[:, 0])
+        for n, obj in enumerate(self.objs):
+            assert_equals(n, obj.position[0])
+
+    def test_members_are_views(self):
+        self.objs[2].size[1] = 7.
+        assert_equals(7., self.pool.sizes[2, 1])
+
+        self.pool.positions[3, 2] = 4.
+        assert_equals(4., self.objs[3].position[2])
+
+    def test_bulk_update(self):
+        for obj in self.objs:
+            self.world_matrix(obj)
+
+        with self.pool.bulk_update():
+            self.pool.orientations += [0., 0., 90.]
+
+        for n, obj in enumerate(self.objs):
+            expected = matrix.transformation([n, 0., 0.], [0., 0., 90.], None)
+            assert np.allclose(expected, self.world_matrix(obj))
+
+    def test_individual_update(self):
+        for obj in self.objs:
+            self.world_matrix(obj)
+
+        self.objs[1].size[:] = [2., 2., 2.]
+
+        assert np.allclose(np.diag([2., 2., 2., 1.])[:3, :3],
+                           self.world_matrix(self.objs[1])[:3, :3])
+        assert np.allclose(np.identity(3), self.world_matrix(self.objs[2])[:3, :3])
+
+    def test_remove(self):
+        removed = self.objs[1]
+        self.pool.remove(removed)
+
+        assert_equals(4, len(self.pool))
+        assert_equals(1., removed.position[0])
+        assert removed.position.base is None
+        assert np.array_equal([0., 4., 2., 3.], self.pool.positions[:, 0])
+
+        self.objs[4].position[0] = 9.
+        assert_equals(9., self.pool.positions[1, 0])
+
+    def test_garbage_collected_member_frees_row(self):
+        del self.objs[0]
+        gc.collect()
+
+        assert_equals(4, len(self.pool))
+        assert self.pool.members()[0] is self.objs[3]
+
+    def test_add_twice(self):
+        assert_raises(ValueError, self.pool.add, self.objs[0])
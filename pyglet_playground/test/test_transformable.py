@@ -27,4 +27,58 @@ class TestTransformable(object):
     def test_replace_size(self):
         new_size = [1., 2., 3.]
         self.obj.size = ObservableArray.like(new_size)
-        assert np.array_equal(new_size, self.obj.size)
\ No newline at end of file
+        assert np.array_equal(new_size, self.obj.size)
+
+    def test_in_place_operators_on_slices(self):
+        self.obj.orientation[:] += np.array([1., 2., 3.])
+        self.obj.position[:2] *= 2
+        self.obj.size[1:] -= 0.5
+
+        assert np.array_equal([1., 2., 3.], self.obj.orientation)
+        assert np.array_equal([0., 0., 0.], self.obj.position)
+        assert np.array_equal([1., 0.5, 0.5], self.obj.size)
+        assert_equals([(self.obj, 'orientation'), (self.obj, 'position'),
+                       (self.obj, 'size')], self.callback_args)
+
+
+class TestWorldMatrix(object):
+
+    def setup(self):
+        self.parent = Transformable()
+        self.child = Transformable()
+        self.parent.position[:] = [1., 2., 3.]
+        self.child.size[:] = [2., 2., 2.]
+
+    def world_matrix(self):
+        self.parent.transform()
+        self.child.transform()
+        self.child.untransform()
+        self.parent.untransform()
+        return self.child.world_matrix
+
+    def test_world_matrix(self):
+        expected = np.diag([2., 2., 2., 1.])
+        expected[:3, 3] = [1., 2., 3.]
+        assert np.array_equal(expected, self.world_matrix())
+
+    def test_world_matrix_cached(self):
+        first = self.world_matrix()
+        assert first is self.world_matrix()
+
+    def test_parent_change_propagates(self):
+        first = self.world_matrix()
+        self.parent.position[0] = 5.
+
+        second = self.world_matrix()
+        assert first is not second
+        assert np.array_equal([5., 2., 3., 1.], second[:, 3])
+
+    def test_deep_nesting(self):
+        objects = [Transformable() for _ in range(100)]
+        for obj in objects:
+            obj.position[0] = 1.
+            obj.transform()
+        for obj in reversed(objects):
+            obj.untransform()
+
+        assert objects[-1].world_matrix[0, 3] == 100.
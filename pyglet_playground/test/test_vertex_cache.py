@@ -0,0 +1,95 @@
+from nose.tools import assert_equals, assert_almost_equals
+import numpy as np
+from core import generators, mesh, vertex_cache
+
+__author__ = 'eatmuchpie'
+
+
+def _triangle_set(vertices, triangles):
+    # The triangles as sets of corner positions, to compare meshes whatever
+    # their order
+    return sorted(tuple(sorted(map(tuple, corners)))
+                  for corners in np.asarray(vertices)[triangles].tolist())
+
+
+class TestMetrics(object):
+
+    def test_no_reuse(self):
+        triangles = np.arange(12).reshape(4, 3)
+        assert_equals(3., vertex_cache.acmr(triangles))
+        assert_equals(1., vertex_cache.atvr(triangles))
+
+    def test_fan(self):
+        # Every triangle after the first adds one vertex
+        triangles = np.array([[0, i, i + 1] for i in range(1, 11)])
+        assert_almost_equals(12 / 10., vertex_cache.acmr(triangles))
+        assert_equals(1., vertex_cache.atvr(triangles))
+
+    def test_evicted(self):
+        triangles = np.array([[0, 1, 2], [3, 4, 5], [0, 1, 2]])
+        assert_equals(6, vertex_cache.cache_misses(triangles, cache_size=6))
+        assert_equals(9, vertex_cache.cache_misses(triangles, cache_size=3))
+
+    def test_empty(self):
+        assert_equals(0., vertex_cache.acmr(np.zeros((0, 3))))
+
+
+class TestOptimize(object):
+
+    def setup(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        self.vertices, self.normals, self.triangles = \
+            mesh.prepare(vertices, triangles)
+        shuffle = np.random.RandomState(0).permutation(len(self.triangles))
+        self.shuffled = self.triangles[shuffle]
+
+    def test_tipsify_beats_shuffled(self):
+        triangles, clusters = vertex_cache.tipsify(self.shuffled,
+                                                   len(self.vertices))
+        assert_equals(0, clusters[0])
+        assert vertex_cache.acmr(triangles) < 0.8
+        assert vertex_cache.acmr(self.shuffled) > 2.5
+        assert_equals(_triangle_set(self.vertices, self.shuffled),
+                      _triangle_set(self.vertices, triangles))
+
+    def test_optimize_keeps_mesh(self):
+        vertices, normals, triangles = vertex_cache.optimize(
+            self.vertices, self.normals, self.shuffled)
+        assert_equals(_triangle_set(self.vertices, self.triangles),
+                      _triangle_set(vertices, triangles))
+        assert vertex_cache.acmr(triangles) < vertex_cache.acmr(self.triangles)
+
+        # Every vertex keeps its normal
+        np.testing.assert_almost_equal(
+            mesh.vertex_normals(vertices, triangles), normals)
+
+    def test_never_worse(self):
+        # A fan is already perfectly ordered
+        vertices, triangles = generators.hole_face(64)
+        vertices, normals, triangles = mesh.prepare(vertices, triangles)
+        optimized = vertex_cache.optimize(vertices, normals, triangles)[2]
+        assert (vertex_cache.acmr(optimized) <=
+                vertex_cache.acmr(triangles))
+
+    def test_fetch_order(self):
+        vertices, normals, triangles = vertex_cache.fetch_order(
+            self.vertices, self.normals, self.shuffled)
+        first_uses = np.unique(triangles.ravel(), return_index=True)[1]
+        assert_equals(sorted(first_uses), first_uses.tolist())
+
+
+class TestPrepare(object):
+
+    def teardown(self):
+        vertex_cache.disable()
+
+    def test_disabled_by_default(self):
+        assert_equals(None, vertex_cache.active())
+
+    def test_prepare_reorders(self):
+        vertices, triangles = generators.sphere(1., 32, 16)
+        shuffled = triangles[np.random.RandomState(0).permutation(len(triangles))]
+        plain = mesh.prepare(vertices, shuffled)[2]
+        vertex_cache.enable()
+        reordered = mesh.prepare(vertices, shuffled)[2]
+        assert vertex_cache.acmr(reordered) < vertex_cache.acmr(plain)